@@ -2,7 +2,7 @@
 {
     "name": "Clareo OCR Finance",
     "summary": "Invoice & Receipt OCR Processing (Extract → Review → Export)",
-    "version": "1.0",
+    "version": "1.2",
     "category": "Accounting",
     "author": "Your Team",
     "license": "LGPL-3",
@@ -17,18 +17,32 @@
         # Sequences
         "data/ocr_sequences.xml",
 
+        # Scheduled jobs
+        "data/ocr_cron.xml",
+
         # Upload forms FIRST
         "views/ocr_invoice_form.xml",
         "views/ocr_receipt_form.xml",
 
         # Core views
         "views/ocr_document_tree.xml",
+        "views/ocr_document_kanban.xml",
         "views/ocr_document_search.xml",
         "views/ocr_document_form.xml",
 
         # Optional dashboard
         "views/ocr_dashboard_views.xml",
 
+        # Background OCR queue, cache and batches
+        "views/ocr_job_views.xml",
+        "views/ocr_cache_views.xml",
+        "views/ocr_batch_views.xml",
+        "views/ocr_metric_views.xml",
+        "views/ocr_vendor_profile_views.xml",
+
+        # Bulk export
+        "wizard/ocr_export_wizard.xml",
+
         # Actions AFTER all views
         "views/ocr_actions.xml",
 
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Duplicate detection benchmark: how far apart the page 1 hashes of a
+document and of its re-scan are, compared with other documents, and what
+the banded index saves over a scan of every hash.
+
+    python benchmarks/bench_duplicates.py [--docs 40] [--index-size 1000000]
+
+Every document is rendered once clean and once as a re-scan (noise,
+blur, slight rotation, JPEG), both scaled to the list thumbnail width
+like ocr.thumbnail before hashing. Reported: the Hamming distance
+between the two scans of the same document, between different
+documents, the share caught within PHASH_MAX_DISTANCE (the same total is
+required on top of it, so template look-alikes of the same vendor are
+not flagged), then lookups against --index-size random hashes through
+the band index (one dict per band keyed on band value and total, like
+the expression indexes) and by a linear scan.
+"""
+import argparse
+import io
+import random
+import statistics
+import time
+
+from PIL import Image
+
+from common import load_module
+import synthetic
+
+THUMBNAIL_WIDTH = 160  # ocr_thumbnail.LIST_WIDTH
+
+
+def thumbnail(image):
+    # what ocr.thumbnail stores: scaled down, then a lossy re-encode
+    image = image.copy()
+    image.thumbnail((THUMBNAIL_WIDTH, THUMBNAIL_WIDTH * 4))
+    buf = io.BytesIO()
+    image.save(buf, format="WEBP", quality=80)
+    return Image.open(io.BytesIO(buf.getvalue()))
+
+
+def build_corpus(dup, count, scale):
+    corpus = []
+    for seed in range(count):
+        doc = synthetic.make_document(seed=seed, doc_type="invoice", item_count=3 + seed % 5)
+        clean = synthetic.render_page(doc["lines"], scale=scale, seed=seed)
+        rescan = synthetic.render_page(
+            doc["lines"], scale=scale, seed=seed + 1000, noise=0.02, blur=0.6, rotate=0.4
+        )
+        rescan = Image.open(io.BytesIO(synthetic.to_jpeg(rescan, quality=70)))
+        corpus.append({
+            "vendor": doc["fields"]["vendor_name"],
+            "total": doc["fields"]["total_amount"],
+            "hash": dup.dhash(thumbnail(clean)),
+            "rescan": dup.dhash(thumbnail(rescan)),
+        })
+    return corpus
+
+
+def distances(dup, corpus):
+    same = [dup.hamming(doc["hash"], doc["rescan"]) for doc in corpus]
+    vendor, other = [], []
+    for i, a in enumerate(corpus):
+        for b in corpus[i + 1:]:
+            (vendor if a["vendor"] == b["vendor"] else other).append(dup.hamming(a["hash"], b["hash"]))
+    return same, vendor, other
+
+
+def describe(values):
+    return f"min {min(values):>2}  median {statistics.median(values):>4.1f}  max {max(values):>2}"
+
+
+def bench_index(dup, corpus, size):
+    rnd = random.Random(0)
+    rows = [
+        (f"{rnd.getrandbits(64):016x}", round(rnd.lognormvariate(6, 1.2), 2)) for _ in range(size)
+    ] + [(doc["hash"], doc["total"]) for doc in corpus]
+    # like the expression indexes: (band value, total) -> ids, one per band
+    index = [{} for _ in range(dup.PHASH_BANDS)]
+    band_sizes = [{} for _ in range(dup.PHASH_BANDS)]
+    for doc_id, (phash, total) in enumerate(rows):
+        for band, value in enumerate(dup.bands(phash)):
+            index[band].setdefault((value, total), []).append(doc_id)
+            band_sizes[band][value] = band_sizes[band].get(value, 0) + 1
+
+    queries = [(doc["rescan"], doc["total"]) for doc in corpus]
+    started = time.perf_counter()
+    banded_hits, candidates, band_only = 0, 0, 0
+    for query, total in queries:
+        ids = set()
+        for band, value in enumerate(dup.bands(query)):
+            ids.update(index[band].get((value, total), ()))
+            band_only += band_sizes[band].get(value, 0)
+        candidates += len(ids)
+        banded_hits += any(dup.hamming(query, rows[i][0]) <= dup.PHASH_MAX_DISTANCE for i in ids)
+    banded = (time.perf_counter() - started) / len(queries)
+
+    started = time.perf_counter()
+    linear_hits = 0
+    for query, total in queries:
+        linear_hits += any(
+            phash_total == total and dup.hamming(query, phash) <= dup.PHASH_MAX_DISTANCE
+            for phash, phash_total in rows
+        )
+    linear = (time.perf_counter() - started) / len(queries)
+    return {
+        "hashes": len(rows),
+        "banded_ms": banded * 1000,
+        "linear_ms": linear * 1000,
+        "candidates": candidates / len(queries),
+        "band_only": band_only / len(queries),
+        "banded_hits": banded_hits,
+        "linear_hits": linear_hits,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=40)
+    parser.add_argument("--scale", type=float, default=0.5, help="page scale, 1.0 = A4 at 300 dpi")
+    parser.add_argument("--index-size", type=int, default=1000000)
+    args = parser.parse_args()
+
+    dup = load_module("ocr_duplicate")
+    corpus = build_corpus(dup, args.docs, args.scale)
+    same, vendor, other = distances(dup, corpus)
+    limit = dup.PHASH_MAX_DISTANCE
+    print(f"{len(corpus)} documents, page 1 hashes of {THUMBNAIL_WIDTH}px thumbnails, limit {limit} bits\n")
+    print(f"{'re-scan of itself':<22} {describe(same)}  within limit {sum(d <= limit for d in same) / len(same):>6.1%}")
+    if vendor:
+        print(f"{'same vendor':<22} {describe(vendor)}  within limit {sum(d <= limit for d in vendor) / len(vendor):>6.1%}")
+    print(f"{'other vendors':<22} {describe(other)}  within limit {sum(d <= limit for d in other) / len(other):>6.1%}")
+    same_total = sum(
+        a["total"] == b["total"] and dup.hamming(a["hash"], b["hash"]) <= limit
+        for i, a in enumerate(corpus) for b in corpus[i + 1:]
+    )
+    print(f"{'flagged (same total)':<22} {same_total} false pair(s)")
+
+    res = bench_index(dup, corpus, args.index_size)
+    print(f"\n{res['hashes']:,} hashes, one lookup per re-scan")
+    print(f"{'banded':<8} {res['banded_ms']:>9.3f} ms  {res['candidates']:>8.1f} candidates  {res['banded_hits']} found"
+          f"  ({res['band_only']:,.0f} rows without the total in the index)")
+    print(f"{'linear':<8} {res['linear_ms']:>9.3f} ms  {res['hashes']:>8,} compared    {res['linear_hits']} found")
+    print(f"\nbanded vs linear: {res['linear_ms'] / res['banded_ms']:.0f}x faster")
+
+
+if __name__ == "__main__":
+    main()
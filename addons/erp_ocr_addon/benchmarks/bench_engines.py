@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Receipts per second of the OCR engines (see models/ocr_engine.py).
+
+    python benchmarks/bench_engines.py [--receipts 30] [--engines pytesseract,tesserocr]
+
+Small receipt images are preprocessed once, then every engine OCRs the
+same images one after another. "first" is the first call, which includes
+loading the tha+eng models; the steady state rate excludes it. Engines
+that are not installed are reported and skipped.
+"""
+import argparse
+import time
+
+from common import load_module, similarity
+import synthetic
+
+
+def build_receipts(count, preprocess):
+    thai = synthetic.thai_font_available()
+    receipts = []
+    for seed in range(count):
+        doc = synthetic.make_document(seed=seed, thai=thai and seed % 2 == 1, item_count=3 + seed % 4)
+        # receipt sized scans, not full A4 pages
+        page = synthetic.render_page(doc["lines"], scale=0.5, font_size=56, thai=thai, seed=seed)
+        receipts.append((preprocess(page), doc["text"]))
+    return receipts
+
+
+def run(ocr_engine, name, config, receipts):
+    started = time.perf_counter()
+    engine = ocr_engine.get_engine(name, config)
+    if engine.name != name:
+        print(f"{name:<12} not available (got {engine.name}), skipped")
+        return
+
+    times = []
+    scores = []
+    for image, truth in receipts:
+        t0 = time.perf_counter()
+        text = engine.image_to_string(image)
+        times.append(time.perf_counter() - t0)
+        scores.append(similarity(truth, text))
+    total = time.perf_counter() - started
+    ocr_engine.close_engines()
+
+    steady = times[1:] or times
+    print(
+        f"{name:<12} first {1000 * (times[0] + total - sum(times)):7.1f} ms   "
+        f"steady {len(steady) / sum(steady):6.2f} receipts/s   "
+        f"overall {len(times) / total:6.2f} receipts/s   "
+        f"accuracy {sum(scores) / len(scores):6.3f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--receipts", type=int, default=30)
+    parser.add_argument("--engines", default="pytesseract,tesserocr")
+    args = parser.parse_args()
+
+    ocr_engine = load_module("ocr_engine")
+    OCRParser = load_module("ocr_parser").OCRParser
+    preprocess = load_module("ocr_preprocess").preprocess
+
+    receipts = build_receipts(args.receipts, preprocess)
+    print(f"{len(receipts)} receipts, OCR config: {OCRParser.OCR_CONFIG}")
+    for name in args.engines.split(","):
+        run(ocr_engine, name.strip(), OCRParser.OCR_CONFIG, receipts)
+
+
+if __name__ == "__main__":
+    main()
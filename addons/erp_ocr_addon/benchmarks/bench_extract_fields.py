@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark: OCRParser.extract_fields (rule engine) against the
+previous regex cascade, over a corpus of stored extracted_text values.
+
+Corpus from the database (inside the Odoo container):
+    odoo shell -d erp_ocr_dev < benchmarks/bench_extract_fields.py
+
+Corpus from a folder of .txt dumps, without Odoo:
+    python benchmarks/bench_extract_fields.py path/to/corpus/
+
+Synthetic corpus (benchmarks/synthetic.py, Thai and English receipts and
+invoices of 5 to 600 items, plus a few texts OCR garbled):
+    python benchmarks/bench_extract_fields.py --synthetic
+
+Both implementations must return identical dicts for every document.
+"""
+import glob
+import importlib
+import os
+import re
+import sys
+import time
+import types
+
+REPEAT = 20
+
+
+def load_parser():
+    """
+    Import OCRParser without going through the addon __init__ (which
+    needs Odoo) when running outside the Odoo shell.
+    """
+    try:
+        from odoo.addons.erp_ocr_addon.models.ocr_parser import OCRParser
+        return OCRParser
+    except ImportError:
+        pass
+    models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models")
+    pkg = types.ModuleType("erp_ocr_models")
+    pkg.__path__ = [os.path.normpath(models_dir)]
+    sys.modules["erp_ocr_models"] = pkg
+    return importlib.import_module("erp_ocr_models.ocr_parser").OCRParser
+
+
+def legacy_extract_fields(text):
+    """
+    extract_fields as it was before the rule engine (one re.search per
+    pattern over the whole text), kept here as the parity reference.
+    """
+    fields = {
+        "vendor_name": "", "supplier_name": "", "customer_name": "",
+        "seller_id": "", "company_issued": "", "tax_id": "",
+        "vendor_phone": "", "vendor_address": "", "reference_number": "",
+        "invoice_date_raw": "", "receipt_number": "", "receipt_date_raw": "",
+        "subtotal_amount": 0.0, "discount_amount": 0.0, "vat_percent": 0.0,
+        "vat_amount": 0.0, "total_amount": 0.0, "confidence": 0.70, "items": [],
+    }
+    if not text:
+        return fields
+
+    text = text.replace("\t", " ")
+    text = re.sub(r"[ ]{2,}", " ", text)
+    text = re.sub(r"\n{2,}", "\n", text)
+    text = text.strip()
+
+    for pat in [r'^(บริษัท\s*[^\n]+)', r'^([A-Z][A-Za-z0-9 &\.,\-]{4,})']:
+        m = re.search(pat, text, re.MULTILINE)
+        if m:
+            fields["vendor_name"] = m.group(1).strip()
+            fields["confidence"] += 0.1
+            break
+
+    date_match = re.search(r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})', text)
+    if date_match:
+        fields["invoice_date_raw"] = date_match.group(1)
+
+    for pat in [
+        r'รวมทั้งสิ้น\s*([0-9,]+\.\d{2})',
+        r'ยอดรวม\s*([0-9,]+\.\d{2})',
+        r'\bTOTAL\b[^\d]*([0-9,]+\.\d{2})',
+        r'Amount\s*Due[^\d]*([0-9,]+\.\d{2})',
+    ]:
+        m = re.search(pat, text, re.IGNORECASE)
+        if m:
+            fields["total_amount"] = float(m.group(1).replace(",", ""))
+            fields["confidence"] += 0.15
+            break
+
+    for pat in [r'ภาษีมูลค่าเพิ่ม\s*([0-9,]+\.\d{2})', r'(VAT|Tax)[^\d]*([0-9,]+\.\d{2})']:
+        m = re.search(pat, text, re.IGNORECASE)
+        if m:
+            value = m.group(1) if m.lastindex == 1 else m.group(2)
+            fields["vat_amount"] = float(value.replace(",", ""))
+            fields["confidence"] += 0.05
+            break
+
+    disc_match = re.search(r'(Discount|ส่วนลด)[^\d]*([0-9,]+\.\d{2})', text, re.IGNORECASE)
+    if disc_match:
+        fields["discount_amount"] = float(disc_match.group(2).replace(",", ""))
+
+    for qty, desc, unit in re.findall(r'(\d+)\s+(.+?)\s+([0-9]+\.\d{2})', text):
+        fields["items"].append({"name": desc.strip(), "qty": float(qty), "price": float(unit)})
+    if fields["items"]:
+        fields["confidence"] += 0.1
+
+    fields["confidence"] = min(fields["confidence"], 0.95)
+    return fields
+
+
+def load_corpus_from_dir(path):
+    corpus = []
+    for name in sorted(glob.glob(os.path.join(path, "*.txt"))):
+        with open(name, encoding="utf-8") as f:
+            corpus.append(f.read())
+    return corpus
+
+
+def load_corpus_synthetic(count=200):
+    import random
+    import synthetic
+
+    rnd = random.Random(0)
+    corpus = []
+    for seed in range(count):
+        doc = synthetic.make_document(
+            seed=seed,
+            doc_type="invoice" if seed % 3 else "receipt",
+            thai=seed % 2 == 1,
+            item_count=(5, 5, 5, 60, 600)[seed % 5] if seed % 10 else 0,
+        )
+        text = doc["text"]
+        if seed % 7 == 0:
+            # OCR noise: dropped characters, doubled spaces, tabs
+            text = "".join(
+                c for c in text.replace(" ", rnd.choice(["  ", "\t", " "])) if rnd.random() > 0.03
+            )
+        corpus.append(text)
+    return corpus
+
+
+def load_corpus_from_env(env, limit=5000):
+    rows = env["ocr.document"].search_read(
+        [("extracted_text", "!=", False)], ["extracted_text"], limit=limit
+    )
+    return [r["extracted_text"] for r in rows]
+
+
+def timed(func, corpus):
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        for text in corpus:
+            func(text)
+    return time.perf_counter() - started
+
+
+def main(corpus):
+    OCRParser = load_parser()
+    if not corpus:
+        print("empty corpus")
+        return
+
+    mismatches = [
+        i for i, text in enumerate(corpus)
+        if OCRParser.extract_fields(text) != legacy_extract_fields(text)
+    ]
+
+    runs = len(corpus) * REPEAT
+    legacy = timed(legacy_extract_fields, corpus)
+    engine = timed(OCRParser.extract_fields, corpus)
+
+    print(f"documents      : {len(corpus)} x {REPEAT}")
+    print(f"legacy cascade : {legacy:.3f}s  ({runs / legacy:,.0f} docs/s)")
+    print(f"rule engine    : {engine:.3f}s  ({runs / engine:,.0f} docs/s)")
+    print(f"speedup        : {legacy / engine:.2f}x")
+    print(f"mismatches     : {len(mismatches)} {mismatches[:10]}")
+
+
+if "env" in globals():
+    # piped into `odoo shell`
+    main(load_corpus_from_env(env))  # noqa: F821
+elif __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit(__doc__)
+    if sys.argv[1] == "--synthetic":
+        main(load_corpus_synthetic())
+    else:
+        main(load_corpus_from_dir(sys.argv[1]))
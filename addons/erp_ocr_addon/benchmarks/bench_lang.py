@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Language model benchmark: an English-only corpus OCRed with the combined
+tha+eng model, with "auto" and with eng alone. "auto" only picks eng from
+letters already read (a PDF text layer, a vendor profile), so on these
+image uploads it has to match tha+eng; eng shows what a vendor profile
+saying eng saves.
+
+    python benchmarks/bench_lang.py [--docs 20] [--scale 0.75] [--engine pytesseract]
+
+Every document is a PNG written to a temp folder and goes through
+OCRParser.run_image_ocr like an upload. Reported per mode: documents per
+second, the Tesseract seconds, the languages picked, the character
+similarity with the page text and the share of documents whose vendor,
+date, VAT and total are all extracted correctly. Needs tesseract with
+the eng and tha traineddata.
+"""
+import argparse
+import collections
+import os
+import tempfile
+import time
+
+from common import load_module, similarity
+import synthetic
+
+MODES = ("tha+eng", "auto", "eng")
+
+
+def build_corpus(tmp_dir, count, scale):
+    corpus = []
+    for seed in range(count):
+        doc = synthetic.make_document(
+            seed=seed, doc_type="receipt" if seed % 2 else "invoice", item_count=3 + seed % 5
+        )
+        path = os.path.join(tmp_dir, f"doc_{seed}.png")
+        with open(path, "wb") as f:
+            f.write(synthetic.to_png(synthetic.render_page(doc["lines"], scale=scale, seed=seed)))
+        corpus.append((path, doc))
+    return corpus
+
+
+def fields_match(fields, truth):
+    return (
+        " ".join(fields["vendor_name"].split()) == " ".join(truth["vendor_name"].split())
+        and fields["invoice_date_raw"] == truth["invoice_date_raw"]
+        and abs(fields["vat_amount"] - truth["vat_amount"]) < 0.005
+        and abs(fields["total_amount"] - truth["total_amount"]) < 0.005
+    )
+
+
+def run(OCRParser, corpus, mode, engine):
+    options = {"engine": engine, "lang": mode}
+    # load the models outside the timed loop
+    OCRParser.run_image_ocr(corpus[0][0], options=options)
+
+    langs = collections.Counter()
+    timings = {}
+    scores = []
+    matches = 0
+    started = time.perf_counter()
+    for path, doc in corpus:
+        log = []
+        layouts = {}
+        text = OCRParser.run_image_ocr(path, options=options, log=log, timings=timings, layouts=layouts)
+        fields = OCRParser.extract_fields(text, words=OCRParser.page_words([text], layouts))
+        langs[next((line.split()[1] for line in log if line.startswith("Language:")), mode)] += 1
+        scores.append(similarity(doc["text"], text))
+        matches += fields_match(fields, doc["fields"])
+    elapsed = time.perf_counter() - started
+    return {
+        "docs_per_second": len(corpus) / elapsed,
+        "tesseract_seconds": timings.get("tesseract", 0.0),
+        "langs": dict(langs),
+        "similarity": sum(scores) / len(scores),
+        "fields_ok": matches / len(corpus),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--scale", type=float, default=0.75, help="page scale, 1.0 = A4 at 300 dpi")
+    parser.add_argument("--engine", default="pytesseract")
+    args = parser.parse_args()
+
+    OCRParser = load_module("ocr_parser").OCRParser
+    with tempfile.TemporaryDirectory(prefix="bench_lang_") as tmp_dir:
+        corpus = build_corpus(tmp_dir, args.docs, args.scale)
+        print(f"{len(corpus)} English documents, engine {args.engine}\n")
+        print(f"{'mode':<9} {'docs/s':>7} {'tess s':>8} {'similar':>8} {'fields':>7}  langs")
+        results = {mode: run(OCRParser, corpus, mode, args.engine) for mode in MODES}
+
+    for mode, res in results.items():
+        langs = ", ".join(f"{lang} {count}" for lang, count in sorted(res["langs"].items()))
+        print(
+            f"{mode:<9} {res['docs_per_second']:>7.2f} {res['tesseract_seconds']:>8.2f} "
+            f"{res['similarity']:>8.3f} {res['fields_ok']:>7.1%}  {langs}"
+        )
+    base = results["tha+eng"]["docs_per_second"]
+    print(f"\neng vs tha+eng: {results['eng']['docs_per_second'] / base:.2f}x throughput")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Peak Python memory of getting a large upload ready for OCR.
+
+    python benchmarks/bench_memory.py [--sizes 5,20,50]
+
+Everything up to the point where the file is handed to poppler /
+Tesseract (hash, type sniff, temp file) is measured with tracemalloc:
+
+    legacy      the `file` field read as base64, decoded once to sniff the
+                header and hash, decoded again by the parser and written
+                to a temp file
+    filestore   OCRParser file source = filestore path: header and
+                streamed sha256 read from disk, the path is used as is
+    db          attachment stored in the database: raw bytes, hashed and
+                written to a temp file once
+
+The payload is a %PDF header followed by random bytes; the content does
+not matter before rasterization.
+"""
+import argparse
+import base64
+import hashlib
+import os
+import tempfile
+import tracemalloc
+
+from common import load_module
+
+MB = 1024 * 1024
+
+
+def legacy(b64_field):
+    file_bytes = base64.b64decode(b64_field or b"")
+    hashlib.sha256(file_bytes).hexdigest()
+    assert file_bytes[:4] == b"%PDF"
+
+    pdf_bytes = base64.b64decode(b64_field)
+    with tempfile.TemporaryDirectory(prefix="ocr_pdf_") as tmp_dir:
+        with open(os.path.join(tmp_dir, "document.pdf"), "wb") as f:
+            f.write(pdf_bytes)
+        del pdf_bytes
+
+
+def with_source(OCRParser, source):
+    OCRParser.sha256(source)
+    assert OCRParser.is_pdf(source)
+    if isinstance(source, str):
+        return
+    with tempfile.TemporaryDirectory(prefix="ocr_pdf_") as tmp_dir:
+        with open(os.path.join(tmp_dir, "document.pdf"), "wb") as f:
+            f.write(source)
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / MB
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="5,20,50", help="file sizes in MB")
+    args = parser.parse_args()
+
+    OCRParser = load_module("ocr_parser").OCRParser
+
+    with tempfile.TemporaryDirectory(prefix="ocr_bench_") as tmp_dir:
+        for size in [int(s) for s in args.sizes.split(",")]:
+            raw = b"%PDF-1.7\n" + os.urandom(size * MB)
+            path = os.path.join(tmp_dir, f"{size}.pdf")
+            with open(path, "wb") as f:
+                f.write(raw)
+            b64_field = base64.b64encode(raw)
+
+            # the base64 field value (legacy) and attachment.raw (db) are
+            # held by the ORM cache, count them on top of what the OCR code
+            # allocates
+            results = {
+                "legacy": measure(legacy, b64_field) + len(b64_field) / MB,
+                "filestore": measure(with_source, OCRParser, path),
+                "db": measure(with_source, OCRParser, raw) + len(raw) / MB,
+            }
+            del b64_field
+            print(f"{size:4d} MB file   " + "   ".join(
+                f"{name} {peak:7.1f} MB" for name, peak in results.items()
+            ))
+
+
+if __name__ == "__main__":
+    main()
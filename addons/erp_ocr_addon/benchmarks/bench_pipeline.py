@@ -0,0 +1,455 @@
+# -*- coding: utf-8 -*-
+"""
+End to end OCR benchmark: synthetic uploads in, extracted fields out.
+
+    python benchmarks/bench_pipeline.py [--docs 24] [--max-pages 4]
+        [--scales 0.75,1.0,1.5] [--noise 0,0.03] [--workers 1]
+        [--engine pytesseract] [--threshold fixed] [--page-policy all] [--lang auto]
+        [--born-digital] [--no-text-layer]
+        [--large-pages 50] [--output results.json] [--baseline baseline.json]
+
+The corpus is a mix of Thai/English invoices and receipts as PNG, JPEG and
+multi-page PDF files at different scales and noise levels, written to a
+temp folder first (like filestore paths). Every file goes through the same
+steps as ocr.document._process_ocr without Odoo: sha256 + type sniff,
+OCRParser.run_image_ocr / run_pdf_source_pages, extract_fields.
+
+--born-digital writes the English PDFs with a text layer (as exported by
+accounting software) instead of scanned page images; run it with and
+without --no-text-layer to time the pdftotext path against OCR, and the
+scanned corpus the same way for what the pdftotext call costs there.
+
+Reported:
+    throughput      documents and pages per second (wall clock)
+    stages          p50 / p95 / sum of seconds per pipeline stage and
+                    document, same stage names as ocr.metric
+    memory          peak RSS of the run, and of one --large-pages PDF OCRed
+                    in a fresh process (0 skips it)
+    accuracy        share of documents whose vendor, date, VAT, total and
+                    item count match the ground truth, and the character
+                    similarity of the OCR text with the page text
+
+--output writes the results as JSON; a previous output passed as
+--baseline is compared metric by metric and the exit status is 1 when
+anything got slower / bigger than --tolerance (relative) or less accurate
+than --accuracy-tolerance (absolute). Needs tesseract and poppler.
+"""
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+from common import load_module, peak_rss_mb, percentile, similarity
+import synthetic
+
+# continuation pages of the PDFs: no amounts or dates, so the ground truth
+# of page 1 stays the ground truth of the document
+FILLER_LINES = [
+    "Terms and conditions",
+    "Goods remain the property of the seller until paid in full",
+    "Please quote the document number with your payment",
+    "Delivery notes",
+]
+
+# report order, as models/ocr_metric.STAGES (that module needs Odoo)
+STAGES = [
+    "source", "cache", "text_layer", "decode", "rasterize", "grayscale", "downscale",
+    "deskew", "crop", "threshold", "tesseract", "parse", "db_write", "total",
+]
+
+# stages shorter than this are too noisy to compare with a baseline
+MIN_STAGE_SECONDS = 0.005
+
+
+# =========================
+# CORPUS
+# =========================
+def build_corpus(args, tmp_dir):
+    """
+    Write the synthetic uploads to tmp_dir. Returns a list of specs
+    {path, is_pdf, doc_type, pages, scale, noise, thai, texts, fields}.
+    """
+    thai_ok = synthetic.thai_font_available()
+    scales = [float(s) for s in args.scales.split(",")]
+    noises = [float(n) for n in args.noise.split(",")]
+    rnd = random.Random(args.seed)
+
+    corpus = []
+    for idx in range(args.docs):
+        seed = args.seed + idx
+        doc_type = ("invoice", "receipt")[idx % 2]
+        thai = thai_ok and idx % 3 == 2
+        fmt = ("png", "jpeg", "pdf")[(idx // 2) % 3]
+        scale = scales[idx % len(scales)]
+        noise = noises[(idx // len(scales)) % len(noises)]
+        page_count = 1 + rnd.randrange(args.max_pages) if fmt == "pdf" else 1
+
+        doc = synthetic.make_document(seed=seed, doc_type=doc_type, thai=thai, item_count=3 + idx % 5)
+        texts = [doc["text"]]
+        for page_no in range(2, page_count + 1):
+            texts.append("\n".join([f"Page {page_no} of {page_count}"] + FILLER_LINES))
+
+        if fmt == "pdf" and args.born_digital and not thai:
+            fmt = "pdf-text"
+            images = []
+        else:
+            images = [
+                synthetic.render_page(text.split("\n"), scale=scale, noise=noise, thai=thai, seed=seed + n)
+                for n, text in enumerate(texts)
+            ]
+        if fmt == "pdf-text":
+            data = synthetic.make_text_pdf([text.split("\n") for text in texts])
+        elif fmt == "pdf":
+            # 300 dpi like OCRParser.PDF_DPI, so scale survives rasterization
+            data = synthetic.make_pdf(images, resolution=300)
+        elif fmt == "jpeg":
+            data = synthetic.to_jpeg(images[0])
+        else:
+            data = synthetic.to_png(images[0])
+        del images
+
+        path = os.path.join(tmp_dir, f"{idx:04d}.{fmt.split('-')[0]}")
+        with open(path, "wb") as f:
+            f.write(data)
+
+        corpus.append({
+            "path": path,
+            "is_pdf": fmt.startswith("pdf"),
+            "format": fmt,
+            "doc_type": doc_type,
+            "pages": page_count,
+            "scale": scale,
+            "noise": noise,
+            "thai": thai,
+            "texts": texts,
+            "fields": doc["fields"],
+        })
+    return corpus
+
+
+def build_large_pdf(path, page_count, seed):
+    """
+    One long scanned PDF: an invoice page followed by filler pages.
+    """
+    doc = synthetic.make_document(seed=seed, doc_type="invoice", item_count=8)
+    pages = [doc["lines"]] + [
+        [f"Page {n} of {page_count}"] + FILLER_LINES for n in range(2, page_count + 1)
+    ]
+    images = [synthetic.render_page(lines, seed=seed + n) for n, lines in enumerate(pages)]
+    with open(path, "wb") as f:
+        f.write(synthetic.make_pdf(images, resolution=300))
+
+
+# =========================
+# RUN
+# =========================
+def ocr_options(args):
+    """
+    Same keys as ocr.document._get_ocr_options.
+    """
+    options = {
+        "engine": args.engine,
+        "threshold": args.threshold,
+        "text_height": args.text_height,
+        "crop": args.crop,
+        "deskew": args.deskew,
+        "text_layer": args.text_layer,
+        "page_policy": args.page_policy,
+        "lang": args.lang,
+    }
+    if args.page_policy != "all":
+        options["page_min_confidence"] = 0.9
+    return options
+
+
+def run_document(OCRParser, spec, args):
+    """
+    OCR + parse one upload. Returns (pages, fields, stage timings).
+    """
+    started = time.perf_counter()
+    timings = {}
+
+    t0 = time.perf_counter()
+    OCRParser.sha256(spec["path"])
+    OCRParser.is_pdf(spec["path"])
+    timings["source"] = time.perf_counter() - t0
+
+    options = ocr_options(args)
+    layouts = {}
+    if spec["is_pdf"]:
+        pages = OCRParser.run_pdf_source_pages(
+            spec["path"], workers=args.workers, options=options, timings=timings, layouts=layouts
+        )
+    else:
+        pages = [OCRParser.run_image_ocr(spec["path"], options=options, timings=timings, layouts=layouts)]
+
+    t0 = time.perf_counter()
+    fields = OCRParser.extract_fields(OCRParser.join_pages(pages), words=OCRParser.page_words(pages, layouts))
+    timings["parse"] = time.perf_counter() - t0
+
+    timings["total"] = time.perf_counter() - started
+    return pages, fields, timings
+
+
+def score(spec, pages, fields):
+    """
+    {check: bool} for the ground truth fields, plus the mean character
+    similarity over the pages that were OCRed.
+    """
+    truth = spec["fields"]
+    checks = {
+        "vendor_name": " ".join(fields["vendor_name"].split()) == " ".join(truth["vendor_name"].split()),
+        "invoice_date_raw": fields["invoice_date_raw"] == truth["invoice_date_raw"],
+        "vat_amount": abs(fields["vat_amount"] - truth["vat_amount"]) < 0.005,
+        "total_amount": abs(fields["total_amount"] - truth["total_amount"]) < 0.005,
+        "item_count": len(fields["items"]) == truth["item_count"],
+    }
+    checks["all_fields"] = all(checks.values())
+    scores = [similarity(expected, text) for expected, text in zip(spec["texts"], pages) if text is not None]
+    return checks, (sum(scores) / len(scores) if scores else 0.0)
+
+
+def run_corpus(OCRParser, corpus, args):
+    stage_values = {}
+    checks_total = {}
+    text_scores = []
+    pages_done = 0
+    errors = []
+
+    started = time.perf_counter()
+    for spec in corpus:
+        try:
+            pages, fields, timings = run_document(OCRParser, spec, args)
+        except Exception as e:
+            errors.append(f"{os.path.basename(spec['path'])}: {e}")
+            continue
+        pages_done += sum(1 for p in pages if p is not None)
+        for stage, seconds in timings.items():
+            stage_values.setdefault(stage, []).append(seconds)
+        checks, text_score = score(spec, pages, fields)
+        for name, ok in checks.items():
+            checks_total[name] = checks_total.get(name, 0) + int(ok)
+        text_scores.append(text_score)
+    elapsed = time.perf_counter() - started
+
+    done = len(corpus) - len(errors)
+    return {
+        "throughput": {
+            "docs_per_s": done / elapsed if elapsed else 0.0,
+            "pages_per_s": pages_done / elapsed if elapsed else 0.0,
+        },
+        "stages": {
+            stage: {
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "sum": sum(values),
+            }
+            for stage, values in stage_values.items()
+        },
+        "accuracy": {
+            **{name: count / done for name, count in checks_total.items()},
+            "text_similarity": sum(text_scores) / len(text_scores) if text_scores else 0.0,
+        } if done else {},
+        "documents": done,
+        "pages": pages_done,
+        "seconds": elapsed,
+        "errors": errors,
+    }
+
+
+def _large_pdf_task(pdf_path, workers, options):
+    # runs in a fresh child: ru_maxrss starts at the forked size
+    OCRParser = load_module("ocr_parser").OCRParser
+    start_rss = peak_rss_mb()
+    started = time.perf_counter()
+    pages = OCRParser.run_pdf_source_pages(pdf_path, workers=workers, options=options)
+    return len(pages), time.perf_counter() - started, start_rss, peak_rss_mb()
+
+
+def run_large_pdf(args, tmp_dir):
+    """
+    Peak RSS of OCRing one long PDF, measured in its own process so the
+    corpus run does not hide it. Must stay flat as --large-pages grows.
+    """
+    path = os.path.join(tmp_dir, "large.pdf")
+    build_large_pdf(path, args.large_pages, args.seed)
+    options = dict(ocr_options(args), page_policy="all")
+    ctx = multiprocessing.get_context("fork")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        pages, seconds, start_rss, peak = pool.submit(_large_pdf_task, path, args.workers, options).result()
+    return {
+        "pages": pages,
+        "file_mb": os.path.getsize(path) / 1024.0 / 1024.0,
+        "seconds": seconds,
+        "peak_rss_mb": peak,
+        "rss_growth_mb": peak - start_rss,
+    }
+
+
+# =========================
+# BASELINE
+# =========================
+def comparable_metrics(results):
+    """
+    {name: (value, higher_is_better, kind)} for the baseline comparison.
+    kind "relative" uses --tolerance, "absolute" --accuracy-tolerance.
+    """
+    metrics = {}
+    for name, value in results["throughput"].items():
+        metrics[f"throughput.{name}"] = (value, True, "relative")
+    for stage, stats in results["stages"].items():
+        if stats["p95"] >= MIN_STAGE_SECONDS:
+            metrics[f"stages.{stage}.p95"] = (stats["p95"], False, "relative")
+    metrics["memory.peak_rss_mb"] = (results["memory"]["peak_rss_mb"], False, "relative")
+    large = results["memory"].get("large_pdf")
+    if large:
+        metrics["memory.large_pdf.rss_growth_mb"] = (large["rss_growth_mb"], False, "relative")
+    for name, value in results["accuracy"].items():
+        metrics[f"accuracy.{name}"] = (value, True, "absolute")
+    return metrics
+
+
+def compare(results, baseline, tolerance, accuracy_tolerance):
+    """
+    Print current vs baseline for every metric present in both.
+    Returns the names of the regressed metrics.
+    """
+    if baseline.get("config") != results["config"]:
+        print("warning: baseline was recorded with a different configuration")
+        for key in sorted(set(baseline.get("config", {})) | set(results["config"])):
+            old, new = baseline.get("config", {}).get(key), results["config"].get(key)
+            if old != new:
+                print(f"    {key}: {old} -> {new}")
+
+    current = comparable_metrics(results)
+    previous = comparable_metrics(baseline)
+    regressions = []
+    print(f"\n{'metric':<36} {'baseline':>10} {'current':>10} {'change':>9}")
+    for name, (value, higher_is_better, kind) in current.items():
+        if name not in previous:
+            continue
+        old = previous[name][0]
+        if kind == "absolute":
+            delta = value - old
+            change = f"{delta:+.3f}"
+            worse = (-delta if higher_is_better else delta) > accuracy_tolerance
+        else:
+            delta = (value - old) / old if old else 0.0
+            change = f"{100 * delta:+.1f}%"
+            worse = (-delta if higher_is_better else delta) > tolerance
+        if worse:
+            regressions.append(name)
+        print(f"{name:<36} {old:>10.4f} {value:>10.4f} {change:>9}{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+# =========================
+# REPORT
+# =========================
+def print_report(results):
+    config = results["config"]
+    run = results["run"]
+    print(
+        f"{run['documents']} documents, {run['pages']} pages OCRed in {run['seconds']:.1f} s "
+        f"(engine {config['engine']}, workers {config['workers']}, policy {config['page_policy']})"
+    )
+    print(
+        f"throughput  {results['throughput']['docs_per_s']:.2f} docs/s   "
+        f"{results['throughput']['pages_per_s']:.2f} pages/s"
+    )
+    print(f"\n{'stage':<12} {'p50 ms':>9} {'p95 ms':>9} {'sum s':>8}")
+    for stage in STAGES + sorted(set(results["stages"]) - set(STAGES)):
+        stats = results["stages"].get(stage)
+        if stats:
+            print(f"{stage:<12} {1000 * stats['p50']:>9.1f} {1000 * stats['p95']:>9.1f} {stats['sum']:>8.2f}")
+
+    memory = results["memory"]
+    print(f"\npeak RSS    {memory['peak_rss_mb']:.1f} MB")
+    large = memory.get("large_pdf")
+    if large:
+        print(
+            f"large PDF   {large['pages']} pages ({large['file_mb']:.1f} MB) in {large['seconds']:.1f} s, "
+            f"peak RSS {large['peak_rss_mb']:.1f} MB (+{large['rss_growth_mb']:.1f} MB)"
+        )
+
+    print()
+    for name, value in results["accuracy"].items():
+        print(f"{name:<18} {value:6.3f}")
+    for error in run["errors"]:
+        print(f"error: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=24)
+    parser.add_argument("--max-pages", type=int, default=4, help="pages per PDF: 1..max")
+    parser.add_argument("--scales", default="0.75,1.0,1.5", help="page scale, 1.0 = A4 at 300 dpi")
+    parser.add_argument("--noise", default="0,0.03", help="salt & pepper noise levels")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="page workers per PDF")
+    parser.add_argument("--engine", default="pytesseract")
+    parser.add_argument("--threshold", default="fixed")
+    parser.add_argument("--text-height", type=int, default=0)
+    parser.add_argument("--crop", action="store_true")
+    parser.add_argument("--deskew", action="store_true")
+    parser.add_argument("--page-policy", default="all", choices=["all", "first_last"])
+    parser.add_argument("--lang", default="auto", choices=["auto", "eng", "tha", "tha+eng"])
+    parser.add_argument("--born-digital", action="store_true", help="English PDFs with a text layer")
+    parser.add_argument("--no-text-layer", dest="text_layer", action="store_false", help="always OCR PDFs")
+    parser.add_argument("--large-pages", type=int, default=50, help="pages of the RSS test PDF, 0 = skip")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with a previous --output file")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown / growth")
+    parser.add_argument("--accuracy-tolerance", type=float, default=0.02, help="allowed absolute accuracy drop")
+    args = parser.parse_args()
+
+    # read first, --output may point at the same file
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    OCRParser = load_module("ocr_parser").OCRParser
+
+    config = {
+        key: getattr(args, key)
+        for key in ("docs", "max_pages", "scales", "noise", "seed", "workers", "engine",
+                    "threshold", "text_height", "crop", "deskew", "page_policy", "born_digital",
+                    "text_layer", "large_pages")
+    }
+    with tempfile.TemporaryDirectory(prefix="ocr_bench_") as tmp_dir:
+        corpus = build_corpus(args, tmp_dir)
+        run = run_corpus(OCRParser, corpus, args)
+        memory = {"peak_rss_mb": peak_rss_mb()}
+        if args.large_pages:
+            memory["large_pdf"] = run_large_pdf(args, tmp_dir)
+
+    results = {
+        "config": config,
+        "throughput": run.pop("throughput"),
+        "stages": run.pop("stages"),
+        "accuracy": run.pop("accuracy"),
+        "memory": memory,
+        "run": run,
+    }
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance, args.accuracy_tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("\nno regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
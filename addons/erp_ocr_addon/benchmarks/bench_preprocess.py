@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Latency / accuracy tradeoff of the preprocessing pipelines.
+
+    python benchmarks/bench_preprocess.py [--docs 6] [--no-ocr]
+
+Every configuration runs on the same synthetic pages (A4 scans,
+~17 MP phone-sized pages, some noisy, and 12 MP phone photos of the page
+on a dark table). The text height estimate of every page is listed
+first: on the photos the table must not count as ink, then the tilt
+skew_angle finds on pages turned by 2 degrees. "legacy" is the pipeline
+before ocr_preprocess: grayscale + fixed threshold through a lambda, no
+resize; "default" is ocr_preprocess with its DEFAULTS.
+Accuracy is the character similarity of the Tesseract output with the
+ground truth text; --no-ocr only times the preprocessing.
+"""
+import argparse
+import time
+
+from PIL import Image
+import pytesseract
+
+from common import load_module, similarity
+import synthetic
+
+DOWNSCALE = {"text_height": 40, "max_pixels": 12000000}
+
+CONFIGS = {
+    "legacy": None,
+    "default": {},
+    "fixed+downscale": dict(DOWNSCALE, threshold="fixed"),
+    "otsu+downscale": dict(DOWNSCALE, threshold="otsu"),
+    "adaptive+downscale": dict(DOWNSCALE, threshold="adaptive"),
+    "otsu+downscale+crop": dict(DOWNSCALE, threshold="otsu", crop=True),
+    "otsu+all+deskew": dict(DOWNSCALE, threshold="otsu", crop=True, deskew=True),
+}
+
+SKEW_DEGREES = 2.0
+
+
+def legacy_preprocess(image):
+    image = image.convert("L")
+    return image.point(lambda x: 0 if x < 180 else 255, "1")
+
+
+def phone_photo(page, size=(3000, 4000), background=45):
+    # the page lying on a dark table, filling ~60% of a 12 MP frame
+    photo = Image.new("RGB", size, (background,) * 3)
+    paper = page.copy()
+    paper.thumbnail((int(size[0] * 0.6), int(size[1] * 0.85)))
+    photo.paste(paper, ((size[0] - paper.size[0]) // 2, (size[1] - paper.size[1]) // 2))
+    return photo
+
+
+def build_corpus(count):
+    thai = synthetic.thai_font_available()
+    corpus = []
+    for seed in range(count):
+        doc = synthetic.make_document(seed=seed, thai=thai and seed % 2 == 1)
+        for scale, noise in ((1.0, 0.0), (1.4, 0.02)):
+            page = synthetic.render_page(doc["lines"], scale=scale, noise=noise, thai=thai, seed=seed)
+            corpus.append((f"doc{seed}@{scale}x", page, doc["text"]))
+        page = synthetic.render_page(doc["lines"], scale=1.4, thai=thai, seed=seed)
+        corpus.append((f"doc{seed}@photo", phone_photo(page), doc["text"]))
+    return corpus
+
+
+def report_text_height(corpus, estimate_text_height, downscale):
+    print(f"{'page':<14} {'size':>11} {'text height':>12} {'downscaled':>11}")
+    for name, page, _truth in corpus:
+        gray = page.convert("L")
+        height = estimate_text_height(gray)
+        size = downscale(gray, DOWNSCALE["text_height"], DOWNSCALE["max_pixels"]).size
+        print(
+            f"{name:<14} {gray.size[0]:>5}x{gray.size[1]:<5} "
+            f"{height if height is None else round(height, 1)!s:>12} {size[0]:>5}x{size[1]:<5}"
+        )
+    print()
+
+
+def report_skew(corpus, skew_angle):
+    print(f"{'page':<14} {'turned':>7} {'found':>7} {'ms':>7}")
+    for name, page, _truth in corpus:
+        gray = page.convert("L").rotate(SKEW_DEGREES, Image.BILINEAR, expand=True, fillcolor=255)
+        started = time.perf_counter()
+        angle = skew_angle(gray)
+        elapsed = time.perf_counter() - started
+        print(f"{name:<14} {SKEW_DEGREES:>7.1f} {-angle:>7.1f} {1000 * elapsed:>7.1f}")
+    print()
+
+
+def run(corpus, name, options, do_ocr, OCRParser, preprocess):
+    prep_time = ocr_time = 0.0
+    scores = []
+    pixels = 0
+    for _, page, truth in corpus:
+        started = time.perf_counter()
+        image = legacy_preprocess(page) if options is None else preprocess(page, options)
+        prep_time += time.perf_counter() - started
+        pixels += image.size[0] * image.size[1]
+
+        if do_ocr:
+            started = time.perf_counter()
+            text = pytesseract.image_to_string(image, config=OCRParser.OCR_CONFIG)
+            ocr_time += time.perf_counter() - started
+            scores.append(similarity(truth, text))
+
+    n = len(corpus)
+    accuracy = (sum(scores) / len(scores)) if scores else float("nan")
+    print(
+        f"{name:<22} prep {1000 * prep_time / n:8.1f} ms/page   "
+        f"ocr {1000 * ocr_time / n:8.1f} ms/page   "
+        f"avg {pixels / n / 1e6:5.1f} MP   accuracy {accuracy:6.3f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=6)
+    parser.add_argument("--no-ocr", action="store_true")
+    args = parser.parse_args()
+
+    OCRParser = load_module("ocr_parser").OCRParser
+    ocr_preprocess = load_module("ocr_preprocess")
+    preprocess = ocr_preprocess.preprocess
+
+    corpus = build_corpus(args.docs)
+    report_text_height(corpus, ocr_preprocess.estimate_text_height, ocr_preprocess.downscale)
+    report_skew(corpus, ocr_preprocess.skew_angle)
+    print(f"{len(corpus)} pages, OCR config: {OCRParser.OCR_CONFIG}")
+    for name, options in CONFIGS.items():
+        if args.no_ocr and options and options.get("deskew"):
+            continue  # OSD needs tesseract
+        run(corpus, name, options, not args.no_ocr, OCRParser, preprocess)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Shared helpers for the benchmark scripts (run them from this folder's
+parent or anywhere: `python benchmarks/<script>.py`). No Odoo needed.
+"""
+import difflib
+import importlib
+import os
+import resource
+import sys
+import types
+
+MODELS_DIR = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models")
+)
+
+
+def load_module(name):
+    """
+    Import models/<name>.py without running the addon __init__ (which
+    imports Odoo). Relative imports between those modules keep working.
+    """
+    if "erp_ocr_models" not in sys.modules:
+        pkg = types.ModuleType("erp_ocr_models")
+        pkg.__path__ = [MODELS_DIR]
+        sys.modules["erp_ocr_models"] = pkg
+    return importlib.import_module(f"erp_ocr_models.{name}")
+
+
+def similarity(expected, actual):
+    """
+    Character level similarity (0..1), whitespace-insensitive.
+    """
+    a = " ".join((expected or "").split())
+    b = " ".join((actual or "").split())
+    if not a and not b:
+        return 1.0
+    return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process and its finished children, in MB.
+    """
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024.0
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic Thai/English invoices and receipts with known ground truth.
+
+    doc = make_document(seed=1, thai=True)
+    image = render_page(doc["lines"], scale=1.5, noise=0.05)
+
+The text follows the layouts OCRParser.extract_fields understands, so the
+ground truth fields can be compared 1:1 with the parser output.
+"""
+import io
+import random
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+THAI_FONTS = [
+    "/usr/share/fonts/truetype/tlwg/Garuda.ttf",
+    "/usr/share/fonts/truetype/tlwg/Loma.ttf",
+    "/usr/share/fonts/truetype/noto/NotoSansThai-Regular.ttf",
+    "/usr/share/fonts/opentype/noto/NotoSansThai-Regular.ttf",
+]
+LATIN_FONTS = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+]
+
+VENDORS_EN = [
+    "ACME Trading Co., Ltd.",
+    "Bangkok Office Supply",
+    "Northwind Foods Ltd.",
+    "Sunrise Coffee House",
+    "Global Parts Company",
+]
+VENDORS_TH = [
+    "บริษัท สยามซัพพลาย จำกัด",
+    "บริษัท กรุงเทพการค้า จำกัด",
+    "บริษัท ไทยอาหาร จำกัด",
+]
+ITEMS_EN = ["Coffee", "Paper A4", "Printer Ink", "Stapler", "Green Tea", "Cable", "Notebook"]
+ITEMS_TH = ["กาแฟ", "กระดาษ", "หมึกพิมพ์", "ชาเขียว", "สมุด"]
+
+# A4 at 300 dpi
+PAGE_SIZE = (2480, 3508)
+
+
+def _font(paths, size):
+    for path in paths:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+
+def thai_font_available():
+    for path in THAI_FONTS:
+        try:
+            ImageFont.truetype(path, 10)
+            return True
+        except OSError:
+            continue
+    return False
+
+
+def make_document(seed=0, doc_type="receipt", thai=False, item_count=5):
+    """
+    Return {"lines": [...], "text": str, "fields": ground truth}.
+    """
+    rnd = random.Random(seed)
+    vendor = rnd.choice(VENDORS_TH if thai else VENDORS_EN)
+    names = ITEMS_TH if thai else ITEMS_EN
+
+    day, month, year = rnd.randint(1, 28), rnd.randint(1, 12), rnd.randint(2023, 2026)
+    date_raw = f"{day:02d}/{month:02d}/{year}"
+
+    items = []
+    for _ in range(item_count):
+        items.append({
+            "name": rnd.choice(names),
+            "qty": float(rnd.randint(1, 9)),
+            "price": round(rnd.uniform(10, 900), 2),
+        })
+    subtotal = round(sum(i["qty"] * i["price"] for i in items), 2)
+    vat = round(subtotal * 0.07, 2)
+    total = round(subtotal + vat, 2)
+
+    title = "TAX INVOICE" if doc_type == "invoice" else "RECEIPT"
+    lines = [vendor, title, f"Date {date_raw}", ""]
+    lines += [f"{int(i['qty'])} {i['name']} {i['price']:.2f}" for i in items]
+    lines += [
+        "",
+        f"Subtotal {subtotal:,.2f}",
+        (f"ภาษีมูลค่าเพิ่ม {vat:,.2f}" if thai else f"VAT {vat:,.2f}"),
+        (f"รวมทั้งสิ้น {total:,.2f}" if thai else f"TOTAL {total:,.2f}"),
+        "Thank you",
+    ]
+
+    return {
+        "lines": lines,
+        "text": "\n".join(lines),
+        "fields": {
+            "vendor_name": vendor,
+            "invoice_date_raw": date_raw,
+            "vat_amount": vat,
+            "total_amount": total,
+            "item_count": len(items),
+        },
+    }
+
+
+def render_page(lines, scale=1.0, font_size=42, noise=0.0, blur=0.0, rotate=0.0,
+                thai=False, seed=0):
+    """
+    Draw text lines on an A4 page. scale > 1 simulates high resolution
+    phone photos, noise adds salt & pepper, blur/rotate add camera shake.
+    """
+    rnd = random.Random(seed)
+    font = _font((THAI_FONTS + LATIN_FONTS) if thai else LATIN_FONTS, int(font_size * scale))
+    size = (int(PAGE_SIZE[0] * scale), int(PAGE_SIZE[1] * scale))
+    image = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(image)
+
+    x, y = int(200 * scale), int(250 * scale)
+    step = int(font_size * 1.6 * scale)
+    for line in lines:
+        draw.text((x, y), line, fill=0, font=font)
+        y += step
+
+    if noise:
+        pixels = image.load()
+        count = int(size[0] * size[1] * noise / 50)
+        for _ in range(count):
+            px, py = rnd.randrange(size[0]), rnd.randrange(size[1])
+            pixels[px, py] = 0 if rnd.random() < 0.5 else 255
+    if blur:
+        image = image.filter(ImageFilter.GaussianBlur(blur * scale))
+    if rotate:
+        image = image.rotate(rotate, expand=True, fillcolor=255)
+    return image.convert("RGB")
+
+
+def to_png(image):
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def to_jpeg(image, quality=85):
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def make_pdf(images, resolution=300):
+    buf = io.BytesIO()
+    first, rest = images[0], images[1:]
+    first.save(buf, format="PDF", save_all=True, append_images=rest, resolution=resolution)
+    return buf.getvalue()
+
+
+def _pdf_string(text):
+    text = text.encode("latin-1", "replace").decode("latin-1")
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+def make_text_pdf(pages, font_size=10):
+    """
+    Born-digital PDF: every page (a list of lines) written as text in the
+    standard Helvetica font, so pdftotext reads it back. Latin text only.
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 "
+               "/BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for lines in pages:
+        ops = [f"BT /F1 {font_size} Tf {font_size * 1.4:.1f} TL 50 790 Td"]
+        ops += [f"{_pdf_string(line)} Tj T*" for line in lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream.decode('latin-1')}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return bytes(out)
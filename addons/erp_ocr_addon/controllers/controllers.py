@@ -1,10 +1,225 @@
 # controllers/controllers.py
 # -*- coding: utf-8 -*-
-# You can leave this empty or add real routes later.
+import hmac
+import os
+import time
+import zipfile
+from datetime import timedelta
 
-# from odoo import http
+from odoo import api, fields, http, _
+from odoo.http import request
+from odoo.tools import str2bool
 
-# class ErpOcrAddon(http.Controller):
-#     @http.route('/erp_ocr_addon/health', auth='public')
-#     def index(self, **kw):
-#         return "OK"
+from ..wizard.ocr_export_wizard import MIMETYPES
+
+# zip members bigger than this are skipped (zip bomb guard)
+MAX_MEMBER_SIZE = 50 * 1024 * 1024
+
+
+class ErpOcrAddon(http.Controller):
+
+    # =========================
+    # BULK UPLOAD
+    # =========================
+    @http.route("/erp_ocr_addon/upload", type="http", auth="user", methods=["POST"])
+    def upload(self, doc_type="invoice", queue="", split="0", **kw):
+        """
+        Multipart upload of many files at once (form field "files", may
+        be repeated). PDFs and images are stored as-is; .zip files are
+        unpacked and every PDF/image inside becomes a document.
+
+        doc_type  invoice (default) or receipt
+        queue     "" (just create), "document" (one OCR job per document)
+                  or "batch" (one ocr.batch for the whole upload)
+        split     "1" when the PDFs are stacks of scanned documents, OCR
+                  then creates one document per detected document
+
+        Like Odoo's own upload routes the form needs a csrf_token field.
+        Returns a JSON summary.
+        """
+        started = time.perf_counter()
+        if doc_type not in ("invoice", "receipt"):
+            return request.make_json_response(
+                {"error": _("doc_type must be invoice or receipt")}, status=400
+            )
+        if queue not in ("", "document", "batch"):
+            return request.make_json_response(
+                {"error": _("queue must be empty, document or batch")}, status=400
+            )
+
+        # werkzeug spools big parts to temp files, they are read one at a time
+        files = request.httprequest.files.getlist("files")
+        Document = request.env["ocr.document"]
+        too_large = []
+        docs, skipped = Document._create_from_uploads(
+            _iter_uploads(files, too_large), doc_type=doc_type, split=str2bool(split, False)
+        )
+        skipped += too_large
+
+        summary = {
+            "created": len(docs),
+            "document_ids": docs.ids,
+            "skipped": [{"filename": name, "reason": reason} for name, reason in skipped],
+            "queue": None,
+            "job_ids": [],
+            "batch_id": None,
+        }
+
+        if docs and queue == "batch":
+            action = docs.action_batch_run_ocr()
+            batch = request.env["ocr.batch"].browse(action["res_id"])
+            summary["batch_id"] = batch.id
+            summary["job_ids"] = request.env["ocr.job"].search([("batch_id", "=", batch.id)]).ids
+            summary["queue"] = queue
+        elif docs and queue == "document":
+            docs.action_run_ocr()
+            summary["job_ids"] = docs.job_ids.ids
+            summary["queue"] = queue
+
+        summary["seconds"] = round(time.perf_counter() - started, 3)
+        return request.make_json_response(summary)
+
+
+    # =========================
+    # PAGE THUMBNAILS
+    # =========================
+    @http.route("/erp_ocr_addon/thumbnail/<int:document_id>", type="http", auth="user", methods=["GET"])
+    def thumbnail(self, document_id, page="1", width="160", unique=None, **kw):
+        """
+        Scaled down page of a document's file (WebP, or PNG), see
+        ocr.thumbnail; page 1 is the first page of a split document's
+        range. Served with the file checksum as ETag (304 on revalidation)
+        and, when `unique` matches the file (as in
+        ocr.document.thumbnail_url), cached by the browser for a year.
+        """
+        try:
+            page, width = int(page), int(width)
+        except ValueError:
+            return request.not_found()
+        doc = request.env["ocr.document"].browse(document_id).exists()
+        if not doc or page < 1:
+            return request.not_found()
+        doc.check_access_rights("read")
+        doc.check_access_rule("read")
+
+        attachment = doc._get_file_attachments().get(doc.id)
+        page += (doc.page_from or 1) - 1
+        if not attachment or not attachment.checksum or (doc.page_to and page > doc.page_to):
+            return request.not_found()
+        thumbnail = request.env["ocr.thumbnail"].sudo()._get(attachment, page, width)
+        if not thumbnail:
+            return request.not_found()
+
+        stream = request.env["ir.binary"]._get_stream_from(
+            thumbnail, "image", filename=f"page_{page}", mimetype=thumbnail.mimetype
+        )
+        return stream.get_response(immutable=bool(unique) and attachment.checksum.startswith(unique))
+
+    # =========================
+    # BULK EXPORT
+    # =========================
+    @http.route("/erp_ocr_addon/export/<int:wizard_id>", type="http", auth="user", methods=["GET"])
+    def export(self, wizard_id, **kw):
+        """
+        The file of an ocr.export.wizard, streamed chunk by chunk while
+        the documents are read (see ocr.export.wizard._iter_export).
+        """
+        wizard = request.env["ocr.export.wizard"].browse(wizard_id).exists()
+        if not wizard:
+            return request.not_found()
+        wizard.check_access_rule("read")
+
+        registry, uid, context = request.env.registry, request.env.uid, dict(request.env.context)
+
+        def stream():
+            # runs after the request cursor is closed: read on a cursor of its own
+            with registry.cursor() as cr:
+                env = api.Environment(cr, uid, context)
+                yield from env["ocr.export.wizard"].browse(wizard_id)._iter_export()
+
+        return request.make_response(stream(), [
+            ("Content-Type", MIMETYPES[wizard.export_format]),
+            ("Content-Disposition", http.content_disposition(wizard._get_filename())),
+        ])
+
+    # =========================
+    # PROMETHEUS METRICS
+    # =========================
+    @http.route("/erp_ocr_addon/metrics", type="http", auth="none", methods=["GET"], csrf=False)
+    def metrics(self, hours="24", **kw):
+        """
+        Prometheus text exposition: per-stage OCR timings (summary with
+        p50/p95) over the last `hours`, job queue depth by state and
+        today's cache hits/misses. Needs "Authorization: Bearer <token>"
+        with the erp_ocr_addon.metrics_token system parameter.
+        """
+        env = request.env(su=True)
+        token = env["ir.config_parameter"].get_param("erp_ocr_addon.metrics_token")
+        auth = request.httprequest.headers.get("Authorization", "")
+        if not token or not hmac.compare_digest(auth, f"Bearer {token}"):
+            return request.make_response("Forbidden", [("Content-Type", "text/plain")], status=403)
+
+        try:
+            window = max(float(hours), 0.0)
+        except ValueError:
+            window = 24.0
+        since = fields.Datetime.now() - timedelta(hours=window)
+
+        out = [
+            f"# HELP ocr_stage_duration_seconds Seconds per OCR pipeline stage and document, last {window:g}h",
+            "# TYPE ocr_stage_duration_seconds summary",
+        ]
+        for stage, count, total, p50, p95 in env["ocr.metric"]._stage_stats(since):
+            out += [
+                f'ocr_stage_duration_seconds{{stage="{stage}",quantile="0.5"}} {p50:.6f}',
+                f'ocr_stage_duration_seconds{{stage="{stage}",quantile="0.95"}} {p95:.6f}',
+                f'ocr_stage_duration_seconds_sum{{stage="{stage}"}} {total:.6f}',
+                f'ocr_stage_duration_seconds_count{{stage="{stage}"}} {count}',
+            ]
+
+        out += [
+            "# HELP ocr_jobs OCR jobs by state",
+            "# TYPE ocr_jobs gauge",
+        ]
+        counts = dict(env["ocr.job"]._read_group([], ["state"], ["__count"]))
+        for state in ("pending", "running", "done", "failed"):
+            out.append(f'ocr_jobs{{state="{state}"}} {counts.get(state, 0)}')
+
+        Stat = env["ocr.cache.stat"]
+        hits, misses = Stat._counts(Stat._today())
+        out += [
+            "# HELP ocr_cache_lookups_today OCR cache lookups since midnight (UTC)",
+            "# TYPE ocr_cache_lookups_today gauge",
+            f'ocr_cache_lookups_today{{result="hit"}} {hits}',
+            f'ocr_cache_lookups_today{{result="miss"}} {misses}',
+        ]
+
+        return request.make_response(
+            "\n".join(out) + "\n",
+            [("Content-Type", "text/plain; version=0.0.4; charset=utf-8")],
+        )
+
+
+def _iter_uploads(files, too_large):
+    """
+    Yield (filename, bytes) for every uploaded file, unpacking zip files.
+    Oversized zip members are reported in `too_large` instead.
+    """
+    for storage in files:
+        filename = os.path.basename(storage.filename or "upload")
+        head = storage.stream.read(4)
+        storage.stream.seek(0)
+
+        if head != b"PK\x03\x04":
+            yield filename, storage.read()
+            continue
+
+        with zipfile.ZipFile(storage.stream) as archive:
+            for info in archive.infolist():
+                name = os.path.basename(info.filename)
+                if info.is_dir() or not name or info.filename.startswith("__MACOSX/"):
+                    continue
+                if info.file_size > MAX_MEMBER_SIZE:
+                    too_large.append((name, _("larger than %s MB", MAX_MEMBER_SIZE // 1024 // 1024)))
+                    continue
+                yield name, archive.read(info)
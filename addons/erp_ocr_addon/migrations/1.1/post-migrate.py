@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+
+
+def migrate(cr, version):
+    # page_min_confidence is compared with the Tesseract word confidence
+    # now; 0.9 was the default on the rule heuristic's scale
+    cr.execute("""
+        UPDATE ir_config_parameter
+           SET value = '0.8'
+         WHERE key = 'erp_ocr_addon.page_min_confidence'
+           AND value = '0.9'
+    """)
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+
+def migrate(cr, version):
+    # text height downscaling is off by default now (see ocr_preprocess);
+    # databases still on the old default follow, changed values stay
+    cr.execute("""
+        UPDATE ir_config_parameter
+           SET value = '0'
+         WHERE key = 'erp_ocr_addon.preprocess_text_height'
+           AND value = '40'
+    """)
+
+    # one OCR worker by default: a pool forks the Odoo process
+    cr.execute("""
+        UPDATE ir_config_parameter
+           SET value = '1'
+         WHERE key = 'erp_ocr_addon.ocr_workers'
+           AND value = '4'
+    """)
+
+    # pytesseract is the default engine until tesserocr is benchmarked
+    cr.execute("""
+        UPDATE ir_config_parameter
+           SET value = 'pytesseract'
+         WHERE key = 'erp_ocr_addon.ocr_engine'
+           AND value = 'tesserocr'
+    """)
+
+    # the vendor fast path stores partial text only, it is opt-in now
+    cr.execute("""
+        UPDATE ir_config_parameter
+           SET value = 'False'
+         WHERE key = 'erp_ocr_addon.vendor_fast_path'
+           AND value = 'True'
+    """)
@@ -1,5 +1,12 @@
 # -*- coding: utf-8 -*-
 from . import ocr_parser
 from . import ocr_document
+from . import ocr_daily_summary
 # keep your dashboard if you already have it
 from . import ocr_dashboard
+from . import ocr_job
+from . import ocr_cache
+from . import ocr_batch
+from . import ocr_metric
+from . import ocr_vendor_profile
+from . import ocr_thumbnail
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+import time
+
+from odoo import models, fields, api, _
+
+from .ocr_parser import OCRParser
+
+
+class OCRBatch(models.Model):
+    """
+    Batch OCR of many selected documents (e.g. month-end receipts).
+
+    The documents are OCRed in parallel, one per pool worker, in chunks
+    whose results are saved in bulk (one unlink + one create(vals_list)
+    for all line items instead of several round trips per document) and
+    committed one chunk at a time.
+    """
+    _name = "ocr.batch"
+    _description = "OCR Batch"
+    _order = "id desc"
+
+    name = fields.Char(
+        required=True,
+        readonly=True,
+        default=lambda self: self.env["ir.sequence"].next_by_code("ocr.batch") or _("New"),
+    )
+    document_ids = fields.Many2many("ocr.document", string="Documents", readonly=True)
+    document_count = fields.Integer(readonly=True)
+    done_count = fields.Integer(readonly=True)
+    error_count = fields.Integer(readonly=True)
+    cache_hit_count = fields.Integer(readonly=True)
+    progress = fields.Integer(default=0, readonly=True)
+
+    state = fields.Selection(
+        [
+            ("pending", "Pending"),
+            ("running", "Running"),
+            ("done", "Done"),
+            ("failed", "Failed"),
+        ],
+        default="pending",
+        required=True,
+    )
+    started_at = fields.Datetime(readonly=True)
+    finished_at = fields.Datetime(readonly=True)
+    duration = fields.Float(string="Duration (s)", readonly=True)
+    log = fields.Text(readonly=True)
+
+    # =========================
+    # PROCESSING (called by ocr.job)
+    # =========================
+    def _process(self, heartbeat=None):
+        """
+        OCR the documents still "processing" in chunks of batch_chunk_size.
+        Every chunk is cached, saved and committed before the next one
+        starts, so a job requeued after its worker was killed (e.g. by
+        limit_time_real_cron) carries on with the documents left.
+        heartbeat: called with every progress update (see ocr.job).
+        """
+        self.ensure_one()
+        started = time.perf_counter()
+
+        docs = self.document_ids
+        vals = {"state": "running", "document_count": len(docs)}
+        if self.state != "running":
+            vals.update({
+                "started_at": fields.Datetime.now(),
+                "done_count": 0,
+                "error_count": 0,
+                "cache_hit_count": 0,
+                "progress": 0,
+                "duration": 0.0,
+            })
+        self.write(vals)
+        self.env.cr.commit()
+
+        ICP = self.env["ir.config_parameter"].sudo()
+        workers = int(ICP.get_param("erp_ocr_addon.ocr_workers", 1))
+        chunk_size = max(int(ICP.get_param("erp_ocr_addon.batch_chunk_size", 50)), 1)
+        index = self.env["ocr.vendor.profile"]._get_index()
+
+        todo = docs.filtered(lambda d: d.status == "processing")
+        self._set_progress(len(docs) - len(todo), heartbeat)
+        for offset in range(0, len(todo), chunk_size):
+            chunk = todo[offset:offset + chunk_size]
+            cache_hits = self._process_chunk(chunk, workers, index, len(docs) - len(todo) + offset, heartbeat)
+            # results, cache entries and counters land in the same commit
+            self.write({"cache_hit_count": self.cache_hit_count + cache_hits})
+            self._set_progress(len(docs) - len(todo) + offset + len(chunk), heartbeat)
+
+        elapsed = self.duration + time.perf_counter() - started
+        errors = len(docs.filtered(lambda d: d.status == "error"))
+        self.write({
+            "state": "done",
+            "finished_at": fields.Datetime.now(),
+            "done_count": len(docs),
+            "error_count": errors,
+            "progress": 100,
+            "duration": elapsed,
+            "log": _(
+                "%(docs)s document(s) in %(sec).2fs: %(ok)s OK, %(err)s error(s), "
+                "%(hits)s cache hit(s), %(workers)s worker(s)",
+                docs=len(docs), sec=elapsed, ok=len(docs) - errors, err=errors,
+                hits=self.cache_hit_count, workers=workers,
+            ),
+        })
+
+    def _process_chunk(self, docs, workers, index, done_before, heartbeat=None):
+        """
+        OCR, cache and save one chunk of documents. Returns the number of
+        cache hits.
+        """
+        Cache = self.env["ocr.cache"]
+        Document = self.env["ocr.document"]
+        results = {}
+        errors = {}
+        todo = []
+        options_by_type = {}
+        timings = {}
+        layouts = {}
+
+        # =========================
+        # STEP 1: OCR cache
+        # =========================
+        # one attachment search and one cache lookup for the whole chunk,
+        # their time shared out over the documents
+        step = time.perf_counter()
+        attachments = docs._get_file_attachments()
+        search_share = (time.perf_counter() - step) / (len(docs) or 1)
+        prepared = []
+        for doc in docs:
+            step = time.perf_counter()
+            source = Document._attachment_source(attachments.get(doc.id))
+            if not source:
+                errors[doc.id] = _("No file uploaded.")
+                continue
+            file_hash = OCRParser.sha256(source)
+            is_pdf = OCRParser.is_pdf(source)
+            options = options_by_type.setdefault(
+                (doc.doc_type, doc.split_mode), Document._get_ocr_options(doc.doc_type, doc.split_mode)
+            )
+            timings[doc.id] = {"source": search_share + time.perf_counter() - step}
+            prepared.append((doc, source, file_hash, is_pdf, options))
+
+        step = time.perf_counter()
+        cached = Cache._lookup_many([(file_hash, options) for _doc, _source, file_hash, _pdf, options in prepared])
+        lookup_share = (time.perf_counter() - step) / (len(prepared) or 1)
+        for (doc, source, file_hash, is_pdf, options), found in zip(prepared, cached):
+            timings[doc.id]["cache"] = lookup_share
+            if found is None:
+                layouts[doc.id] = {}
+                todo.append((doc, source, file_hash, is_pdf, options))
+            else:
+                pages, layouts[doc.id] = found
+                text = OCRParser.join_pages(pages) if is_pdf else pages[0]
+                results[doc.id] = (text, [f"OCR cache hit ({file_hash[:12]}), batch {self.name}"])
+        cache_hits = len(results)
+
+        # =========================
+        # STEP 2: OCR the rest in parallel
+        # =========================
+        def progress(done, total):
+            self._set_progress(done_before + cache_hits + len(errors) + done, heartbeat)
+
+        outcomes = OCRParser.run_batch_ocr(
+            [
+                (source, is_pdf, options, None if doc.split_mode else index)
+                for doc, source, _hash, is_pdf, options in todo
+            ],
+            workers=workers,
+            progress_callback=progress,
+        )
+        for (doc, _source, file_hash, is_pdf, options), outcome in zip(todo, outcomes):
+            pages, seconds, error, stages, fast_path, layouts[doc.id] = outcome
+            OCRParser.add_timings(timings[doc.id], stages)
+            if error:
+                errors[doc.id] = error
+                continue
+            text = OCRParser.join_pages(pages) if is_pdf else pages[0]
+            if fast_path:
+                # partial text, keep it out of the cache
+                results[doc.id] = (text, [f"Vendor fast path {seconds:.2f}s, batch {self.name}"])
+                continue
+            Cache._store(file_hash, "pdf" if is_pdf else "image", pages, options, layouts[doc.id])
+            results[doc.id] = (text, [f"OCR {seconds:.2f}s, batch {self.name}"])
+
+        # =========================
+        # STEP 3: bulk save
+        # =========================
+        ok_docs = docs.filtered(lambda d: d.id in results)
+        ok_docs._save_ocr_results(results, timings=timings, layouts=layouts)
+        self.env["ocr.metric"]._record(
+            {doc_id: stages for doc_id, stages in timings.items() if doc_id in results},
+            batch=self,
+        )
+        (ok_docs | ok_docs.child_ids)._warm_thumbnails()
+        (ok_docs | ok_docs.child_ids)._detect_duplicates()
+
+        for doc in docs.filtered(lambda d: d.id in errors):
+            doc.write({
+                "status": "error",
+                "progress": 0,
+                "extraction_log": (doc.extraction_log or "") + errors[doc.id] + "\n",
+            })
+        return cache_hits
+
+    def _set_progress(self, done, heartbeat=None):
+        total = self.document_count or 1
+        self.write({
+            "done_count": done,
+            # 100 once the batch is done
+            "progress": min(int(100 * done / total), 99),
+        })
+        if heartbeat:
+            heartbeat()
+        self.env.cr.commit()
+
+    def _mark_failed(self, message):
+        self.write({
+            "state": "failed",
+            "finished_at": fields.Datetime.now(),
+            "log": message,
+        })
+        self.document_ids.filtered(lambda d: d.status == "processing").write({
+            "status": "error",
+        })
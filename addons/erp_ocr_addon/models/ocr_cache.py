@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+import base64
+import hashlib
+import json
+from datetime import timedelta
+
+import psycopg2
+
+from odoo import models, fields, api
+
+from . import ocr_layout, ocr_preprocess
+from .ocr_parser import OCRParser
+
+
+class OCRCache(models.Model):
+    """
+    Raw Tesseract output keyed on the file content and the OCR settings,
+    so duplicate uploads and re-runs only redo extract_fields.
+    """
+    _name = "ocr.cache"
+    _description = "OCR Result Cache"
+    _order = "last_used desc"
+
+    key = fields.Char(required=True, index=True, readonly=True)
+    file_hash = fields.Char(string="File SHA-256", index=True, readonly=True)
+    file_type = fields.Selection([("pdf", "PDF"), ("image", "Image")], readonly=True)
+    ocr_config = fields.Char(readonly=True)
+    dpi = fields.Integer(readonly=True)
+    preprocess_version = fields.Char(readonly=True)
+
+    page_texts = fields.Text(readonly=True)  # JSON list, one entry per page
+    page_layouts = fields.Text(readonly=True)  # base64 ocr_layout.dumps of the OCRed pages
+    page_count = fields.Integer(readonly=True)
+    text_size = fields.Integer(readonly=True)
+
+    hit_count = fields.Integer(default=0, readonly=True)
+    last_used = fields.Datetime(default=lambda self: fields.Datetime.now(), index=True, readonly=True)
+
+    _sql_constraints = [
+        ("key_unique", "unique(key)", "OCR cache key must be unique."),
+    ]
+
+    # =========================
+    # KEYS
+    # =========================
+    @api.model
+    def _make_key(self, file_hash, options=None):
+        if options is None:
+            options = self.env["ocr.document"]._get_ocr_options()
+        options = ocr_preprocess.with_defaults(options)
+        # both engines drive the same libtesseract + traineddata
+        options.pop("engine", None)
+        raw = "|".join([
+            file_hash,
+            OCRParser.OCR_CONFIG,
+            str(OCRParser.PDF_DPI),
+            OCRParser.PREPROCESS_VERSION,
+            json.dumps(options, sort_keys=True),
+        ])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # =========================
+    # LOOKUP / STORE
+    # =========================
+    @api.model
+    def _lookup(self, file_hash, options=None, layouts=None):
+        """
+        Return the cached page texts for this file, or None on a miss.
+        options: the OCR options the text is wanted for (default: the
+        ones without a doc_type, see ocr.document._get_ocr_options).
+        The cached word boxes are added to `layouts` (a dict) when given.
+        """
+        found = self._lookup_many([(file_hash, options)])[0]
+        if found is None:
+            return None
+        pages, page_layouts = found
+        if layouts is not None:
+            layouts.update(page_layouts)
+        return pages
+
+    @api.model
+    def _lookup_many(self, requests):
+        """
+        _lookup for a whole batch in one statement. requests: a list of
+        (file_hash, options); returns one (page texts, {page number:
+        PageWords}) per request, None on a miss.
+        """
+        keys = [self._make_key(file_hash, options) for file_hash, options in requests]
+        if not keys:
+            return []
+        # rows locked in id order: concurrent batches cannot deadlock
+        self.env.cr.execute("""
+            UPDATE ocr_cache
+               SET hit_count = hit_count + 1,
+                   last_used = (now() at time zone 'UTC')
+             WHERE id IN (
+                    SELECT id FROM ocr_cache
+                     WHERE key = ANY(%s)
+                  ORDER BY id
+                       FOR UPDATE)
+         RETURNING key, page_texts, page_layouts
+        """, (list(set(keys)),))
+        rows = {key: (texts, layouts) for key, texts, layouts in self.env.cr.fetchall()}
+        self.invalidate_model(["hit_count", "last_used"])
+
+        results = []
+        for key in keys:
+            row = rows.get(key)
+            if row is None:
+                results.append(None)
+                continue
+            texts, layouts = row
+            results.append((json.loads(texts), ocr_layout.loads(base64.b64decode(layouts)) if layouts else {}))
+        hits = sum(1 for found in results if found is not None)
+        self.env["ocr.cache.stat"]._bump(hits=hits, misses=len(results) - hits)
+        return results
+
+    @api.model
+    def _store(self, file_hash, file_type, pages, options=None, layouts=None):
+        key = self._make_key(file_hash, options)
+        vals = {
+            "key": key,
+            "file_hash": file_hash,
+            "file_type": file_type,
+            "ocr_config": OCRParser.OCR_CONFIG,
+            "dpi": OCRParser.PDF_DPI,
+            "preprocess_version": OCRParser.PREPROCESS_VERSION,
+            "page_texts": json.dumps(pages, ensure_ascii=False),
+            "page_layouts": base64.b64encode(ocr_layout.dumps(layouts)).decode() if layouts else False,
+            "page_count": len(pages),
+            "text_size": sum(len(p or "") for p in pages),
+        }
+        entry = self.search([("key", "=", key)], limit=1)
+        if entry:
+            # forced re-OCR: refresh the stored text
+            entry.write(vals)
+            return entry
+        try:
+            # another worker may have OCRed the same file meanwhile
+            with self.env.cr.savepoint():
+                return self.create(vals)
+        except psycopg2.IntegrityError:
+            return self.search([("key", "=", key)], limit=1)
+
+    # =========================
+    # EVICTION
+    # =========================
+    @api.model
+    def _cron_evict(self):
+        """
+        Drop entries unused for too long, then the least recently used
+        ones above the size limit.
+        """
+        ICP = self.env["ir.config_parameter"].sudo()
+        max_age = int(ICP.get_param("erp_ocr_addon.cache_max_age_days", 90))
+        max_entries = int(ICP.get_param("erp_ocr_addon.cache_max_entries", 50000))
+
+        self.flush_model()
+        self.env.cr.execute(
+            "DELETE FROM ocr_cache WHERE last_used < %s",
+            (fields.Datetime.now() - timedelta(days=max_age),),
+        )
+        self.env.cr.execute("""
+            DELETE FROM ocr_cache
+             WHERE id IN (
+                    SELECT id FROM ocr_cache
+                  ORDER BY last_used DESC, id DESC
+                    OFFSET %s)
+        """, (max_entries,))
+        self.invalidate_model()
+
+
+class OCRCacheStat(models.Model):
+    """
+    Daily hit/miss counters of ocr.cache, per UTC day (see _today).
+
+    Lookups append to ocr.cache.stat.delta instead of upserting the day's
+    row: a lookup runs inside the OCR job's transaction, and the row lock
+    would be held until the job commits, one Tesseract run later, making
+    concurrent workers queue on each other. _cron_fold moves the deltas
+    into this table.
+    """
+    _name = "ocr.cache.stat"
+    _description = "OCR Cache Statistics"
+    _order = "day desc"
+
+    day = fields.Date(required=True, readonly=True)
+    hits = fields.Integer(readonly=True)
+    misses = fields.Integer(readonly=True)
+    hit_ratio = fields.Float(compute="_compute_hit_ratio")
+
+    _sql_constraints = [
+        ("day_unique", "unique(day)", "One statistics row per day."),
+    ]
+
+    @api.depends("hits", "misses")
+    def _compute_hit_ratio(self):
+        for rec in self:
+            total = rec.hits + rec.misses
+            rec.hit_ratio = (rec.hits / total) if total else 0.0
+
+    @api.model
+    def _today(self):
+        # UTC: the same day for every worker and user, and for /metrics
+        return fields.Datetime.now().date()
+
+    @api.model
+    def _bump(self, hits=0, misses=0):
+        # plain INSERT, no row is locked
+        if not hits and not misses:
+            return
+        self.env.cr.execute(
+            "INSERT INTO ocr_cache_stat_delta (day, hits, misses) VALUES (%s, %s, %s)",
+            (self._today(), hits, misses),
+        )
+        self.env["ocr.cache.stat.delta"].invalidate_model()
+
+    @api.model
+    def _counts(self, day):
+        """
+        (hits, misses) of a day, the deltas not folded in yet included.
+        """
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT COALESCE(SUM(hits), 0), COALESCE(SUM(misses), 0)
+              FROM (SELECT hits, misses FROM ocr_cache_stat WHERE day = %(day)s
+                    UNION ALL
+                    SELECT hits, misses FROM ocr_cache_stat_delta WHERE day = %(day)s) AS counts
+        """, {"day": day})
+        return self.env.cr.fetchone()
+
+    @api.model
+    def _cron_fold(self):
+        """
+        Move the committed deltas into the daily rows in one statement;
+        deltas inserted meanwhile stay for the next run.
+        """
+        self.env.cr.execute("""
+            WITH moved AS (
+                DELETE FROM ocr_cache_stat_delta
+                  RETURNING day, hits, misses
+            )
+            INSERT INTO ocr_cache_stat (day, hits, misses, create_uid, write_uid, create_date, write_date)
+            SELECT day, SUM(hits), SUM(misses),
+                   %(uid)s, %(uid)s, (now() at time zone 'UTC'), (now() at time zone 'UTC')
+              FROM moved
+          GROUP BY day
+            ON CONFLICT (day) DO UPDATE
+                    SET hits = ocr_cache_stat.hits + EXCLUDED.hits,
+                        misses = ocr_cache_stat.misses + EXCLUDED.misses,
+                        write_date = EXCLUDED.write_date
+        """, {"uid": self.env.uid})
+        self.invalidate_model()
+        self.env["ocr.cache.stat.delta"].invalidate_model()
+
+
+class OCRCacheStatDelta(models.Model):
+    """
+    Pending hit/miss counts of ocr.cache.stat, append-only (see _cron_fold).
+    """
+    _name = "ocr.cache.stat.delta"
+    _description = "OCR Cache Statistics Change"
+    _log_access = False
+
+    day = fields.Date(required=True, readonly=True)
+    hits = fields.Integer(readonly=True)
+    misses = fields.Integer(readonly=True)
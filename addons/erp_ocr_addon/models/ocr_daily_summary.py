@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+
+from odoo import models, fields, api
+
+
+class OCRDailySummary(models.Model):
+    """
+    Per day / doc_type / status totals of ocr.document, kept up to date
+    incrementally by ocr.document create/write/unlink so the dashboard
+    never has to scan the documents table.
+
+    Changes are appended to ocr.daily.summary.delta, never upserted here:
+    every document of a day lands on the same few rows, and concurrent
+    workers would queue on their row locks. The fold cron moves the
+    deltas into this table; readers add up both.
+    """
+    _name = "ocr.daily.summary"
+    _description = "OCR Daily Summary"
+    _order = "day desc"
+
+    day = fields.Date(required=True, index=True, readonly=True)
+    doc_type = fields.Char(required=True, readonly=True)
+    status = fields.Char(required=True, readonly=True)
+    doc_count = fields.Integer(readonly=True)
+    confidence_sum = fields.Float(readonly=True)
+    amount_sum = fields.Float(readonly=True)
+
+    _sql_constraints = [
+        (
+            "day_type_status_unique",
+            "unique(day, doc_type, status)",
+            "One summary row per day, document type and status.",
+        ),
+    ]
+
+    def init(self):
+        # first install: build the summary from the existing documents
+        self.env.cr.execute("SELECT 1 FROM ocr_daily_summary LIMIT 1")
+        if not self.env.cr.fetchone():
+            self._rebuild()
+
+    # =========================
+    # INCREMENTAL UPDATES
+    # =========================
+    @api.model
+    def _collect(self, documents, sign=1, deltas=None):
+        """
+        Add (sign=1) or remove (sign=-1) the contribution of documents to
+        `deltas` ({(day, doc_type, status): [count, confidence, amount]}).
+        """
+        if deltas is None:
+            deltas = defaultdict(lambda: [0, 0.0, 0.0])
+        for doc in documents:
+            day = fields.Datetime.to_datetime(doc.upload_date or doc.create_date or fields.Datetime.now()).date()
+            key = (day, doc.doc_type or "", doc.status or "")
+            deltas[key][0] += sign
+            deltas[key][1] += sign * (doc.confidence_score or 0.0)
+            deltas[key][2] += sign * (doc.total_amount or 0.0)
+        return deltas
+
+    @api.model
+    def _append(self, deltas):
+        """
+        One INSERT of the non-zero deltas, no row is locked.
+        """
+        rows = [
+            (day, doc_type, status, count, conf, amount)
+            for (day, doc_type, status), (count, conf, amount) in deltas.items()
+            if count or abs(conf) > 1e-9 or abs(amount) > 1e-9
+        ]
+        if not rows:
+            return
+        self.env.cr.execute(
+            """
+            INSERT INTO ocr_daily_summary_delta
+                   (day, doc_type, status, doc_count, confidence_sum, amount_sum)
+            VALUES %s
+            """ % ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(rows)),
+            [value for row in rows for value in row],
+        )
+        self.env["ocr.daily.summary.delta"].invalidate_model()
+
+    @api.model
+    def _apply(self, documents, sign=1):
+        """
+        Add (sign=1) or remove (sign=-1) the contribution of documents.
+        """
+        self._append(self._collect(documents, sign))
+
+    @api.model
+    def _cron_fold(self):
+        """
+        Move the committed deltas into the summary rows, one upsert per
+        row in a single statement. Deltas inserted meanwhile stay for the
+        next run.
+        """
+        self.env.cr.execute("""
+            WITH moved AS (
+                DELETE FROM ocr_daily_summary_delta
+                  RETURNING day, doc_type, status, doc_count, confidence_sum, amount_sum
+            )
+            INSERT INTO ocr_daily_summary
+                   (day, doc_type, status, doc_count, confidence_sum, amount_sum,
+                    create_uid, write_uid, create_date, write_date)
+            SELECT day, doc_type, status,
+                   SUM(doc_count), SUM(confidence_sum), SUM(amount_sum),
+                   %(uid)s, %(uid)s, (now() at time zone 'UTC'), (now() at time zone 'UTC')
+              FROM moved
+          GROUP BY day, doc_type, status
+            ON CONFLICT (day, doc_type, status) DO UPDATE
+                   SET doc_count = ocr_daily_summary.doc_count + EXCLUDED.doc_count,
+                       confidence_sum = ocr_daily_summary.confidence_sum + EXCLUDED.confidence_sum,
+                       amount_sum = ocr_daily_summary.amount_sum + EXCLUDED.amount_sum,
+                       write_date = EXCLUDED.write_date
+        """, {"uid": self.env.uid})
+        self.invalidate_model()
+        self.env["ocr.daily.summary.delta"].invalidate_model()
+
+    # =========================
+    # FULL REBUILD
+    # =========================
+    @api.model
+    def _rebuild(self):
+        """
+        Recompute every row with one GROUP BY over ocr_document.
+        """
+        self.env["ocr.document"].flush_model()
+        self.env.cr.execute("DELETE FROM ocr_daily_summary_delta")
+        self.env.cr.execute("DELETE FROM ocr_daily_summary")
+        self.env.cr.execute("""
+            INSERT INTO ocr_daily_summary
+                   (day, doc_type, status, doc_count, confidence_sum, amount_sum,
+                    create_uid, write_uid, create_date, write_date)
+            SELECT COALESCE(upload_date, create_date)::date,
+                   COALESCE(doc_type, ''),
+                   COALESCE(status, ''),
+                   COUNT(*),
+                   SUM(COALESCE(confidence_score, 0)),
+                   SUM(COALESCE(total_amount, 0)),
+                   %(uid)s, %(uid)s, (now() at time zone 'UTC'), (now() at time zone 'UTC')
+              FROM ocr_document
+          GROUP BY 1, 2, 3
+        """, {"uid": self.env.uid})
+        self.invalidate_model()
+        self.env["ocr.daily.summary.delta"].invalidate_model()
+
+
+class OCRDailySummaryDelta(models.Model):
+    """
+    Pending changes of ocr.daily.summary, append-only (see _cron_fold).
+    """
+    _name = "ocr.daily.summary.delta"
+    _description = "OCR Daily Summary Change"
+    _log_access = False
+
+    day = fields.Date(required=True, readonly=True)
+    doc_type = fields.Char(required=True, readonly=True)
+    status = fields.Char(required=True, readonly=True)
+    doc_count = fields.Integer(readonly=True)
+    confidence_sum = fields.Float(readonly=True)
+    amount_sum = fields.Float(readonly=True)
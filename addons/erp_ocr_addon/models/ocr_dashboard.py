@@ -1,4 +1,8 @@
 # -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from markupsafe import Markup
+
 from odoo import models, fields, api
 
 class OCRDashboard(models.Model):
@@ -7,6 +11,10 @@ class OCRDashboard(models.Model):
 
     name = fields.Char(default="Clareo Dashboard")
 
+    # optional upload date range (empty = all time)
+    date_from = fields.Date()
+    date_to = fields.Date()
+
     invoice_count = fields.Integer(compute="_compute_stats")
     receipt_count = fields.Integer(compute="_compute_stats")
     completed_count = fields.Integer(compute="_compute_stats")
@@ -14,22 +22,77 @@ class OCRDashboard(models.Model):
     avg_confidence = fields.Float(compute="_compute_stats")
     total_amount = fields.Float(compute="_compute_stats")
 
-    @api.depends()
+    # p50 / p95 seconds per OCR pipeline stage (see ocr.metric)
+    stage_timings_html = fields.Html(compute="_compute_stage_timings", sanitize=False)
+
+    @api.depends("date_from", "date_to")
     def _compute_stats(self):
-        Document = self.env["ocr.document"]
+        # aggregated from ocr.daily.summary (and its changes not folded
+        # in yet), not from the documents table
+        summaries = (self.env["ocr.daily.summary"], self.env["ocr.daily.summary.delta"])
 
         for rec in self:
-            invoices = Document.search([("doc_type", "=", "invoice")])
-            receipts = Document.search([("doc_type", "=", "receipt")])
-            completed = Document.search([("status", "=", "completed")])
-            errors = Document.search([("status", "=", "error")])
+            domain = []
+            if rec.date_from:
+                domain.append(("day", ">=", rec.date_from))
+            if rec.date_to:
+                domain.append(("day", "<=", rec.date_to))
 
-            rec.invoice_count = len(invoices)
-            rec.receipt_count = len(receipts)
-            rec.completed_count = len(completed)
-            rec.error_count = len(errors)
+            groups = []
+            for Summary in summaries:
+                groups += Summary._read_group(
+                    domain,
+                    ["doc_type", "status"],
+                    ["doc_count:sum", "confidence_sum:sum", "amount_sum:sum"],
+                )
+
+            counts = {"invoice": 0, "receipt": 0, "completed": 0, "error": 0}
+            doc_count = 0
+            conf_sum = 0.0
+            invoice_amount = 0.0
+            for doc_type, status, count, conf, amount in groups:
+                if doc_type in counts:
+                    counts[doc_type] += count
+                if status in counts:
+                    counts[status] += count
+                if doc_type in ("invoice", "receipt"):
+                    doc_count += count
+                    conf_sum += conf
+                if doc_type == "invoice":
+                    invoice_amount += amount
+
+            rec.invoice_count = counts["invoice"]
+            rec.receipt_count = counts["receipt"]
+            rec.completed_count = counts["completed"]
+            rec.error_count = counts["error"]
+            rec.avg_confidence = (conf_sum / doc_count) if doc_count else 0.0
+            rec.total_amount = invoice_amount
+
+    @api.depends("date_from", "date_to")
+    def _compute_stage_timings(self):
+        Metric = self.env["ocr.metric"]
+        for rec in self:
+            date_from = fields.Datetime.to_datetime(rec.date_from) if rec.date_from else None
+            date_to = (fields.Datetime.to_datetime(rec.date_to) + timedelta(days=1)) if rec.date_to else None
+            rows = Metric._stage_stats(date_from, date_to)
+            if not rows:
+                rec.stage_timings_html = Markup("<p>No OCR timings recorded yet.</p>")
+                continue
 
-            all_conf = invoices.mapped("confidence_score") + receipts.mapped("confidence_score")
-            rec.avg_confidence = (sum(all_conf) / len(all_conf)) if all_conf else 0.0
+            body = Markup("").join(
+                Markup(
+                    "<tr><td>%s</td><td class='text-end'>%s</td>"
+                    "<td class='text-end'>%.3f</td><td class='text-end'>%.3f</td></tr>"
+                ) % (stage, count, p50, p95)
+                for stage, count, _total, p50, p95 in rows
+            )
+            rec.stage_timings_html = Markup(
+                "<table class='table table-sm'>"
+                "<thead><tr><th>Stage</th><th class='text-end'>Runs</th>"
+                "<th class='text-end'>p50 (s)</th><th class='text-end'>p95 (s)</th></tr></thead>"
+                "<tbody>%s</tbody></table>"
+            ) % body
 
-            rec.total_amount = sum(invoices.mapped("total_amount"))
+    def action_rebuild_summary(self):
+        self.env["ocr.daily.summary"]._rebuild()
+        return True
@@ -1,12 +1,47 @@
 # -*- coding: utf-8 -*-
 import base64
-import csv
 import io
+import logging
+import time
 
-from odoo import models, fields, api, _
+import psycopg2
+from PIL import Image
+
+from odoo import models, fields, api, Command, _
 from odoo.exceptions import UserError
+from odoo.tools import str2bool
+from odoo.tools.sql import create_index
+
+from . import ocr_duplicate, ocr_layout
+from .ocr_parser import OCRParser, OCRTransientError
+from .ocr_rules import DATE_RULE
+from .ocr_thumbnail import FORM_WIDTH, LIST_WIDTH
+
+_logger = logging.getLogger(__name__)
+
+# fields aggregated in ocr.daily.summary
+SUMMARY_FIELDS = {"upload_date", "doc_type", "status", "confidence_score", "total_amount"}
+
+# fields the user can confirm in ocr.preview.wizard, re-parsing keeps them
+CONFIRMED_FIELDS = ("vendor_name", "invoice_date", "total_amount", "vat_amount", "confidence_score")
+# editing one of these outside of OCR (form, import) confirms the document
+USER_EDIT_FIELDS = set(CONFIRMED_FIELDS) | {"line_ids"}
+
+# accepted uploads, recognized from the first bytes of the file
+FILE_SIGNATURES = [
+    (b"%PDF", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+]
 
-from .ocr_parser import OCRParser
+
+def sniff_mimetype(head):
+    for signature, mimetype in FILE_SIGNATURES:
+        if head.startswith(signature):
+            return mimetype
+    return None
 
 
 class OCRDocument(models.Model):
@@ -17,18 +52,22 @@ class OCRDocument(models.Model):
     # =========================
     # BASIC
     # =========================
-    name = fields.Char(string="Document Name", required=True)
+    name = fields.Char(string="Document Name", required=True, index="trigram")
     file = fields.Binary(string="File", attachment=True, required=True)
     file_filename = fields.Char(string="Filename")
+    # ocr.thumbnail previews of the first page, see _compute_thumbnail_urls
+    thumbnail_url = fields.Char(string="Preview", compute="_compute_thumbnail_urls")
+    preview_url = fields.Char(compute="_compute_thumbnail_urls")
 
     doc_type = fields.Selection(
         [("invoice", "Invoice"), ("receipt", "Receipt")],
         string="Document Type",
         required=True,
         default="invoice",
+        index=True,
     )
 
-    upload_date = fields.Datetime(default=lambda self: fields.Datetime.now(), readonly=True)
+    upload_date = fields.Datetime(default=lambda self: fields.Datetime.now(), readonly=True, index=True)
     user_id = fields.Many2one("res.users", default=lambda self: self.env.user, readonly=True)
 
     status = fields.Selection(
@@ -39,6 +78,7 @@ class OCRDocument(models.Model):
             ("error", "Error"),
         ],
         default="uploaded",
+        index=True,
     )
     progress = fields.Integer(default=0)
 
@@ -47,7 +87,9 @@ class OCRDocument(models.Model):
     # =========================
     customer_name = fields.Char()
     supplier_name = fields.Char()
-    vendor_name = fields.Char()
+    vendor_name = fields.Char(index="trigram")
+    vendor_profile_id = fields.Many2one("ocr.vendor.profile", string="Vendor Profile", index=True, readonly=True)
+    profile_learned = fields.Boolean(readonly=True, help="Already folded into its vendor profile.")
     seller_id = fields.Char()
     company_issued = fields.Char()
     tax_id = fields.Char()
@@ -58,7 +100,7 @@ class OCRDocument(models.Model):
     # =========================
     # DATES / NUMBERS
     # =========================
-    invoice_date = fields.Date()
+    invoice_date = fields.Date(index=True)
     receipt_number = fields.Char()
     receipt_date = fields.Date()
 
@@ -72,8 +114,29 @@ class OCRDocument(models.Model):
     # DEBUG
     # =========================
     confidence_score = fields.Float()
-    extracted_text = fields.Text()
+    extracted_text = fields.Text()  # trigram index, see init()
     extraction_log = fields.Text()
+    ocr_pages = fields.Char(string="OCRed Pages", readonly=True)
+    # ocr_layout.dumps of the Tesseract words, re-parsing reads items and
+    # confidence from it
+    ocr_layout = fields.Binary(string="OCR Word Boxes", attachment=True, readonly=True)
+    parser_version = fields.Integer(default=0, readonly=True, index=True)
+    user_confirmed = fields.Boolean(readonly=True, help="Values confirmed in the OCR preview wizard.")
+
+    # =========================
+    # SCANNED STACKS
+    # =========================
+    split_mode = fields.Boolean(
+        string="Split Into Documents",
+        help="The PDF is a stack of scanned documents: OCR creates one document "
+             "per detected document instead of reading the stack as one.",
+    )
+    parent_id = fields.Many2one(
+        "ocr.document", string="Scanned Stack", index=True, ondelete="set null", readonly=True,
+    )
+    child_ids = fields.One2many("ocr.document", "parent_id", string="Split Documents", readonly=True)
+    page_from = fields.Integer(readonly=True)
+    page_to = fields.Integer(readonly=True)
 
     # =========================
     # ITEMS
@@ -89,69 +152,701 @@ class OCRDocument(models.Model):
         readonly=True,
     )
 
+    # =========================
+    # DUPLICATES (see _detect_duplicates)
+    # =========================
+    file_hash = fields.Char(index=True, readonly=True, copy=False)
+    image_phash = fields.Char(string="Page 1 Hash", readonly=True, copy=False)  # band indexes, see init()
+    duplicate_key = fields.Char(compute="_compute_duplicate_key", store=True, index=True, readonly=True, copy=False)
+    duplicate_of_id = fields.Many2one(
+        "ocr.document", string="Possible Duplicate Of", index=True, readonly=True, copy=False,
+        ondelete="set null",
+    )
+    duplicate_reason = fields.Selection(
+        [
+            ("file", "Same file"),
+            ("key", "Same vendor, reference, amount and date"),
+            ("image", "Similar first page, same amount"),
+        ],
+        readonly=True,
+        copy=False,
+    )
+    duplicate_override = fields.Boolean(
+        string="Not a Duplicate",
+        copy=False,
+        help="Checked: a vendor bill may be created although the document looks like a duplicate.",
+    )
+
+    # =========================
+    # BACKGROUND OCR
+    # =========================
+    job_ids = fields.One2many("ocr.job", "document_id", string="OCR Jobs", readonly=True)
+
+    def init(self):
+        # list views sort on create_date
+        create_index(self.env.cr, "ocr_document_create_date_idx", self._table, ["create_date"])
+
+        # documents parsed before parser_version existed may hold hand
+        # fixed values: the re-extract cron must leave them alone
+        self.env.cr.execute("""
+            UPDATE ocr_document
+               SET parser_version = %s
+             WHERE status = 'completed'
+               AND COALESCE(parser_version, 0) = 0
+        """, (OCRParser.PARSER_VERSION,))
+        # billed documents count as confirmed
+        self.env.cr.execute("""
+            UPDATE ocr_document
+               SET user_confirmed = TRUE
+             WHERE invoice_id IS NOT NULL
+               AND user_confirmed IS NOT TRUE
+        """)
+
+        # near-duplicate search: one index per band of image_phash, with
+        # the total a near duplicate must share (see _find_duplicate)
+        for band in range(ocr_duplicate.PHASH_BANDS):
+            create_index(
+                self.env.cr,
+                f"ocr_document_phash_band{band}_idx",
+                self._table,
+                [
+                    f"substr(image_phash, {band * ocr_duplicate.BAND_WIDTH + 1}, {ocr_duplicate.BAND_WIDTH})",
+                    "total_amount",
+                ],
+                where="image_phash IS NOT NULL",
+            )
+
+        # "find the invoice mentioning X": ILIKE '%X%' on extracted_text is
+        # served by a GIN trigram index. Trigrams need no word boundaries,
+        # so they work for Thai as well as English. Not declared with
+        # index="trigram" because without pg_trgm the ORM would fall back
+        # to a btree, which cannot hold large texts.
+        try:
+            with self.env.cr.savepoint():
+                self.env.cr.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except psycopg2.Error:
+            _logger.warning("pg_trgm is not available, extracted_text search will scan the table")
+            return
+        create_index(
+            self.env.cr,
+            "ocr_document_extracted_text_trgm_idx",
+            self._table,
+            ["extracted_text gin_trgm_ops"],
+            method="gin",
+        )
+
+    # =========================
+    # DAILY SUMMARY UPKEEP
+    # =========================
+    @api.model_create_multi
+    def create(self, vals_list):
+        docs = super().create(vals_list)
+        self.env["ocr.daily.summary"]._apply(docs, sign=1)
+        return docs
+
+    def write(self, vals):
+        # hand edits: re-parsing keeps them (see _save_ocr_results)
+        if (
+            not self.env.context.get("ocr_parse")
+            and "user_confirmed" not in vals
+            and USER_EDIT_FIELDS.intersection(vals)
+        ):
+            vals = dict(vals, user_confirmed=True)
+
+        if self.env.context.get("ocr_summary_done") or not SUMMARY_FIELDS.intersection(vals):
+            return super().write(vals)
+
+        # one delta row per changed key: a status change is -1 / +1, the rest cancels out
+        Summary = self.env["ocr.daily.summary"]
+        deltas = Summary._collect(self, sign=-1)
+        res = super().write(vals)
+        Summary._append(Summary._collect(self, sign=1, deltas=deltas))
+        return res
+
+    def unlink(self):
+        self.env["ocr.daily.summary"]._apply(self, sign=-1)
+        return super().unlink()
+
+    # =========================
+    # BULK UPLOAD
+    # =========================
+    @api.model
+    def _create_from_uploads(self, uploads, doc_type="invoice", split=False, chunk_size=50):
+        """
+        Create one document per (filename, raw bytes) upload.
+        split=True marks the PDFs as scanned stacks (see split_mode).
+
+        The bytes go straight to the filestore through ir.attachment.raw,
+        no base64 round trip. Records are created chunk by chunk with one
+        create() for the documents and one for their attachments, so only
+        a chunk of files is held in memory at a time.
+        Returns (documents, skipped) with skipped = [(filename, reason)].
+        """
+        Attachment = self.env["ir.attachment"].sudo().with_context(
+            binary_field_real_user=self.env.user,
+        )
+        docs = self.browse()
+        skipped = []
+        chunk = []
+
+        def flush():
+            created = self.create([
+                {
+                    "name": filename,
+                    "file_filename": filename,
+                    "doc_type": doc_type,
+                    "split_mode": split and mimetype == "application/pdf",
+                }
+                for filename, _data, mimetype in chunk
+            ])
+            Attachment.create([
+                {
+                    "name": "file",
+                    "res_model": self._name,
+                    "res_field": "file",
+                    "res_id": doc.id,
+                    "type": "binary",
+                    "raw": data,
+                    "mimetype": mimetype,
+                }
+                for doc, (_filename, data, mimetype) in zip(created, chunk)
+            ])
+            created.invalidate_recordset(["file"])
+            chunk.clear()
+            return created
+
+        for filename, data in uploads:
+            if not data:
+                skipped.append((filename, _("empty file")))
+                continue
+            mimetype = sniff_mimetype(data[:8])
+            if not mimetype:
+                skipped.append((filename, _("not a PDF or image")))
+                continue
+            chunk.append((filename, data, mimetype))
+            if len(chunk) >= chunk_size:
+                docs |= flush()
+        if chunk:
+            docs |= flush()
+        return docs, skipped
+
     # =========================
     # OCR
     # =========================
     def action_run_ocr(self):
-        for doc in self:
+        """
+        Queue the documents for OCR. The heavy work (rasterizing, Tesseract)
+        runs in the ocr.job cron so the HTTP worker returns immediately.
+        """
+        # bin_size: only check the file is there, do not load it
+        for doc in self.with_context(bin_size=True):
             if not doc.file:
                 raise UserError(_("Please upload a file before running OCR."))
 
-            doc.write({"status": "processing", "progress": 10})
+        self.write({"status": "processing", "progress": 0})
+        self.env["ocr.job"]._enqueue(self)
+        return True
 
-            # =========================
-            # STEP 1: Detect file type (ROBUST)
-            # =========================
-            file_bytes = base64.b64decode(doc.file or b"")
+    def action_batch_run_ocr(self):
+        """
+        List view action: OCR all selected documents as one ocr.batch.
+        """
+        missing = self.with_context(bin_size=True).filtered(lambda d: not d.file)
+        if missing:
+            raise UserError(_(
+                "Please upload a file before running OCR: %s",
+                ", ".join(missing.mapped("name")),
+            ))
 
-            # PDF files always start with %PDF
-            if file_bytes[:4] == b"%PDF":
-                text = OCRParser.run_pdf_ocr(doc.file)
-            else:
-                text = OCRParser.run_tesseract(doc.file)
-                
-            data = OCRParser.extract_fields(text)
+        batch = self.env["ocr.batch"].create({
+            "document_ids": [(6, 0, self.ids)],
+            "document_count": len(self),
+        })
+        self.write({"status": "processing", "progress": 0})
+        self.env["ocr.job"]._enqueue_batch(batch)
 
-            # =========================
-            # STEP 2: SAVE LINE ITEMS
-            # =========================
-            doc.line_ids.unlink()
+        return {
+            "type": "ir.actions.act_window",
+            "res_model": "ocr.batch",
+            "res_id": batch.id,
+            "view_mode": "form",
+        }
 
-            items = data.get("items") or []
+    def _process_ocr(self, progress_callback=None, force=False):
+        """
+        Run the OCR pipeline for one document and save the results.
+        Called by ocr.job; raises OCRTransientError when the engine failed.
+        force=True skips the OCR cache and always runs Tesseract.
+        """
+        self.ensure_one()
+        doc = self
+        started = time.perf_counter()
+        timings = {}
 
-            # ✅ If OCR extracted items → use them
-            if items:
-                for item in items:
-                    self.env["ocr.document.line"].create({
-                        "document_id": doc.id,
-                        "item_name": item.get("name") or "Item",
-                        "quantity": item.get("qty", 1.0),
-                        "unit_price": item.get("price", 0.0),
-                    })
+        # =========================
+        # STEP 1: Locate the file (no base64 decode)
+        # =========================
+        source = doc._get_file_source()
+        if not source:
+            raise UserError(_("Please upload a file before running OCR."))
 
-            # ✅ Fallback: create one line from total (no manual clicking)
-            elif data.get("total_amount"):
-                self.env["ocr.document.line"].create({
-                    "document_id": doc.id,
-                    "item_name": "OCR Total",
-                    "quantity": 1.0,
-                    "unit_price": data.get("total_amount"),
-                })
+        doc.write({"status": "processing", "progress": 10})
+        timings["source"] = time.perf_counter() - started
+
+        layouts = {}
+        text, log = doc._get_ocr_text(
+            source, force=force, progress_callback=progress_callback, timings=timings, layouts=layouts
+        )
+        doc._save_ocr_result(text, log, timings=timings, layouts=layouts)
+
+        timings["total"] = time.perf_counter() - started
+        self.env["ocr.metric"]._record({doc.id: timings})
+        (doc | doc.child_ids)._warm_thumbnails()
+        (doc | doc.child_ids)._detect_duplicates()
+
+    def _get_file_attachments(self):
+        """
+        {document id: ir.attachment of its `file`}, one search for all.
+        """
+        attachments = self.env["ir.attachment"].sudo().search([
+            ("res_model", "=", self._name),
+            ("res_field", "=", "file"),
+            ("res_id", "in", self.ids),
+        ])
+        return {attachment.res_id: attachment for attachment in attachments}
+
+    def _get_file_source(self):
+        """
+        The uploaded file as an OCRParser file source, read from its
+        ir.attachment instead of the base64 `file` field: the filestore
+        path when the attachment lives there (never loaded into memory),
+        else its raw bytes. None when there is no file.
+        """
+        self.ensure_one()
+        return self._attachment_source(self._get_file_attachments().get(self.id))
+
+    @api.model
+    def _attachment_source(self, attachment):
+        """
+        File source of an attachment from _get_file_attachments, None
+        without one.
+        """
+        if not attachment:
+            return None
+        if attachment.store_fname:
+            return attachment._full_path(attachment.store_fname)
+        return attachment.raw or None
+
+    @api.model
+    def _get_ocr_options(self, doc_type=None, split=False):
+        """
+        OCR options from system parameters: the engine (see ocr_engine),
+        the language model ("auto" = OCRParser.detect_lang), the
+        preprocessing settings (see ocr_preprocess), the PDF text layer
+        fast path and, for a given doc_type, which PDF pages to OCR (see
+        OCRParser._ocr_pdf_path). Scanned stacks (split=True) need every
+        page.
+        """
+        ICP = self.env["ir.config_parameter"].sudo()
+        options = {
+            "engine": ICP.get_param("erp_ocr_addon.ocr_engine", "pytesseract"),
+            "threshold": ICP.get_param("erp_ocr_addon.preprocess_threshold", "fixed"),
+            "text_height": int(ICP.get_param("erp_ocr_addon.preprocess_text_height", 0)),
+            "crop": str2bool(ICP.get_param("erp_ocr_addon.preprocess_crop", "False")),
+            "deskew": str2bool(ICP.get_param("erp_ocr_addon.preprocess_deskew", "False")),
+            "text_layer": str2bool(ICP.get_param("erp_ocr_addon.pdf_text_layer", "True")),
+            "lang": ICP.get_param("erp_ocr_addon.ocr_lang", "auto"),
+        }
+        if split:
+            options["page_policy"] = "all"
+        elif doc_type:
+            options["page_policy"] = ICP.get_param(f"erp_ocr_addon.page_policy_{doc_type}", "all")
+            if options["page_policy"] != "all":
+                options["doc_type"] = doc_type
+                options["page_min_confidence"] = float(
+                    ICP.get_param("erp_ocr_addon.page_min_confidence", 0.8)
+                )
+        return options
+
+    def _get_ocr_text(self, source, force=False, progress_callback=None, timings=None, layouts=None):
+        """
+        Return (text, log lines) for the file source (see _get_file_source),
+        from ocr.cache when the same bytes were already OCRed with the
+        current settings. Stage seconds are summed into `timings` (a dict)
+        when given, the word boxes of the OCRed pages go into `layouts`.
+        """
+        self.ensure_one()
+        Cache = self.env["ocr.cache"]
+        started = time.perf_counter()
+        file_hash = OCRParser.sha256(source)
+        is_pdf = OCRParser.is_pdf(source)
+        OCRParser.add_timings(timings, {"source": time.perf_counter() - started})
 
-            # =========================
-            # SAVE HEADER DATA
-            # =========================
-            doc.write({
+        options = self._get_ocr_options(self.doc_type, self.split_mode)
+
+        started = time.perf_counter()
+        if layouts is None:
+            layouts = {}
+        pages = None if force else Cache._lookup(file_hash, options, layouts)
+        OCRParser.add_timings(timings, {"cache": time.perf_counter() - started})
+        if pages is not None:
+            log = [f"OCR cache hit ({file_hash[:12]}), Tesseract skipped"]
+        else:
+            log = []
+            # the cache key stays on `options`, a vendor's language only
+            # changes how this file is OCRed
+            ocr_options = options
+            # known vendors: OCR only the lines holding the key fields
+            if not self.split_mode:
+                index = self.env["ocr.vendor.profile"]._get_index()
+                hints = {}
+                try:
+                    pages = OCRParser.run_profile_ocr(
+                        source, is_pdf, index, options=options, log=log, timings=timings, hints=hints
+                    )
+                except Exception as e:
+                    log.append(f"Vendor fast path failed ({e}), full OCR")
+                if hints.get("lang"):
+                    ocr_options = dict(options, lang=hints["lang"])
+            fast_path = pages is not None
+
+            if pages is None and is_pdf:
+                ICP = self.env["ir.config_parameter"].sudo()
+                workers = int(ICP.get_param("erp_ocr_addon.ocr_workers", 1))
+                try:
+                    pages = OCRParser.run_pdf_source_pages(
+                        source,
+                        progress_callback=progress_callback,
+                        workers=workers,
+                        log=log,
+                        options=ocr_options,
+                        timings=timings,
+                        layouts=layouts,
+                    )
+                except Exception as e:
+                    raise OCRTransientError(f"OCR ERROR: {str(e)}") from e
+            elif pages is None:
+                try:
+                    pages = [OCRParser.run_image_ocr(
+                        source, options=ocr_options, log=log, timings=timings, layouts=layouts
+                    )]
+                except Exception as e:
+                    raise OCRTransientError(f"OCR ERROR: {str(e)}") from e
+            # the fast path text is partial, keep it out of the cache
+            if not fast_path:
+                Cache._store(file_hash, "pdf" if is_pdf else "image", pages, options, layouts)
+
+        text = OCRParser.join_pages(pages) if is_pdf else pages[0]
+        return text, log
+
+    def _save_ocr_result(self, text, log=None, timings=None, layouts=None):
+        """
+        Parse OCR text into fields + line items and save them.
+        """
+        self.ensure_one()
+        self._save_ocr_results(
+            {self.id: (text, log)},
+            timings={self.id: timings} if timings is not None else None,
+            layouts={self.id: layouts or {}},
+        )
+
+    def _save_ocr_results(self, results, timings=None, layouts=None):
+        """
+        Save parsed OCR results for many documents at once.
+        results: {document id: (text, log lines)}
+        layouts: {document id: {page number: PageWords}} of a new OCR run,
+        stored on the documents; None re-parses with the stored ones.
+        All lines go through one create(vals_list); header writes only
+        mark the cache dirty and are flushed together by the ORM, and the
+        daily summary is updated once for the whole set.
+        Values confirmed by the user (user_confirmed, or billed) are kept,
+        line items included.
+        Scanned stacks (split_mode) with more than one document are saved
+        through _save_split_results instead.
+        timings: optional {document id: stage dict}, receives "parse" and
+        "db_write" (the shared write time split evenly).
+        """
+        stacks = {}
+        for doc in self.filtered("split_mode"):
+            started = time.perf_counter()
+            pages = OCRParser.split_pages(results[doc.id][0])
+            ranges = OCRParser.split_documents(pages)
+            if len(ranges) > 1:
+                stacks[doc.id] = (pages, ranges)
+            elif doc.child_ids:
+                # not (or no longer) a stack
+                text, log = results[doc.id]
+                log = list(log or [])
+                doc._drop_split_children(doc.child_ids, log)
+                results[doc.id] = (text, log)
+            if timings is not None:
+                OCRParser.add_timings(timings[doc.id], {"parse": time.perf_counter() - started})
+        stack_docs = self.filtered(lambda d: d.id in stacks)
+        if stack_docs:
+            stack_docs._save_split_results(results, stacks, timings=timings, layouts=layouts)
+        docs = self - stack_docs
+
+        index = self.env["ocr.vendor.profile"]._get_index()
+        confirmed = docs.filtered(lambda d: d.user_confirmed or d.invoice_id)
+        line_vals = []
+        headers = {}
+        for doc in docs:
+            started = time.perf_counter()
+            text, log = results[doc.id]
+            layout = doc._get_ocr_layout() if layouts is None else layouts.get(doc.id) or {}
+            headers[doc.id], lines = doc._prepare_ocr_result(text, log, index=index, layout=layout)
+            if layouts is not None:
+                headers[doc.id]["ocr_layout"] = self._encode_ocr_layout(layout)
+            if doc not in confirmed:
+                line_vals += lines
+            if timings is not None:
+                OCRParser.add_timings(timings[doc.id], {"parse": time.perf_counter() - started})
+
+        started = time.perf_counter()
+
+        # =========================
+        # STEP 2: SAVE LINE ITEMS
+        # =========================
+        (docs - confirmed).line_ids.unlink()
+        self.env["ocr.document.line"].create(line_vals)
+
+        # =========================
+        # SAVE HEADER DATA
+        # =========================
+        Summary = self.env["ocr.daily.summary"]
+        deltas = Summary._collect(docs, sign=-1)
+        for doc in docs.with_context(ocr_summary_done=True, ocr_parse=True):
+            header = headers[doc.id]
+            if doc in confirmed:
+                for name in CONFIRMED_FIELDS:
+                    header.pop(name, None)
+            doc.write(header)
+        Summary._append(Summary._collect(docs, sign=1, deltas=deltas))
+
+        if timings is not None and docs:
+            self.env.flush_all()
+            share = (time.perf_counter() - started) / len(docs)
+            for doc in docs:
+                OCRParser.add_timings(timings[doc.id], {"db_write": share})
+
+    def _save_split_results(self, results, stacks, timings=None, layouts=None):
+        """
+        Save scanned stacks: every detected document becomes (or updates)
+        a child document holding its page range, and all children are
+        parsed and written through one _save_ocr_results call. The stack
+        itself keeps the full text but no amounts, so nothing is counted
+        twice.
+        results: {document id: (text, log lines)}
+        stacks: {document id: (page texts, [(first, last)])}
+        layouts: as in _save_ocr_results, children get their pages' words
+        """
+        started = time.perf_counter()
+        children = self.browse()
+        child_results = {}
+        child_layouts = {} if layouts is not None else None
+        for doc in self:
+            text, log = results[doc.id]
+            log = list(log or [])
+            pages, ranges = stacks[doc.id]
+            docs = doc._sync_split_children(ranges, log)
+            children |= docs
+            for child, (first, last) in zip(docs, ranges):
+                child_results[child.id] = (
+                    OCRParser.join_pages(pages[first - 1:last]),
+                    [_("Pages %(first)s-%(last)s of %(name)s", first=first, last=last, name=doc.name)],
+                )
+                if child_layouts is not None:
+                    layout = layouts.get(doc.id) or {}
+                    child_layouts[child.id] = {
+                        n - first + 1: layout[n] for n in range(first, last + 1) if n in layout
+                    }
+
+            vals = {}
+            if layouts is not None:
+                vals["ocr_layout"] = self._encode_ocr_layout(layouts.get(doc.id))
+            doc.line_ids.unlink()
+            doc.with_context(ocr_parse=True).write(dict(vals, **{
                 "status": "completed",
                 "progress": 100,
-                "vendor_name": data.get("vendor_name"),
-                "total_amount": data.get("total_amount"),
-                "vat_amount": data.get("vat_amount"),
-                "discount_amount": data.get("discount_amount"),
-                "confidence_score": data.get("confidence"),
+                "vendor_name": False,
+                "total_amount": 0.0,
+                "vat_amount": 0.0,
+                "discount_amount": 0.0,
+                "confidence_score": False,
                 "extracted_text": text,
+                "extraction_log": "\n".join((log or []) + [_(
+                    "Split into %(count)s documents: %(ranges)s",
+                    count=len(ranges),
+                    ranges=", ".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges),
+                )]),
+                "ocr_pages": OCRParser.ocred_pages(text),
+                "parser_version": OCRParser.PARSER_VERSION,
+            }))
+
+        children._save_ocr_results(child_results, layouts=child_layouts)
+        if timings is not None:
+            self.env.flush_all()
+            share = (time.perf_counter() - started) / len(self)
+            for doc in self:
+                OCRParser.add_timings(timings[doc.id], {"db_write": share})
+
+    def _sync_split_children(self, ranges, log=None):
+        """
+        Child documents for the given page ranges, in the same order.
+        Children whose range still exists are reused (user confirmed
+        values stay), missing ones are created, the others are dropped
+        (see _drop_split_children).
+        """
+        self.ensure_one()
+        existing = {(child.page_from, child.page_to): child for child in self.child_ids}
+        wanted = set(ranges)
+        self._drop_split_children(
+            self.child_ids.filtered(lambda c: (c.page_from, c.page_to) not in wanted),
+            log if log is not None else [],
+        )
+
+        missing = [r for r in ranges if r not in existing]
+        existing.update(zip(missing, self._create_split_children(missing)))
+        return self.browse([existing[r].id for r in ranges])
+
+    def _drop_split_children(self, children, log):
+        """
+        Remove split documents whose page range the stack no longer has.
+        Confirmed or billed ones hold a person's work and are kept: their
+        range goes into `log` (the stack's extraction log) instead.
+        """
+        kept = children.filtered(lambda c: c.user_confirmed or c.invoice_id)
+        (children - kept).unlink()
+        for child in kept:
+            log.append(_(
+                "Pages %(first)s-%(last)s (%(name)s) no longer match a document of this stack, "
+                "kept because they were confirmed or billed",
+                first=child.page_from, last=child.page_to, name=child.name,
+            ))
+        if kept:
+            _logger.info("OCR stack %s: kept %s confirmed split document(s) whose range is gone",
+                         self.id, len(kept))
+
+    def _create_split_children(self, ranges):
+        """
+        Create one child document per page range in a single create().
+        Their file attachments point at the stack's file in the filestore,
+        the PDF is not copied.
+        """
+        self.ensure_one()
+        if not ranges:
+            return self.browse()
+
+        source = self.env["ir.attachment"].sudo().search([
+            ("res_model", "=", self._name),
+            ("res_field", "=", "file"),
+            ("res_id", "=", self.id),
+        ], limit=1)
+        if source.store_fname:
+            storage = {
+                "store_fname": source.store_fname,
+                "checksum": source.checksum,
+                "file_size": source.file_size,
+            }
+        else:
+            storage = {"raw": source.raw}
+
+        children = self.create([
+            {
+                "name": f"{self.name} [{first}-{last}]" if first != last else f"{self.name} [{first}]",
+                "file_filename": self.file_filename,
+                "doc_type": self.doc_type,
+                "status": "processing",
+                "parent_id": self.id,
+                "page_from": first,
+                "page_to": last,
+            }
+            for first, last in ranges
+        ])
+        self.env["ir.attachment"].sudo().with_context(
+            binary_field_real_user=self.env.user,
+        ).create([
+            dict(
+                storage,
+                name="file",
+                res_model=self._name,
+                res_field="file",
+                res_id=child.id,
+                type="binary",
+                mimetype=source.mimetype,
+            )
+            for child in children
+        ])
+        children.invalidate_recordset(["file"])
+        return children
+
+    def _prepare_ocr_result(self, text, log=None, index=None, layout=None):
+        """
+        Return (header vals, line vals list) parsed from OCR text, with
+        the vendor's profile when `index` (a VendorIndex) knows it and the
+        word boxes in `layout` ({page number: PageWords}) when every OCRed
+        page has them.
+        """
+        self.ensure_one()
+        doc = self
+
+        profile = index.match(text) if index else None
+        words = OCRParser.page_words(OCRParser.split_pages(text) or [text], layout)
+        data = OCRParser.extract_fields(text, profile, words, doc.doc_type)
+
+        items = data.get("items") or []
+        lines = []
+
+        # ✅ If OCR extracted items → use them
+        if items:
+            for item in items:
+                lines.append({
+                    "document_id": doc.id,
+                    "item_name": item.get("name") or "Item",
+                    "quantity": item.get("qty", 1.0),
+                    "unit_price": item.get("price", 0.0),
+                })
+
+        # ✅ Fallback: create one line from total (no manual clicking)
+        elif data.get("total_amount"):
+            lines.append({
+                "document_id": doc.id,
+                "item_name": "OCR Total",
+                "quantity": 1.0,
+                "unit_price": data.get("total_amount"),
             })
 
+        header = {
+            "status": "completed",
+            "progress": 100,
+            "vendor_name": data.get("vendor_name"),
+            "total_amount": data.get("total_amount"),
+            "vat_amount": data.get("vat_amount"),
+            "discount_amount": data.get("discount_amount"),
+            "confidence_score": data.get("confidence"),
+            "extracted_text": text,
+            "extraction_log": "\n".join(log or []),
+            "ocr_pages": OCRParser.ocred_pages(text),
+            "parser_version": OCRParser.PARSER_VERSION,
+            "vendor_profile_id": profile["id"] if profile else False,
+        }
+        if data.get("tax_id") and not doc.tax_id:
+            # the vendor profile's tax id, copied so duplicate_key does not
+            # depend on the profile (written again on every learned document)
+            header["tax_id"] = data["tax_id"]
+        return header, lines
+
+    def _get_ocr_layout(self):
+        """
+        Stored word boxes, {page number: PageWords}.
+        """
+        self.ensure_one()
+        return ocr_layout.loads(base64.b64decode(self.ocr_layout)) if self.ocr_layout else {}
+
+    @api.model
+    def _encode_ocr_layout(self, layout):
+        return base64.b64encode(ocr_layout.dumps(layout)) if layout else False
+
     # =========================
     # STEP 3: CREATE VENDOR BILL
     # =========================
@@ -161,38 +856,18 @@ class OCRDocument(models.Model):
         if self.invoice_id:
             raise UserError(_("A vendor bill has already been created."))
 
+        if self._duplicate_blocked():
+            raise UserError(_(
+                "This document looks like a duplicate of %(original)s (%(reason)s). "
+                "Check \"Not a Duplicate\" to bill it anyway.",
+                original=self.duplicate_of_id.display_name,
+                reason=self._fields["duplicate_reason"].convert_to_export(self.duplicate_reason, self),
+            ))
+
         if not self.vendor_name:
             raise UserError(_("Vendor name is required to create a vendor bill."))
 
-        # Find or create vendor
-        partner = self.env["res.partner"].search(
-            [("name", "=", self.vendor_name)], limit=1
-        )
-
-        if not partner:
-            partner = self.env["res.partner"].create({
-                "name": self.vendor_name,
-                "supplier_rank": 1,
-            })
-
-        # Create vendor bill
-        bill = self.env["account.move"].create({
-            "move_type": "in_invoice",
-            "partner_id": partner.id,
-            "invoice_date": self.invoice_date or fields.Date.today(),
-            "ref": self.reference_number or self.name,
-        })
-
-        # Create bill lines
-        for line in self.line_ids:
-            self.env["account.move.line"].create({
-                "move_id": bill.id,
-                "name": line.item_name,
-                "quantity": line.quantity,
-                "price_unit": line.unit_price,
-            })
-
-        self.invoice_id = bill.id
+        bill = self._create_vendor_bills()
 
         return {
             "type": "ir.actions.act_window",
@@ -201,13 +876,208 @@ class OCRDocument(models.Model):
             "view_mode": "form",
         }
 
+    def action_create_vendor_bills(self):
+        """
+        List view action: one vendor bill per selected document.
+        Documents already billed, without vendor or flagged as duplicates
+        are skipped.
+        """
+        todo = self.filtered(lambda d: not d.invoice_id and d.vendor_name) - self._duplicate_blocked()
+        skipped = len(self) - len(todo)
+        if not todo:
+            raise UserError(_(
+                "None of the selected documents can be billed (already billed, no vendor name "
+                "or possible duplicate)."
+            ))
+
+        started = time.perf_counter()
+        bills = todo._create_vendor_bills()
+        elapsed = time.perf_counter() - started
+
+        return {
+            "type": "ir.actions.client",
+            "tag": "display_notification",
+            "params": {
+                "title": _("Vendor Bills Created"),
+                "message": _(
+                    "%(count)s bill(s) created in %(sec).2fs, %(skipped)s document(s) skipped.",
+                    count=len(bills), sec=elapsed, skipped=skipped,
+                ),
+                "type": "success",
+                "sticky": False,
+                "next": {
+                    "type": "ir.actions.act_window",
+                    "name": _("Vendor Bills"),
+                    "res_model": "account.move",
+                    "view_mode": "tree,form",
+                    "views": [(False, "list"), (False, "form")],
+                    "domain": [("id", "in", bills.ids)],
+                },
+            },
+        }
+
+    def _create_vendor_bills(self):
+        """
+        Create the vendor bills of all documents in one account.move.create
+        call, lines included, so the moves are only computed once.
+        """
+        Partner = self.env["res.partner"]
+
+        # Find or create vendors: one query for all names
+        names = set(self.mapped("vendor_name"))
+        partners = {}
+        for partner in Partner.search([("name", "in", list(names))]):
+            partners.setdefault(partner.name, partner.id)
+
+        missing = [name for name in names if name not in partners]
+        if missing:
+            created = Partner.create([
+                {"name": name, "supplier_rank": 1} for name in missing
+            ])
+            partners.update(zip(missing, created.ids))
+
+        # Create vendor bills with their lines
+        bills = self.env["account.move"].create([
+            {
+                "move_type": "in_invoice",
+                "partner_id": partners[doc.vendor_name],
+                "invoice_date": doc.invoice_date or fields.Date.today(),
+                "ref": doc.reference_number or doc.name,
+                "invoice_line_ids": [
+                    (0, 0, {
+                        "name": line.item_name,
+                        "quantity": line.quantity,
+                        "price_unit": line.unit_price,
+                    })
+                    for line in doc.line_ids
+                ],
+            }
+            for doc in self
+        ])
+
+        for doc, bill in zip(self, bills):
+            doc.invoice_id = bill.id
+
+        # billed documents are confirmed: learn their vendor's layout
+        self.env["ocr.vendor.profile"]._learn(self)
+        return bills
+
+    # =========================
+    # DUPLICATES
+    # =========================
+    def _detect_duplicates(self):
+        """
+        Store the file hash and the page 1 perceptual hash (from the list
+        thumbnail, see ocr.thumbnail) of the documents, then flag each one
+        whose file, duplicate_key or page image (with the same total)
+        matches an older document. duplicate_key is recomputed first:
+        keys stored before it followed edits may be stale.
+        """
+        self.env.add_to_compute(self._fields["duplicate_key"], self)
+        self.flush_recordset(["duplicate_key"])
+        Thumbnail = self.env["ocr.thumbnail"].sudo()
+        attachments = self._get_file_attachments()
+        for doc in self:
+            attachment = attachments.get(doc.id)
+            vals = {"file_hash": False, "image_phash": False}
+            if attachment and attachment.checksum:
+                vals["file_hash"] = ocr_duplicate.file_key(attachment.checksum, doc.page_from, doc.page_to)
+                try:
+                    thumbnail = Thumbnail._get(attachment, doc.page_from or 1, LIST_WIDTH)
+                    if thumbnail:
+                        image = Image.open(io.BytesIO(base64.b64decode(thumbnail.image)))
+                        vals["image_phash"] = ocr_duplicate.dhash(image)
+                except Exception as e:
+                    _logger.warning("No perceptual hash for OCR document %s: %s", doc.id, e)
+            doc.write(vals)
+
+        # the band search below is plain SQL
+        self.flush_model(["image_phash", "total_amount"])
+        max_distance = int(self.env["ir.config_parameter"].sudo().get_param(
+            "erp_ocr_addon.duplicate_phash_distance", ocr_duplicate.PHASH_MAX_DISTANCE
+        ))
+        for doc in self:
+            original, reason = doc._find_duplicate(max_distance)
+            doc.write({"duplicate_of_id": original.id, "duplicate_reason": reason})
+
+    @api.depends(
+        "tax_id", "vendor_name", "reference_number",
+        "total_amount", "invoice_date", "extracted_text",
+    )
+    def _compute_duplicate_key(self):
+        """
+        ocr_duplicate.duplicate_key of the current values, so form and
+        preview wizard edits move the document to its new key. Without an
+        invoice date, the first date of the OCR text (what extract_fields
+        reads) stands in.
+        """
+        for doc in self:
+            date = doc.invoice_date
+            if not date and doc.extracted_text:
+                match = DATE_RULE.pattern.search(doc.extracted_text)
+                date = match.group(1) if match else ""
+            doc.duplicate_key = ocr_duplicate.duplicate_key(
+                doc.tax_id,
+                doc.vendor_name,
+                doc.reference_number,
+                doc.total_amount,
+                date,
+            ) or False
+
+    def _find_duplicate(self, max_distance=ocr_duplicate.PHASH_MAX_DISTANCE):
+        """
+        (oldest matching document, reason) or (empty recordset, False).
+        Every check is an index lookup: file_hash and duplicate_key are
+        btree columns, the perceptual hash goes through its band indexes
+        and only the candidates get a Hamming distance.
+        """
+        self.ensure_one()
+        older = [("id", "<", self.id)]
+        if self.file_hash:
+            original = self.search([("file_hash", "=", self.file_hash)] + older, order="id", limit=1)
+            if original:
+                return original, "file"
+        if self.duplicate_key:
+            original = self.search([("duplicate_key", "=", self.duplicate_key)] + older, order="id", limit=1)
+            if original:
+                return original, "key"
+        if self.image_phash and self.total_amount:
+            width = ocr_duplicate.BAND_WIDTH
+            bands = ocr_duplicate.bands(self.image_phash)
+            same_band = " OR ".join(
+                f"substr(image_phash, {band * width + 1}, {width}) = %s" for band in range(len(bands))
+            )
+            self.env.cr.execute(f"""
+                SELECT id, image_phash
+                  FROM ocr_document
+                 WHERE image_phash IS NOT NULL
+                   AND ({same_band})
+                   AND total_amount BETWEEN %s AND %s
+                   AND id < %s
+              ORDER BY id
+            """, bands + [self.total_amount - 0.005, self.total_amount + 0.005, self.id])
+            for doc_id, phash in self.env.cr.fetchall():
+                if ocr_duplicate.hamming(self.image_phash, phash) <= max_distance:
+                    return self.browse(doc_id), "image"
+        return self.browse(), False
+
+    def _duplicate_blocked(self):
+        """
+        The documents flagged as duplicates and not overridden.
+        """
+        return self.filtered(lambda d: d.duplicate_of_id and not d.duplicate_override)
+
+    def action_check_duplicates(self):
+        self._detect_duplicates()
+        return True
+
     # =========================
     # VIEW IMAGE
     # =========================
     def action_view_image(self):
         self.ensure_one()
 
-        if not self.file:
+        if not self.with_context(bin_size=True).file:
             raise UserError(_("No image uploaded."))
 
         return {
@@ -217,56 +1087,163 @@ class OCRDocument(models.Model):
         }
 
     # =========================
-    # EXPORT CSV
+    # THUMBNAILS
     # =========================
-    def action_export_csv(self):
-        self.ensure_one()
-
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["Name", "Vendor", "Total", "VAT", "Score"])
-        writer.writerow([
-            self.name,
-            self.vendor_name,
-            self.total_amount,
-            self.vat_amount,
-            self.confidence_score,
-        ])
+    @api.depends("file")
+    def _compute_thumbnail_urls(self):
+        """
+        /erp_ocr_addon/thumbnail URLs of the first page (of the range, for
+        split documents). `unique` changes with the file content, so
+        browsers may cache the images for good.
+        """
+        attachments = self.filtered("id")._get_file_attachments()
+        for doc in self:
+            attachment = attachments.get(doc.id)
+            if not attachment or not attachment.checksum:
+                doc.thumbnail_url = doc.preview_url = False
+                continue
+            base = f"/erp_ocr_addon/thumbnail/{doc.id}?unique={attachment.checksum[:12]}"
+            doc.thumbnail_url = f"{base}&width={LIST_WIDTH}"
+            doc.preview_url = f"{base}&width={FORM_WIDTH}"
 
-        csv_bytes = output.getvalue().encode("utf-8")
-        output.close()
+    def _warm_thumbnails(self):
+        """
+        Render the list preview right after OCR, so review screens do not
+        wait for poppler. Failures are only logged.
+        """
+        Thumbnail = self.env["ocr.thumbnail"].sudo()
+        attachments = self._get_file_attachments()
+        for doc in self:
+            attachment = attachments.get(doc.id)
+            if not attachment:
+                continue
+            try:
+                Thumbnail._get(attachment, doc.page_from or 1, LIST_WIDTH)
+            except Exception as e:
+                _logger.warning("No thumbnail for OCR document %s: %s", doc.id, e)
 
-        attachment = self.env["ir.attachment"].create({
-            "name": f"{self.name}.csv",
-            "datas": base64.b64encode(csv_bytes),
-            "res_model": self._name,
-            "res_id": self.id,
-            "mimetype": "text/csv",
+    # =========================
+    # EXPORT CSV
+    # =========================
+    def action_export_csv(self):
+        """
+        CSV of these documents, streamed like the bulk export.
+        """
+        wizard = self.env["ocr.export.wizard"].create({
+            "export_format": "csv",
+            "document_ids": [Command.set(self.ids)],
         })
+        return wizard.action_export()
 
+    def action_open_export(self):
         return {
-            "type": "ir.actions.act_url",
-            "url": f"/web/content/{attachment.id}?download=1",
-            "target": "self",
+            "type": "ir.actions.act_window",
+            "name": _("Export Documents"),
+            "res_model": "ocr.export.wizard",
+            "view_mode": "form",
+            "target": "new",
+            "context": {"default_document_ids": [Command.set(self.ids)]},
         }
 
     # =========================
     # RE-RUN OCR
     # =========================
     def action_rerun_ocr(self):
-        for doc in self:
+        """
+        Queue the documents for OCR again. The ocr.job re-parses the text
+        stored in ocr.cache when the file is there (one hash, outside the
+        HTTP request) and only runs Tesseract on a miss.
+        """
+        for doc in self.with_context(bin_size=True):
             if not doc.file:
                 raise UserError(_("No file found to re-run OCR."))
 
-            doc.write({
-                "status": "processing",
-                "progress": 0,
-                "confidence_score": False,
-                "extracted_text": False,
-                "extraction_log": False,
-            })
+        self._reset_ocr_result()
+        self.env["ocr.job"]._enqueue(self)
+        return True
 
-        return self.action_run_ocr()
+    def action_force_ocr(self):
+        """
+        Re-run Tesseract from scratch, ignoring ocr.cache.
+        """
+        for doc in self.with_context(bin_size=True):
+            if not doc.file:
+                raise UserError(_("No file found to re-run OCR."))
+
+        self._reset_ocr_result()
+        self.env["ocr.job"]._enqueue(self, force=True)
+        return True
+
+    def _reset_ocr_result(self):
+        self.write({
+            "status": "processing",
+            "progress": 0,
+            "confidence_score": False,
+            "extracted_text": False,
+            "extraction_log": False,
+            "ocr_pages": False,
+            "user_confirmed": False,
+        })
+
+    # =========================
+    # RE-EXTRACTION (parser upgrades)
+    # =========================
+    @api.model
+    def _cron_reextract(self):
+        """
+        Re-parse the stored extracted_text of documents parsed by an older
+        PARSER_VERSION. No Tesseract, only extract_fields; chunks are
+        committed one by one until the time budget is used up. Billed
+        documents are skipped, confirmed ones keep their values and lines.
+        """
+        ICP = self.env["ir.config_parameter"].sudo()
+        chunk_size = int(ICP.get_param("erp_ocr_addon.reextract_chunk_size", 500))
+        max_seconds = float(ICP.get_param("erp_ocr_addon.reextract_max_seconds", 240))
+
+        # split documents are re-parsed together with their stack
+        domain = [
+            ("parser_version", "<", OCRParser.PARSER_VERSION),
+            ("parent_id", "=", False),
+            ("invoice_id", "=", False),
+            ("status", "=", "completed"),
+            ("extracted_text", "!=", False),
+        ]
+        started = time.perf_counter()
+        done = 0
+        while True:
+            docs = self.search(domain, limit=chunk_size, order="id")
+            if not docs:
+                break
+            if time.perf_counter() - started >= max_seconds:
+                # out of time, continue in a fresh cron run right away
+                self.env.ref("erp_ocr_addon.ir_cron_ocr_reextract")._trigger()
+                break
+            docs._reextract()
+            self.env.cr.commit()
+            done += len(docs)
+
+        if done:
+            elapsed = time.perf_counter() - started
+            _logger.info(
+                "Re-parsed %s OCR document(s) with parser v%s in %.1fs (%.0f docs/s)",
+                done, OCRParser.PARSER_VERSION, elapsed, done / elapsed if elapsed else 0.0,
+            )
+        return done
+
+    def _reextract(self):
+        """
+        Re-run extract_fields on the stored text and word boxes, keeping
+        the OCR log.
+        """
+        results = {
+            doc.id: (
+                doc.extracted_text,
+                (doc.extraction_log or "").splitlines()
+                + [f"Re-parsed with parser v{OCRParser.PARSER_VERSION}"],
+            )
+            for doc in self
+        }
+        self._save_ocr_results(results)
 
 
 class OCRDocumentLine(models.Model):
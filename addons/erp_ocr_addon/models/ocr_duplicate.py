@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Duplicate detection keys, stored in indexed columns of ocr.document
+(see _detect_duplicates; duplicate_key is a stored compute and follows
+edits):
+
+    file_key       the file checksum (+ page range of split documents)
+    duplicate_key  vendor (tax id, else name), reference, total and date
+    dhash          64 bit difference hash of page 1, survives re-scans
+
+Exact keys are btree lookups. The perceptual hash is split into
+PHASH_BANDS bands of 8 bits, each with an expression index together with
+total_amount (a near duplicate must have the same total anyway): two
+hashes within PHASH_BANDS - 1 bits share at least one whole band
+(pigeonhole), so a near-duplicate search is a few index lookups plus a
+Hamming distance check on the candidates, not a table scan.
+"""
+import re
+
+from PIL import Image
+
+HASH_SIZE = 8  # 8x8 gradients = 64 bits
+PHASH_BANDS = 8
+BAND_WIDTH = HASH_SIZE * HASH_SIZE // 4 // PHASH_BANDS  # hex digits per band
+# bits; up to PHASH_BANDS - 1 always found, larger distances when a band
+# survives. Re-scans of the same page mostly stay within 8 (see
+# benchmarks/bench_duplicates.py)
+PHASH_MAX_DISTANCE = 8
+# darker pixels are content, the hash is taken on their bounding box
+INK_THRESHOLD = 200
+
+TAX_ID_MIN_DIGITS = 10
+NON_WORD_RE = re.compile(r"[\W_]+")
+DIGITS_RE = re.compile(r"\d+")
+
+
+# =========================
+# FILE
+# =========================
+def file_key(checksum, page_from=None, page_to=None):
+    """
+    Exact file key: the attachment checksum, plus the page range for
+    documents split from a scanned stack (they share the stack's file).
+    """
+    if not checksum:
+        return None
+    if page_from:
+        return f"{checksum}:{page_from}-{page_to or page_from}"
+    return checksum
+
+
+# =========================
+# FIELDS
+# =========================
+def normalize_vendor(tax_id, vendor_name):
+    digits = "".join(DIGITS_RE.findall(tax_id or ""))
+    if len(digits) >= TAX_ID_MIN_DIGITS:
+        return f"tax:{digits}"
+    name = NON_WORD_RE.sub("", (vendor_name or "").casefold())
+    return f"name:{name[:64]}" if name else None
+
+
+def normalize_reference(reference):
+    # "INV-000123", "inv 123" and "INV/123" are the same reference
+    ref = NON_WORD_RE.sub("", (reference or "").upper())
+    return re.sub(r"(?<![0-9])0+(?=[0-9])", "", ref)
+
+
+def normalize_date(date):
+    """
+    "d-m-y" from a date or a raw OCR date ("05/03/2024", "5-3-24"), the
+    year on two digits so both spellings agree. "" when there is none.
+    """
+    if not date:
+        return ""
+    if hasattr(date, "strftime"):
+        return f"{date.day}-{date.month}-{date.year % 100}"
+    parts = [int(p) for p in DIGITS_RE.findall(date)]
+    if len(parts) != 3:
+        return ""
+    return f"{parts[0]}-{parts[1]}-{parts[2] % 100}"
+
+
+def duplicate_key(tax_id, vendor_name, reference, total, date):
+    """
+    Normalized (vendor, reference, total, date) key, None when the vendor
+    or the total is missing, or when there is neither a reference nor a
+    date (a vendor and an amount alone repeat every month).
+    """
+    vendor = normalize_vendor(tax_id, vendor_name)
+    reference = normalize_reference(reference)
+    date = normalize_date(date)
+    if not vendor or not total or not (reference or date):
+        return None
+    return "|".join([vendor, reference, f"{total:.2f}", date])
+
+
+# =========================
+# PERCEPTUAL HASH
+# =========================
+def dhash(image):
+    """
+    Difference hash of an image as 16 hex digits: the sign of the
+    horizontal gradients of a 9x8 grayscale copy of the printed area.
+    Scale, compression and small brightness changes keep it. Cropping to
+    the printed area first matters: a text page is mostly white margin,
+    whose gradients are all equal.
+    """
+    gray = image.convert("L")
+    box = gray.point(lambda p: 255 if p < INK_THRESHOLD else 0).getbbox()
+    if box:
+        gray = gray.crop(box)
+    small = gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{value:0{HASH_SIZE * HASH_SIZE // 4}x}"
+
+
+def hamming(hash_a, hash_b):
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+
+def bands(phash):
+    """
+    The PHASH_BANDS band values of a hash, as stored by the band indexes
+    (substr of the hex string).
+    """
+    return [phash[i * BAND_WIDTH:(i + 1) * BAND_WIDTH] for i in range(PHASH_BANDS)]
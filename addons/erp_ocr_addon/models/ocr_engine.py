@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+OCR engines used by OCRParser._run_ocr_on_image.
+
+Every page is read with one image_to_data call: Tesseract's TSV output,
+i.e. the words with their boxes and confidences (see ocr_layout), from
+which the page text is rebuilt. image_to_string is only used for the
+small strips of the vendor fast path.
+
+detect_orientation runs Tesseract's orientation and script detection
+(the osd traineddata, tesseract-ocr-osd) to turn pages upright (see
+ocr_preprocess.deskew); the engine has to be created with OSD_CONFIG
+for it.
+
+    pytesseract   runs the tesseract CLI: every page writes a temp image,
+                  forks a process and loads the tha+eng traineddata again.
+    tesserocr     keeps a libtesseract TessBaseAPI in the process with the
+                  models loaded, pages are passed in memory. One API per
+                  thread (TessBaseAPI is not thread safe) and per process
+                  (pool workers never reuse the parent's handle).
+
+The engine is picked by the "engine" OCR option; anything unknown or not
+installed falls back to pytesseract.
+"""
+import logging
+import os
+import threading
+
+import pytesseract
+
+from .ocr_layout import PageWords
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_ENGINE = "pytesseract"
+
+OSD_CONFIG = "--psm 0 -l osd"
+
+
+def parse_config(config):
+    """
+    "--oem 3 --psm 6 -l tha+eng" -> ("tha+eng", 6, 3)
+    """
+    lang, psm, oem = "eng", 3, 3
+    parts = config.split()
+    for flag, value in zip(parts, parts[1:]):
+        if flag == "-l":
+            lang = value
+        elif flag == "--psm":
+            psm = int(value)
+        elif flag == "--oem":
+            oem = int(value)
+    return lang, psm, oem
+
+
+class PytesseractEngine:
+    name = "pytesseract"
+
+    def __init__(self, config):
+        self.config = config
+
+    def image_to_string(self, image):
+        return pytesseract.image_to_string(image, config=self.config) or ""
+
+    def image_to_data(self, image):
+        tsv = pytesseract.image_to_data(image, config=self.config, output_type=pytesseract.Output.STRING)
+        return PageWords.from_tsv(tsv)
+
+    def detect_orientation(self, image):
+        """
+        (clockwise rotation making the page upright, confidence),
+        e.g. (90, 6.1).
+        """
+        osd = pytesseract.image_to_osd(image, output_type=pytesseract.Output.DICT)
+        return int(osd.get("rotate") or 0), float(osd.get("orientation_conf") or 0.0)
+
+    def close(self):
+        pass
+
+
+class TesserocrEngine:
+    name = "tesserocr"
+
+    def __init__(self, config):
+        lang, psm, oem = parse_config(config)
+        self.api = tesserocr.PyTessBaseAPI(lang=lang, psm=psm, oem=oem)
+
+    def image_to_string(self, image):
+        self._set_image(image)
+        return self.api.GetUTF8Text() or ""
+
+    def image_to_data(self, image):
+        self._set_image(image)
+        # recognizes the page, same columns as the CLI's tsv output
+        return PageWords.from_tsv(self.api.GetTSVText(0))
+
+    def detect_orientation(self, image):
+        self._set_image(image)
+        osd = self.api.DetectOrientationScript() or {}
+        # orient_deg is how far the page is turned; the CLI's "Rotate"
+        # line is the correction
+        return (360 - int(osd.get("orient_deg") or 0)) % 360, float(osd.get("orient_conf") or 0.0)
+
+    def _set_image(self, image):
+        if image.mode == "1":
+            # bilevel images are handed over as 8 bit, like the CLI does
+            image = image.convert("L")
+        self.api.SetImage(image)
+
+    def close(self):
+        self.api.End()
+
+
+ENGINES = {
+    PytesseractEngine.name: PytesseractEngine,
+    TesserocrEngine.name: TesserocrEngine,
+}
+
+_local = threading.local()
+
+
+def get_engine(name, config):
+    """
+    Engine for this thread, created on first use and then kept so the
+    language models are only loaded once.
+    """
+    pid = os.getpid()
+    if getattr(_local, "pid", None) != pid:
+        _local.pid = pid
+        _local.engines = {}
+
+    key = (name or DEFAULT_ENGINE, config)
+    engine = _local.engines.get(key)
+    if engine is None:
+        engine = _local.engines[key] = _create(key[0], config)
+    return engine
+
+
+def _create(name, config):
+    if name == TesserocrEngine.name:
+        if tesserocr is None:
+            _logger.info("tesserocr is not installed, using pytesseract")
+        else:
+            try:
+                return TesserocrEngine(config)
+            except RuntimeError as e:
+                _logger.warning("tesserocr could not start (%s), using pytesseract", e)
+    elif name not in ENGINES:
+        _logger.warning("Unknown OCR engine %r, using pytesseract", name)
+    return PytesseractEngine(config)
+
+
+def close_engines():
+    """
+    Release the engines of the current thread (frees the loaded models).
+    """
+    for engine in getattr(_local, "engines", {}).values():
+        engine.close()
+    _local.engines = {}
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+import logging
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+
+class OCRJob(models.Model):
+    """
+    Persistent OCR queue.
+
+    action_run_ocr only creates a job; the cron (or any number of
+    long-lived workers calling _process_jobs) claims pending rows with
+    SELECT ... FOR UPDATE SKIP LOCKED, so two workers never pick up
+    the same document. A running job's heartbeat is renewed on every
+    progress step; a job whose heartbeat stopped goes back to the queue.
+    """
+    _name = "ocr.job"
+    _description = "OCR Job"
+    _order = "priority, id"
+
+    document_id = fields.Many2one(
+        "ocr.document",
+        string="Document",
+        ondelete="cascade",
+        index=True,
+    )
+    batch_id = fields.Many2one(
+        "ocr.batch",
+        string="Batch",
+        ondelete="cascade",
+        index=True,
+    )
+    state = fields.Selection(
+        [
+            ("pending", "Pending"),
+            ("running", "Running"),
+            ("done", "Done"),
+            ("failed", "Failed"),
+        ],
+        default="pending",
+        required=True,
+        index=True,
+    )
+    priority = fields.Integer(default=10)
+    force_ocr = fields.Boolean(help="Skip the OCR cache and always run Tesseract.")
+    attempts = fields.Integer(default=0, readonly=True)
+    max_attempts = fields.Integer(default=3)
+    scheduled_at = fields.Datetime(default=lambda self: fields.Datetime.now(), index=True)
+    started_at = fields.Datetime(readonly=True)
+    heartbeat_at = fields.Datetime(string="Last Heartbeat", readonly=True)
+    finished_at = fields.Datetime(readonly=True)
+    error = fields.Text(readonly=True)
+
+    _sql_constraints = [
+        (
+            "document_or_batch",
+            "CHECK(document_id IS NOT NULL OR batch_id IS NOT NULL)",
+            "An OCR job needs a document or a batch.",
+        ),
+    ]
+
+    # =========================
+    # ENQUEUE
+    # =========================
+    @api.model
+    def _enqueue(self, documents, force=False):
+        """
+        Create one pending job per document, skipping documents that
+        are already queued or running.
+        """
+        active = self.search([
+            ("document_id", "in", documents.ids),
+            ("state", "in", ("pending", "running")),
+        ])
+        todo = documents - active.document_id
+        jobs = self.create([
+            {"document_id": doc.id, "force_ocr": force} for doc in todo
+        ])
+        self._trigger_runner()
+        return jobs
+
+    @api.model
+    def _enqueue_batch(self, batch):
+        job = self.create({"batch_id": batch.id})
+        self._trigger_runner()
+        return job
+
+    @api.model
+    def _trigger_runner(self):
+        """
+        Wake the runner up instead of waiting for the next cron tick.
+        """
+        cron = self.env.ref("erp_ocr_addon.ir_cron_ocr_job_runner", raise_if_not_found=False)
+        if cron:
+            cron._trigger()
+
+    # =========================
+    # WORKER
+    # =========================
+    @api.model
+    def _cron_process_jobs(self):
+        ICP = self.env["ir.config_parameter"].sudo()
+        limit = int(ICP.get_param("erp_ocr_addon.job_batch_size", 10))
+        return self._process_jobs(limit=limit)
+
+    @api.model
+    def _process_jobs(self, limit=10):
+        """
+        Drain up to `limit` jobs. Commits after every job, so this must
+        only run from a cron or a dedicated worker, never inside a request.
+        """
+        self._requeue_stale_jobs()
+
+        processed = 0
+        while processed < limit:
+            job = self._acquire_next()
+            if not job:
+                break
+            job._run()
+            processed += 1
+        return processed
+
+    @api.model
+    def _acquire_next(self):
+        """
+        Atomically claim the next pending job. SKIP LOCKED lets concurrent
+        workers pass over rows another worker is claiming right now.
+        """
+        self.flush_model()
+        self.env.cr.execute("""
+            UPDATE ocr_job
+               SET state = 'running',
+                   attempts = attempts + 1,
+                   started_at = (now() at time zone 'UTC'),
+                   heartbeat_at = (now() at time zone 'UTC'),
+                   write_date = (now() at time zone 'UTC')
+             WHERE id = (
+                    SELECT id
+                      FROM ocr_job
+                     WHERE state = 'pending'
+                       AND (scheduled_at IS NULL OR scheduled_at <= (now() at time zone 'UTC'))
+                  ORDER BY priority, id
+                     LIMIT 1
+                       FOR UPDATE SKIP LOCKED
+             )
+         RETURNING id
+        """)
+        row = self.env.cr.fetchone()
+        self.env.cr.commit()
+        if not row:
+            return self.browse()
+
+        self.invalidate_model(["state", "attempts", "started_at", "heartbeat_at"])
+        return self.browse(row[0])
+
+    def _run(self):
+        self.ensure_one()
+        doc = self.document_id
+
+        def progress(done, total):
+            doc.write({"progress": 10 + int(80 * done / max(total, 1))})
+            self._heartbeat()
+            self.env.cr.commit()
+
+        try:
+            if self.batch_id:
+                self.batch_id._process(heartbeat=self._heartbeat)
+            else:
+                doc._process_ocr(progress_callback=progress, force=self.force_ocr)
+        except UserError as e:
+            # Nothing to retry: missing file, bad input ...
+            self.env.cr.rollback()
+            self._mark_failed(str(e))
+        except Exception as e:
+            self.env.cr.rollback()
+            _logger.warning("OCR job %s failed (attempt %s/%s): %s",
+                            self.id, self.attempts, self.max_attempts, e)
+            self._retry_or_fail(str(e))
+        else:
+            self.write({
+                "state": "done",
+                "finished_at": fields.Datetime.now(),
+                "error": False,
+            })
+        self.env.cr.commit()
+
+    def _heartbeat(self):
+        """
+        The worker is still alive. Called from the progress callbacks,
+        which commit right after.
+        """
+        self.write({"heartbeat_at": fields.Datetime.now()})
+
+    # =========================
+    # RETRY / FAILURE
+    # =========================
+    def _retry_or_fail(self, message):
+        for job in self:
+            if job.attempts < job.max_attempts:
+                # exponential backoff: 1, 2, 4 ... minutes
+                delay = timedelta(minutes=2 ** max(job.attempts - 1, 0))
+                job.write({
+                    "state": "pending",
+                    "scheduled_at": fields.Datetime.now() + delay,
+                    "error": message,
+                })
+            else:
+                job._mark_failed(message)
+
+    def _mark_failed(self, message):
+        self.write({
+            "state": "failed",
+            "finished_at": fields.Datetime.now(),
+            "error": message,
+        })
+        for job in self:
+            if job.batch_id:
+                job.batch_id._mark_failed(message)
+                continue
+            job.document_id.write({
+                "status": "error",
+                "extraction_log": (job.document_id.extraction_log or "") + message + "\n",
+            })
+
+    @api.model
+    def _requeue_stale_jobs(self):
+        """
+        Jobs left in 'running' by a killed worker go back to the queue:
+        no heartbeat for job_timeout_minutes. A long batch that keeps
+        reporting progress is never taken from its worker.
+        """
+        ICP = self.env["ir.config_parameter"].sudo()
+        timeout = int(ICP.get_param("erp_ocr_addon.job_timeout_minutes", 30))
+        limit = fields.Datetime.now() - timedelta(minutes=timeout)
+        stale = self.search([
+            ("state", "=", "running"),
+            "|",
+            ("heartbeat_at", "<", limit),
+            # claimed before heartbeat_at existed
+            "&", ("heartbeat_at", "=", False), ("started_at", "<", limit),
+        ])
+        if stale:
+            stale._retry_or_fail(_("Worker timed out."))
+            self.env.cr.commit()
+
+    # =========================
+    # BUTTONS
+    # =========================
+    def action_retry(self):
+        self.write({
+            "state": "pending",
+            "attempts": 0,
+            "scheduled_at": fields.Datetime.now(),
+            "error": False,
+        })
+        # a batch only OCRs its documents still "processing"
+        (self.document_id | self.batch_id.document_ids).write({"status": "processing", "progress": 0})
+        self.batch_id.write({"state": "pending", "progress": 0})
+        self._trigger_runner()
+        return True
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+Word level OCR output: text, bounding box and confidence of every word
+from the single Tesseract pass per page (TSV, see ocr_engine).
+
+PageWords keeps the words as parallel columns (a list of strings plus one
+array("i") per number) instead of a dict per word; a 500 word page is a
+handful of objects. dumps()/loads() store the pages of a document as
+zlib-compressed JSON columns.
+
+Geometry is used for what plain text cannot give reliably:
+    item_rows         item lines grouped by their vertical position
+    field_confidence  Tesseract's own confidence for the extracted values
+"""
+import json
+import re
+import zlib
+from array import array
+
+QTY_RE = re.compile(r"^\d{1,4}$")
+PRICE_RE = re.compile(r"^\d{1,3}(?:,\d{3})*\.\d{2}$|^\d+\.\d{2}$")
+# punctuation glued to a word ("TOTAL:", "(VAT)") that does not make it
+# another word
+EDGE_PUNCT = ".,:;()[]\"'"
+
+# the values the document confidence is computed from, per doc_type
+# (receipts often print no VAT line); other doc_types count as invoices
+CONFIDENCE_FIELDS = {
+    "invoice": ("vendor_name", "invoice_date_raw", "total_amount", "vat_amount"),
+    "receipt": ("vendor_name", "invoice_date_raw", "total_amount"),
+}
+
+
+def confidence_fields(doc_type=None):
+    return CONFIDENCE_FIELDS.get(doc_type) or CONFIDENCE_FIELDS["invoice"]
+
+
+class PageWords:
+    """
+    Words of one OCRed page, in Tesseract reading order.
+    """
+    INT_COLUMNS = ("left", "top", "width", "height", "conf", "block", "par", "line")
+    __slots__ = ("text",) + INT_COLUMNS
+
+    def __init__(self):
+        self.text = []
+        for name in self.INT_COLUMNS:
+            setattr(self, name, array("i"))
+
+    def __len__(self):
+        return len(self.text)
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self.__init__()
+        self._load(state)
+
+    @classmethod
+    def from_tsv(cls, tsv):
+        """
+        Parse Tesseract TSV output (pytesseract.image_to_data or
+        TessBaseAPI.GetTSVText, with or without the header row).
+        """
+        words = cls()
+        for row in (tsv or "").splitlines():
+            cols = row.split("\t")
+            # level 5 = word; the header row and page/block/line rows are skipped
+            if len(cols) < 12 or cols[0] != "5" or not cols[11].strip():
+                continue
+            words.text.append(cols[11].strip())
+            words.block.append(int(cols[2]))
+            words.par.append(int(cols[3]))
+            words.line.append(int(cols[4]))
+            words.left.append(int(cols[6]))
+            words.top.append(int(cols[7]))
+            words.width.append(int(cols[8]))
+            words.height.append(int(cols[9]))
+            words.conf.append(max(0, int(float(cols[10]))))
+        return words
+
+    def to_text(self):
+        """
+        Plain text like image_to_string: one line per Tesseract line, a
+        blank line between paragraphs.
+        """
+        lines = []
+        current = []
+        key = None
+        for idx, word in enumerate(self.text):
+            word_key = (self.block[idx], self.par[idx], self.line[idx])
+            if word_key != key and current:
+                lines.append(" ".join(current))
+                current = []
+                if word_key[:2] != key[:2]:
+                    lines.append("")
+            key = word_key
+            current.append(word)
+        if current:
+            lines.append(" ".join(current))
+        return "\n".join(lines)
+
+    def mean_confidence(self):
+        if not self.text:
+            return 0.0
+        return sum(self.conf) / float(len(self.conf))
+
+    def lines(self):
+        """
+        Word indexes grouped by Tesseract line (same block, paragraph and
+        line number), in reading order.
+        """
+        lines = []
+        key = None
+        for idx in range(len(self)):
+            word_key = (self.block[idx], self.par[idx], self.line[idx])
+            if word_key != key:
+                lines.append([])
+                key = word_key
+            lines[-1].append(idx)
+        return lines
+
+    def rows(self):
+        """
+        Word indexes grouped into visual rows (words whose vertical centre
+        falls inside the row band), top to bottom, each row left to right.
+        Tesseract lines may split a row with wide gaps or merge two rows
+        on slanted scans; the geometry does not.
+        """
+        order = sorted(range(len(self)), key=lambda i: self.top[i] + self.height[i] / 2.0)
+        rows = []
+        for idx in order:
+            centre = self.top[idx] + self.height[idx] / 2.0
+            if rows and rows[-1][0] <= centre <= rows[-1][1]:
+                rows[-1][2].append(idx)
+            else:
+                rows.append([self.top[idx], self.top[idx] + self.height[idx], [idx]])
+        return [sorted(members, key=lambda i: self.left[i]) for _top, _bottom, members in rows]
+
+    def to_dict(self):
+        data = {"text": self.text}
+        data.update({name: getattr(self, name).tolist() for name in self.INT_COLUMNS})
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        words = cls()
+        words._load(data)
+        return words
+
+    def _load(self, data):
+        self.text = list(data["text"])
+        for name in self.INT_COLUMNS:
+            setattr(self, name, array("i", data[name]))
+
+
+# =========================
+# STORAGE
+# =========================
+def dumps(layouts):
+    """
+    {page number: PageWords} -> compressed bytes.
+    """
+    data = {str(page): words.to_dict() for page, words in layouts.items()}
+    return zlib.compress(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def loads(blob):
+    """
+    Inverse of dumps, {} for an empty blob.
+    """
+    if not blob:
+        return {}
+    data = json.loads(zlib.decompress(blob).decode("utf-8"))
+    return {int(page): PageWords.from_dict(words) for page, words in data.items()}
+
+
+# =========================
+# ITEMS / CONFIDENCE
+# =========================
+def item_rows(pages):
+    """
+    Line items from the word rows of the pages: a quantity first, a price
+    last (unit price, or unit price + line total), a description between.
+    """
+    items = []
+    for words in pages:
+        for row in words.rows():
+            tokens = [words.text[idx] for idx in row]
+            if len(tokens) < 3 or not QTY_RE.match(tokens[0]) or not PRICE_RE.match(tokens[-1]):
+                continue
+            price, name = tokens[-1], tokens[1:-1]
+            if len(name) > 1 and PRICE_RE.match(name[-1]):
+                # "qty description unit total": keep the unit price
+                price, name = name[-1], name[:-1]
+            items.append({
+                "name": " ".join(name),
+                "qty": float(tokens[0]),
+                "price": float(price.replace(",", "")),
+            })
+    return items
+
+
+def _bare_lines(pages):
+    """
+    (words, words without edge punctuation, lines) per page, for
+    _value_confidence.
+    """
+    return [(words, [word.strip(EDGE_PUNCT) for word in words.text], words.lines()) for words in pages]
+
+
+def _value_confidence(bare_pages, candidates):
+    """
+    Mean confidence of the words spelling one of the candidates (each a
+    list of tokens): the tokens as consecutive whole words of one
+    Tesseract line, punctuation at the word edges ignored. None when no
+    candidate is found on any page (see _bare_lines).
+    """
+    for tokens in candidates:
+        tokens = [token.strip(EDGE_PUNCT) for token in tokens]
+        tokens = [token for token in tokens if token]
+        if not tokens:
+            continue
+        size = len(tokens)
+        for words, bare, lines in bare_pages:
+            for line in lines:
+                for start in range(len(line) - size + 1):
+                    span = line[start:start + size]
+                    if all(bare[idx] == token for idx, token in zip(span, tokens)):
+                        return sum(words.conf[idx] for idx in span) / float(size)
+    return None
+
+
+def field_confidence(pages, fields, doc_type=None):
+    """
+    Document confidence (0..1) from Tesseract: the mean word confidence
+    of each value the doc_type has (CONFIDENCE_FIELDS), a missing value
+    counting as 0. A value that cannot be traced back to its words (e.g.
+    the canonical name of a vendor profile) gets the page average.
+    """
+    page_mean = sum(words.mean_confidence() for words in pages) / float(len(pages) or 1)
+    bare_pages = _bare_lines(pages)
+    scores = []
+    for name in confidence_fields(doc_type):
+        value = fields.get(name)
+        if not value:
+            scores.append(0.0)
+            continue
+        if isinstance(value, float):
+            candidates = [[f"{value:,.2f}"], [f"{value:.2f}"]]
+        else:
+            candidates = [value.split()]
+        conf = _value_confidence(bare_pages, candidates)
+        scores.append(page_mean if conf is None else conf)
+    return sum(scores) / (100.0 * len(scores))
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+# display order of the pipeline stages
+STAGES = [
+    "source",
+    "cache",
+    "text_layer",
+    "decode",
+    "rasterize",
+    "grayscale",
+    "downscale",
+    "deskew",
+    "crop",
+    "threshold",
+    "tesseract",
+    "parse",
+    "db_write",
+    "total",
+]
+
+
+class OCRMetric(models.Model):
+    """
+    Seconds spent in one pipeline stage for one OCR run of a document
+    (summed over its pages). Written in bulk at the end of every run.
+    """
+    _name = "ocr.metric"
+    _description = "OCR Stage Timing"
+    _order = "id desc"
+
+    document_id = fields.Many2one("ocr.document", index=True, ondelete="cascade", readonly=True)
+    batch_id = fields.Many2one("ocr.batch", index=True, ondelete="set null", readonly=True)
+    stage = fields.Char(required=True, readonly=True)
+    duration = fields.Float(string="Duration (s)", digits=(16, 4), readonly=True)
+    recorded_at = fields.Datetime(default=lambda self: fields.Datetime.now(), readonly=True)
+
+    def init(self):
+        # the dashboard and /metrics aggregate per stage over a time window
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS ocr_metric_recorded_at_stage_idx
+                ON ocr_metric (recorded_at, stage)
+        """)
+
+    # =========================
+    # RECORDING
+    # =========================
+    @api.model
+    def _record(self, timings_by_doc, batch=None):
+        """
+        timings_by_doc: {document id: {stage: seconds}}
+        """
+        now = fields.Datetime.now()
+        return self.create([
+            {
+                "document_id": doc_id,
+                "batch_id": batch.id if batch else False,
+                "stage": stage,
+                "duration": seconds,
+                "recorded_at": now,
+            }
+            for doc_id, timings in timings_by_doc.items()
+            for stage, seconds in timings.items()
+        ])
+
+    # =========================
+    # AGGREGATES
+    # =========================
+    @api.model
+    def _stage_stats(self, date_from=None, date_to=None):
+        """
+        [(stage, count, sum, p50, p95)] in STAGES order, computed by
+        PostgreSQL over the recorded_at window (None = open ended).
+        """
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT stage,
+                   COUNT(*),
+                   SUM(duration),
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY duration),
+                   percentile_cont(0.95) WITHIN GROUP (ORDER BY duration)
+              FROM ocr_metric
+             WHERE (%(date_from)s IS NULL OR recorded_at >= %(date_from)s)
+               AND (%(date_to)s IS NULL OR recorded_at < %(date_to)s)
+          GROUP BY stage
+        """, {"date_from": date_from, "date_to": date_to})
+        rows = self.env.cr.fetchall()
+        order = {stage: idx for idx, stage in enumerate(STAGES)}
+        return sorted(rows, key=lambda row: (order.get(row[0], len(STAGES)), row[0]))
+
+    # =========================
+    # RETENTION
+    # =========================
+    @api.model
+    def _cron_cleanup(self):
+        ICP = self.env["ir.config_parameter"].sudo()
+        max_age = int(ICP.get_param("erp_ocr_addon.metrics_max_age_days", 30))
+        self.env.cr.execute(
+            "DELETE FROM ocr_metric WHERE recorded_at < %s",
+            (fields.Datetime.now() - timedelta(days=max_age),),
+        )
+        return self.env.cr.rowcount
@@ -1,11 +1,32 @@
 # -*- coding: utf-8 -*-
 import base64
+import hashlib
 import io
+import multiprocessing
+import os
 import re
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from PIL import Image
-import pytesseract
-from pdf2image import convert_from_bytes
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+from . import ocr_engine, ocr_layout, ocr_preprocess, ocr_templates
+from .ocr_rules import FIELD_RULES
+
+MULTI_SPACE_RE = re.compile(r"[ ]{2,}")
+MULTI_NEWLINE_RE = re.compile(r"\n{2,}")
+PAGE_MARK_RE = re.compile(r"^--- PAGE (\d+)( \(not OCRed\))? ---$", re.MULTILINE)
+DOC_TITLE_RE = re.compile(r"\b(?:TAX\s+INVOICE|INVOICE|RECEIPT)\b|ใบกำกับภาษี|ใบเสร็จ|ใบแจ้งหนี้", re.IGNORECASE)
+
+
+class OCRTransientError(Exception):
+    """
+    Raised when the OCR engine failed in a way that is worth retrying
+    (Tesseract crash, timeout, poppler hiccup ...).
+    """
 
 
 class OCRParser:
@@ -14,83 +35,714 @@ class OCRParser:
     Supports image + PDF, Thai + English.
     """
 
+    # PDF pages are rasterized one at a time at this resolution
+    PDF_DPI = 300
+
+    # Tesseract settings used for every page; the "lang" option (see
+    # detect_lang) replaces tha+eng with one of OCR_LANGS
+    OCR_CONFIG = "--oem 3 --psm 6 -l tha+eng"
+    OCR_LANGS = ("eng", "tha", "tha+eng")
+
+    # Bump whenever _preprocess_image changes, it invalidates ocr.cache
+    PREPROCESS_VERSION = "3"
+
+    # Scanned stacks (see split_documents): pages with fewer visible
+    # characters are separator sheets, a document header is looked for in
+    # the first lines of a page
+    BLANK_PAGE_CHARS = 20
+    HEADER_LINES = 8
+
+    # Bump whenever extract_fields / ocr_rules change: the re-extract cron
+    # then re-parses the stored extracted_text of older documents
+    PARSER_VERSION = 4
+
     # =========================
     # IMAGE PREPROCESSING
     # =========================
     @staticmethod
-    def _preprocess_image(image: Image.Image) -> Image.Image:
+    def _preprocess_image(image: Image.Image, options=None, timings=None) -> Image.Image:
         """
-        Improve OCR accuracy (especially Thai).
+        Improve OCR accuracy (especially Thai) and shrink oversized photos.
+        Stages and options live in ocr_preprocess; `timings` collects the
+        seconds spent per stage.
         """
-        image = image.convert("L")  # grayscale
-        image = image.point(lambda x: 0 if x < 180 else 255, "1")  # threshold
-        return image
+        return ocr_preprocess.preprocess(image, options, timings)
 
     # =========================
     # OCR CORE
     # =========================
     @staticmethod
-    def _run_ocr_on_image(image: Image.Image) -> str:
+    def _run_ocr_on_image(image: Image.Image, options=None, timings=None) -> ocr_layout.PageWords:
+        """
+        Run Tesseract with Thai + English, through the engine named by the
+        "engine" option (see ocr_engine). One pass returns the words with
+        their boxes and confidences; words.to_text() is the page text.
+        """
+        image = OCRParser._preprocess_image(image, options, timings)
+        options = options or {}
+        engine = ocr_engine.get_engine(options.get("engine"), OCRParser.ocr_config(options.get("lang")))
+        started = time.perf_counter()
+        words = engine.image_to_data(image)
+        if timings is not None:
+            timings["tesseract"] = time.perf_counter() - started
+        return words
+
+    @staticmethod
+    def ocr_config(lang=None):
+        """
+        OCR_CONFIG with the given language model, unchanged for "auto".
+        """
+        if lang not in OCRParser.OCR_LANGS:
+            return OCRParser.OCR_CONFIG
+        return OCRParser.OCR_CONFIG.replace("-l tha+eng", f"-l {lang}")
+
+    @staticmethod
+    def detect_lang(text="", options=None, log=None):
+        """
+        Language model for the full OCR pass: the "lang" option when it
+        names one of OCR_LANGS, else ("auto") eng only when the letters
+        already read for the document (`text`, e.g. its PDF text layer)
+        are all Latin, and tha+eng otherwise. Script detection on the
+        page image is not used: it calls mixed pages Latin and eng then
+        drops their Thai vendor names. Known vendors get their language
+        from the vendor profile (see run_profile_ocr).
+        """
+        lang = (options or {}).get("lang")
+        if lang in OCRParser.OCR_LANGS:
+            return lang
+
+        lang = "tha+eng"
+        if ocr_templates.LATIN_LETTER_RE.search(text or "") and ocr_templates.text_lang(text) == "eng":
+            lang = "eng"
+        if log is not None:
+            log.append(f"Language: {lang} ({'no Thai letters in the text layer' if lang == 'eng' else 'default'})")
+        return lang
+
+    @staticmethod
+    def format_timings(timings):
+        return ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+
+    @staticmethod
+    def add_timings(target, timings):
         """
-        Run Tesseract with Thai + English.
+        Sum per-stage seconds into `target` (None = not collecting).
         """
-        image = OCRParser._preprocess_image(image)
-        config = "--oem 3 --psm 6 -l tha+eng"
-        return pytesseract.image_to_string(image, config=config) or ""
+        if target is not None:
+            for stage, seconds in timings.items():
+                target[stage] = target.get(stage, 0.0) + seconds
 
     @staticmethod
-    def run_tesseract(base64_data):
+    def run_tesseract(base64_data, options=None, log=None):
         """
         OCR for image uploads (PNG/JPG).
+        Stage timings are appended to `log` (a list of lines) when given.
         """
         if not base64_data:
             return ""
 
         try:
-            image_bytes = base64.b64decode(base64_data)
-            image = Image.open(io.BytesIO(image_bytes))
-            return OCRParser._run_ocr_on_image(image)
+            return OCRParser.run_image_ocr(base64.b64decode(base64_data), options=options, log=log)
 
         except Exception as e:
             return f"OCR ERROR: {str(e)}"
 
     @staticmethod
-    def run_pdf_ocr(base64_data):
+    def run_image_ocr(source, options=None, log=None, timings=None, layouts=None):
+        """
+        Same as run_tesseract for a file source (see read_head) and lets
+        exceptions propagate. A path is decoded straight from disk.
+        Stage seconds are summed into `timings` (a dict) when given, the
+        words (ocr_layout.PageWords) go into `layouts` as page 1.
+        """
+        started = time.perf_counter()
+        image = Image.open(source if isinstance(source, str) else io.BytesIO(source))
+        image.load()
+        stages = {"decode": time.perf_counter() - started}
+        options = dict(options or {}, lang=OCRParser.detect_lang("", options, log))
+        words = OCRParser._run_ocr_on_image(image, options, stages)
+        if log is not None:
+            log.append(f"IMAGE: {OCRParser.format_timings(stages)}")
+        OCRParser.add_timings(timings, stages)
+        if layouts is not None:
+            layouts[1] = words
+        return words.to_text()
+
+    @staticmethod
+    def run_pdf_ocr(base64_data, progress_callback=None, workers=1, log=None, options=None):
         """
         OCR for PDF uploads (multi-page).
+        Pages are rendered one by one from a temp file, so peak memory is
+        one page per worker regardless of the page count.
+        progress_callback(done_pages, total_pages) is called after each page.
+        workers > 1 OCRs the pages on a process pool; per-page timings are
+        appended to `log` (a list of lines) when given.
         """
         if not base64_data:
             return ""
 
         try:
-            pdf_bytes = base64.b64decode(base64_data)
-            images = convert_from_bytes(pdf_bytes, dpi=300)
-
-            full_text = ""
-            for idx, img in enumerate(images, start=1):
-                full_text += f"\n--- PAGE {idx} ---\n"
-                full_text += OCRParser._run_ocr_on_image(img)
-
-            return full_text
+            texts = OCRParser.run_pdf_ocr_pages(
+                base64_data,
+                progress_callback=progress_callback,
+                workers=workers,
+                log=log,
+                options=options,
+            )
+            return OCRParser.join_pages(texts)
 
         except Exception as e:
             return f"OCR ERROR: {str(e)}"
 
+    @staticmethod
+    def run_pdf_ocr_pages(base64_data, progress_callback=None, workers=1, log=None, options=None):
+        """
+        Same as run_pdf_ocr but returns one text per page and lets
+        exceptions propagate.
+        """
+        return OCRParser.run_pdf_source_pages(
+            base64.b64decode(base64_data),
+            progress_callback=progress_callback,
+            workers=workers,
+            log=log,
+            options=options,
+        )
+
+    @staticmethod
+    def run_pdf_source_pages(source, progress_callback=None, workers=1, log=None, options=None,
+                             timings=None, layouts=None):
+        """
+        One text per page for a PDF file source (see read_head). A path
+        (e.g. in the filestore) is handed to poppler as it is; bytes are
+        written to a temp file first. Stage seconds, summed over the
+        pages, go into `timings` (a dict) when given; `layouts` (a dict)
+        gets {page number: PageWords} for the OCRed pages.
+        """
+        if isinstance(source, str):
+            return OCRParser._ocr_pdf_path(source, workers, progress_callback, log, options, timings, layouts)
+
+        with tempfile.TemporaryDirectory(prefix="ocr_pdf_") as tmp_dir:
+            pdf_path = os.path.join(tmp_dir, "document.pdf")
+            with open(pdf_path, "wb") as f:
+                f.write(source)
+            del source
+            return OCRParser._ocr_pdf_path(pdf_path, workers, progress_callback, log, options, timings, layouts)
+
+    @staticmethod
+    def _ocr_pdf_path(pdf_path, workers=1, progress_callback=None, log=None, options=None, timings=None,
+                      layouts=None):
+        """
+        OCR the pages the "page_policy" option asks for. Returns one entry
+        per page, None for pages that were not OCRed.
+
+            all         every page
+            first_last  first and last page first; the pages in between
+                        only when vendor / total / VAT are not all found
+                        with at least "page_min_confidence"
+
+        Pages with a usable text layer (born-digital PDFs) are read with
+        pdftotext instead of being rasterized, unless "text_layer" is off.
+        """
+        options = options or {}
+        page_count = pdfinfo_from_path(pdf_path)["Pages"]
+        all_pages = list(range(1, page_count + 1))
+        layer = {}
+        if options.get("text_layer", True):
+            started = time.perf_counter()
+            layer = OCRParser._text_layer(pdf_path, options.get("text_layer_min_chars", 50), log)
+            OCRParser.add_timings(timings, {"text_layer": time.perf_counter() - started})
+
+        # one language for the scanned pages, from the text layer pages
+        if len(layer) < page_count and options.get("lang") not in OCRParser.OCR_LANGS:
+            options = dict(options, lang=OCRParser.detect_lang("\n".join(layer.values()), options, log))
+
+        def progress(offset):
+            if not progress_callback:
+                return None
+            return lambda done, total: progress_callback(offset + done, page_count)
+
+        if layouts is None:
+            layouts = {}
+        if options.get("page_policy") != "first_last" or page_count <= 2:
+            texts = OCRParser._read_pages(
+                pdf_path, all_pages, layer, workers, progress(0), log, options, timings, layouts
+            )
+            return [texts[n] for n in all_pages]
+
+        first = [1, page_count]
+        texts = OCRParser._read_pages(pdf_path, first, layer, workers, progress(0), log, options, timings, layouts)
+        pages = [texts.get(n) for n in all_pages]
+        if OCRParser.has_key_fields(
+            pages, options.get("page_min_confidence", 0.8), OCRParser.page_words(pages, layouts),
+            options.get("doc_type"),
+        ):
+            if log is not None:
+                log.append(f"Key fields found on pages 1 and {page_count}, pages 2-{page_count - 1} skipped")
+            return pages
+
+        rest = all_pages[1:-1]
+        texts.update(OCRParser._read_pages(
+            pdf_path, rest, layer, workers, progress(len(first)), log, options, timings, layouts
+        ))
+        return [texts[n] for n in all_pages]
+
+    @staticmethod
+    def _read_pages(pdf_path, page_numbers, layer, workers=1, progress_callback=None, log=None, options=None,
+                    timings=None, layouts=None):
+        """
+        Text of the given pages: from the text layer when the page has
+        one (see _text_layer), rasterize + OCR for the others.
+        Returns {page number: text}; OCRed pages add their words to
+        `layouts`.
+        """
+        total = len(page_numbers)
+        texts = {n: layer[n] for n in page_numbers if n in layer}
+        if log is not None:
+            for n in page_numbers:
+                if n in texts:
+                    log.append(f"PAGE {n}: text layer ({len(texts[n])} chars)")
+        if texts and progress_callback:
+            progress_callback(len(texts), total)
+
+        offset = len(texts)
+
+        def progress(done, _total):
+            progress_callback(offset + done, total)
+
+        todo = [n for n in page_numbers if n not in texts]
+        if todo:
+            texts.update(OCRParser._ocr_pages(
+                pdf_path, todo, workers, progress if progress_callback else None, log, options, timings, layouts
+            ))
+        return texts
+
+    @staticmethod
+    def run_profile_ocr(source, is_pdf, index, options=None, log=None, timings=None, hints=None):
+        """
+        Fast path for known vendors (see ocr_templates): OCR the header
+        lines of page 1, look the vendor up in `index` (a VendorIndex),
+        then OCR only the text lines its profile says hold the key fields,
+        on the first and last page. Returns the page texts (None = page
+        not OCRed), or None when the vendor is unknown, has no fast path
+        or a key field was not found; the caller then runs the full OCR.
+        `hints` (a dict) gets the "lang" of a matched profile, for the
+        full OCR to skip script detection.
+        """
+        if not index or not index.fast_path:
+            return None
+        started = time.perf_counter()
+        if not is_pdf:
+            image = Image.open(source if isinstance(source, str) else io.BytesIO(source))
+            image.load()
+            OCRParser.add_timings(timings, {"decode": time.perf_counter() - started})
+            return OCRParser._profile_ocr(lambda _n: image, 1, index, options, log, timings, hints)
+
+        with tempfile.TemporaryDirectory(prefix="ocr_pdf_") as tmp_dir:
+            if isinstance(source, str):
+                pdf_path = source
+            else:
+                pdf_path = os.path.join(tmp_dir, "document.pdf")
+                with open(pdf_path, "wb") as f:
+                    f.write(source)
+                del source
+            page_count = pdfinfo_from_path(pdf_path)["Pages"]
+            if (options or {}).get("text_layer", True):
+                layer = OCRParser._text_layer(pdf_path, (options or {}).get("text_layer_min_chars", 50))
+                OCRParser.add_timings(timings, {"text_layer": time.perf_counter() - started})
+                if 1 in layer:
+                    # born-digital: the regular path reads the text layer
+                    return None
+
+            def load_page(page_no):
+                step = time.perf_counter()
+                image = OCRParser._render_page(pdf_path, page_no)
+                OCRParser.add_timings(timings, {"rasterize": time.perf_counter() - step})
+                return image
+
+            return OCRParser._profile_ocr(load_page, page_count, index, options, log, timings, hints)
+
+    @staticmethod
+    def _profile_ocr(load_page, page_count, index, options=None, log=None, timings=None, hints=None):
+        """
+        run_profile_ocr on loaded pages: load_page(page number) -> image.
+        """
+        # strips are too small for orientation detection
+        options = dict(options or {}, deskew=False)
+        engine = ocr_engine.get_engine(options.get("engine"), OCRParser.ocr_config(options.get("lang")))
+
+        first = OCRParser._preprocess_image(load_page(1), options, timings)
+        lines = ocr_preprocess.text_lines(first)
+        if not lines:
+            return None
+        header_bottom = lines[min(ocr_templates.HEADER_LINES, len(lines)) - 1][1]
+        header = OCRParser._ocr_rows(engine, first, [(0, header_bottom)], timings)
+
+        profile = index.match(header)
+        if profile and profile.get("lang"):
+            # language cached on the vendor profile, no script detection
+            engine = ocr_engine.get_engine(options.get("engine"), OCRParser.ocr_config(profile["lang"]))
+            if hints is not None:
+                hints["lang"] = profile["lang"]
+            if log is not None:
+                log.append(f"Language: {profile['lang']} (vendor profile {profile['name']})")
+        if not profile or not profile.get("fast_path"):
+            if log is not None:
+                log.append("Vendor fast path: no vendor profile matched, full OCR")
+            return None
+
+        windows = ocr_templates.line_windows(profile, "first")
+        if page_count == 1:
+            windows += ocr_templates.line_windows(profile, "last")
+        bands = ocr_templates.row_bands(lines, windows, below=header_bottom)
+        texts = [header, OCRParser._ocr_rows(engine, first, bands, timings)]
+        strips = 1 + len(bands)
+        del first
+
+        pages = ["\n".join(t for t in texts if t)]
+        if page_count > 1:
+            windows = ocr_templates.line_windows(profile, "last")
+            last_text = None
+            if windows:
+                last = OCRParser._preprocess_image(load_page(page_count), options, timings)
+                bands = ocr_templates.row_bands(ocr_preprocess.text_lines(last) or [], windows)
+                last_text = OCRParser._ocr_rows(engine, last, bands, timings)
+                strips += len(bands)
+            pages += [None] * (page_count - 2) + [last_text]
+
+        text = OCRParser.join_pages(pages) if page_count > 1 else pages[0]
+        fields = OCRParser.extract_fields(text, profile)
+        missing = [name for name in ocr_templates.KEY_FIELDS if not fields.get(name)]
+        if missing:
+            if log is not None:
+                log.append(
+                    f"Vendor fast path ({profile['name']}): {', '.join(missing)} not found, full OCR"
+                )
+            return None
+        if log is not None:
+            log.append(f"Vendor fast path ({profile['name']}): {strips} strip(s) OCRed")
+        return pages
+
+    @staticmethod
+    def _ocr_rows(engine, image, bands, timings=None):
+        """
+        OCR horizontal strips (top, bottom) of a preprocessed page.
+        """
+        started = time.perf_counter()
+        width = image.size[0]
+        texts = [engine.image_to_string(image.crop((0, top, width, bottom))) for top, bottom in bands]
+        OCRParser.add_timings(timings, {"tesseract": time.perf_counter() - started})
+        return "\n".join(text.strip() for text in texts if text.strip())
+
+    @staticmethod
+    def _text_layer(pdf_path, min_chars=50, log=None):
+        """
+        {page number: text} for the pages whose embedded text layer has at
+        least min_chars non-blank characters, one pdftotext call for the
+        whole file. Scanned pages have no (or only a few stray) characters
+        and are left out, as are pages whose fonts decode to garbage.
+        """
+        started = time.perf_counter()
+        try:
+            result = subprocess.run(
+                ["pdftotext", "-layout", "-enc", "UTF-8", pdf_path, "-"],
+                capture_output=True,
+                timeout=120,
+                check=True,
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            if log is not None:
+                log.append(f"Text layer unavailable ({e}), OCR only")
+            return {}
+
+        layer = {}
+        # pdftotext ends every page with a form feed
+        for page_no, text in enumerate(result.stdout.decode("utf-8", "replace").split("\f"), start=1):
+            chars = len("".join(text.split()))
+            if chars >= min_chars and text.count("\ufffd") * 10 < chars:
+                layer[page_no] = text
+        if log is not None:
+            log.append(
+                f"Text layer: {len(layer)} page(s) usable in "
+                f"{time.perf_counter() - started:.3f}s"
+            )
+        return layer
+
+    @staticmethod
+    def has_key_fields(pages, min_confidence=0.8, words=None, doc_type=None):
+        """
+        True when vendor, total and (if the doc_type has it) VAT can be
+        extracted from these pages, with a Tesseract confidence of at
+        least min_confidence when `words` are given (see extract_fields).
+        Text layer pages are exact, the rule heuristic is not compared.
+        """
+        fields = OCRParser.extract_fields(OCRParser.join_pages(pages), words=words, doc_type=doc_type)
+        required = [
+            name for name in ("vendor_name", "total_amount", "vat_amount")
+            if name in ocr_layout.confidence_fields(doc_type)
+        ]
+        return bool(
+            all(fields[name] for name in required)
+            and (not words or fields["confidence"] >= min_confidence)
+        )
+
+    # =========================
+    # FILE SOURCES
+    # =========================
+    # A file source is either the path of the file on disk (filestore) or
+    # its raw bytes. Paths are never read in full by the helpers below.
+    @staticmethod
+    def read_head(source, size=8):
+        """
+        First bytes of the file, enough to tell PDF from image.
+        """
+        if isinstance(source, str):
+            with open(source, "rb") as f:
+                return f.read(size)
+        return bytes(source[:size])
+
+    @staticmethod
+    def is_pdf(source):
+        # PDF files always start with %PDF
+        return OCRParser.read_head(source, 4) == b"%PDF"
+
+    @staticmethod
+    def sha256(source, chunk_size=1024 * 1024):
+        """
+        Hex sha256 of the file, streamed in chunks for paths.
+        """
+        digest = hashlib.sha256()
+        if isinstance(source, str):
+            with open(source, "rb") as f:
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    digest.update(chunk)
+        else:
+            digest.update(source)
+        return digest.hexdigest()
+
+    @staticmethod
+    def join_pages(texts):
+        """
+        Build the extracted_text of a PDF from its page texts
+        (None = page not OCRed, see page_policy).
+        """
+        return "".join(
+            f"\n--- PAGE {idx} ---\n{text}" if text is not None
+            else f"\n--- PAGE {idx} (not OCRed) ---\n"
+            for idx, text in enumerate(texts, start=1)
+        )
+
+    @staticmethod
+    def split_pages(text):
+        """
+        Page texts of a joined PDF text, the inverse of join_pages
+        ([] when the text has no page markers).
+        """
+        text = text or ""
+        marks = list(PAGE_MARK_RE.finditer(text))
+        pages = []
+        for idx, mark in enumerate(marks):
+            end = marks[idx + 1].start() - 1 if idx + 1 < len(marks) else len(text)
+            pages.append(None if mark.group(2) else text[mark.end() + 1:end])
+        return pages
+
+    @staticmethod
+    def page_words(pages, layouts):
+        """
+        PageWords of the given pages (None = not OCRed) for extract_fields,
+        or None unless every page with text has them (text layer pages and
+        results from before word boxes were stored have none).
+        """
+        if not layouts:
+            return None
+        numbers = [n for n, text in enumerate(pages, start=1) if text is not None]
+        if not numbers or any(n not in layouts for n in numbers):
+            return None
+        return [layouts[n] for n in numbers]
+
+    @staticmethod
+    def split_documents(pages):
+        """
+        Page ranges of the documents in a scanned stack, as a list of
+        (first, last) page numbers; blank separator pages belong to none.
+        A page starts a new document when
+            - it follows a blank page,
+            - its header (vendor + date or title in the first lines)
+              names another vendor than the current document, or
+            - the current document already had its total line and the
+              page has a header or a total of its own.
+        Any other page continues the current document.
+        """
+        ranges = []
+        current = None
+        for number, text in enumerate(pages, start=1):
+            if text is None or len("".join(text.split())) < OCRParser.BLANK_PAGE_CHARS:
+                current = None
+                continue
+
+            lines = [line for line in text.split("\n") if line.strip()]
+            head = "\n".join(lines[:OCRParser.HEADER_LINES])
+            head_fields = OCRParser.extract_fields(head)
+            is_header = head_fields["invoice_date_raw"] or DOC_TITLE_RE.search(head)
+            vendor = head_fields["vendor_name"] if is_header else ""
+            total = OCRParser.extract_fields(text)["total_amount"]
+
+            if (
+                current is None
+                or (vendor and vendor != current["vendor"])
+                or (current["closed"] and (vendor or total))
+            ):
+                current = {"vendor": vendor, "closed": False}
+                ranges.append([number, number])
+            else:
+                ranges[-1][1] = number
+                current["vendor"] = current["vendor"] or vendor
+            if total:
+                current["closed"] = True
+        return [tuple(r) for r in ranges]
+
+    @staticmethod
+    def ocred_pages(text):
+        """
+        "1, 30 / 30" style summary of the pages OCRed in a joined text,
+        "" when the text has no page markers (images).
+        """
+        marks = PAGE_MARK_RE.findall(text or "")
+        if not marks:
+            return ""
+        done = [int(n) for n, skipped in marks if not skipped]
+        ranges = []
+        for n in done:
+            if ranges and ranges[-1][1] == n - 1:
+                ranges[-1][1] = n
+            else:
+                ranges.append([n, n])
+        parts = [str(a) if a == b else f"{a}-{b}" for a, b in ranges]
+        return f"{', '.join(parts)} / {len(marks)}"
+
+    @staticmethod
+    def _ocr_pages(pdf_path, page_numbers, workers=1, progress_callback=None, log=None, options=None,
+                   timings=None, layouts=None):
+        """
+        Rasterize + OCR the given pages (1-based) of a PDF file.
+        Returns {page number: text}, their words go into `layouts`.
+        """
+        total = len(page_numbers)
+        workers = max(1, min(workers or 1, total, os.cpu_count() or 1))
+        started = time.perf_counter()
+        tasks = [
+            (idx, pdf_path, page_no, OCRParser.PDF_DPI, options)
+            for idx, page_no in enumerate(page_numbers)
+        ]
+
+        results = OCRParser._run_tasks(_ocr_page_task, tasks, workers, progress_callback)
+        texts = {page_numbers[idx]: words.to_text() for idx, words, _, _ in results}
+        for idx, words, _, stages in results:
+            OCRParser.add_timings(timings, stages)
+            if layouts is not None:
+                layouts[page_numbers[idx]] = words
+
+        if log is not None:
+            for idx, _, seconds, stages in results:
+                log.append(
+                    f"PAGE {page_numbers[idx]}: OCR {seconds:.2f}s ({OCRParser.format_timings(stages)})"
+                )
+            log.append(
+                f"OCR {total} page(s) with {workers} worker(s) "
+                f"in {time.perf_counter() - started:.2f}s"
+            )
+        return texts
+
+    @staticmethod
+    def _run_tasks(func, tasks, workers=1, progress_callback=None):
+        """
+        Run func(task) for every task, on a process pool when workers > 1.
+        Tasks start with their index and results come back in task order.
+        """
+        total = len(tasks)
+        results = [None] * total
+        workers = max(1, min(workers or 1, total, os.cpu_count() or 1))
+
+        if workers == 1:
+            for done, task in enumerate(tasks, start=1):
+                result = func(task)
+                results[result[0]] = result
+                if progress_callback:
+                    progress_callback(done, total)
+            return results
+
+        # fork: the children only run poppler + tesseract, never touch the
+        # DB. spawn / forkserver children cannot import this module, the
+        # odoo.addons path comes from the server config. Forking a threaded
+        # server can copy a lock another thread holds (logging, ...), which
+        # is why ocr_workers defaults to 1.
+        ctx = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=ctx, initializer=_init_ocr_worker
+        ) as pool:
+            futures = [pool.submit(func, task) for task in tasks]
+            for done, future in enumerate(as_completed(futures), start=1):
+                result = future.result()
+                results[result[0]] = result
+                if progress_callback:
+                    progress_callback(done, total)
+        return results
+
+    @staticmethod
+    def run_batch_ocr(files, workers=1, progress_callback=None):
+        """
+        OCR many uploads at once, one document per pool worker.
+        files: list of (source, is_pdf, options, index), source as in
+        read_head, index a VendorIndex for the vendor fast path or None.
+        Returns a list of (pages, seconds, error, stage timings, fast path,
+        layouts) in input order; pages is None on error, fast path is True
+        when only the vendor's regions were OCRed (partial text, not
+        cacheable), layouts is {page number: PageWords}.
+        """
+        tasks = [
+            (idx, source, is_pdf, options, index)
+            for idx, (source, is_pdf, options, index) in enumerate(files)
+        ]
+        results = OCRParser._run_tasks(_ocr_document_task, tasks, workers, progress_callback)
+        return [result[1:] for result in results]
+
+    @staticmethod
+    def _render_page(pdf_path, page_no, dpi=None):
+        """
+        Rasterize a single PDF page (1-based) into a PIL image.
+        """
+        images = convert_from_path(
+            pdf_path,
+            dpi=dpi or OCRParser.PDF_DPI,
+            first_page=page_no,
+            last_page=page_no,
+        )
+        return images[0] if images else None
+
     # =========================
     # TEXT NORMALIZATION
     # =========================
     @staticmethod
     def _normalize_text(text: str) -> str:
         text = text.replace("\t", " ")
-        text = re.sub(r"[ ]{2,}", " ", text)
-        text = re.sub(r"\n{2,}", "\n", text)
+        # substring checks first: most texts have nothing to collapse
+        if "  " in text:
+            text = MULTI_SPACE_RE.sub(" ", text)
+        if "\n\n" in text:
+            text = MULTI_NEWLINE_RE.sub("\n", text)
         return text.strip()
 
     # =========================
     # FIELD EXTRACTION
     # =========================
     @staticmethod
-    def extract_fields(text):
+    def extract_fields(text, profile=None, words=None, doc_type=None):
+        """
+        Header fields, amounts and items of an OCR text. A vendor profile
+        (see ocr_templates) refines them with that vendor's own labels.
+        words: PageWords of every OCRed page (see page_words); items are
+        then read from the word rows and the confidence comes from
+        Tesseract (over the fields of doc_type, see ocr_layout) instead of
+        the rule heuristic, a vendor profile still raising it.
+        """
         fields = {
             "vendor_name": "",
             "supplier_name": "",
@@ -118,89 +770,64 @@ class OCRParser:
 
         text = OCRParser._normalize_text(text)
 
-        # -------------------------
-        # VENDOR NAME (Thai + Eng)
-        # -------------------------
-        vendor_patterns = [
-            r'^(บริษัท\s*[^\n]+)',                 # Thai company
-            r'^([A-Z][A-Za-z0-9 &\.,\-]{4,})',     # English company
-        ]
-        for pat in vendor_patterns:
-            m = re.search(pat, text, re.MULTILINE)
-            if m:
-                fields["vendor_name"] = m.group(1).strip()
-                fields["confidence"] += 0.1
-                break
-
-        # -------------------------
-        # DATE
-        # -------------------------
-        date_match = re.search(
-            r'(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})',
-            text
-        )
-        if date_match:
-            fields["invoice_date_raw"] = date_match.group(1)
-
-        # -------------------------
-        # TOTAL (Thai + English)
-        # -------------------------
-        total_patterns = [
-            r'รวมทั้งสิ้น\s*([0-9,]+\.\d{2})',
-            r'ยอดรวม\s*([0-9,]+\.\d{2})',
-            r'\bTOTAL\b[^\d]*([0-9,]+\.\d{2})',
-            r'Amount\s*Due[^\d]*([0-9,]+\.\d{2})',
-        ]
-        for pat in total_patterns:
-            m = re.search(pat, text, re.IGNORECASE)
-            if m:
-                fields["total_amount"] = float(m.group(1).replace(",", ""))
-                fields["confidence"] += 0.15
-                break
-
-        # -------------------------
-        # VAT
-        # -------------------------
-        vat_patterns = [
-            r'ภาษีมูลค่าเพิ่ม\s*([0-9,]+\.\d{2})',
-            r'(VAT|Tax)[^\d]*([0-9,]+\.\d{2})',
-        ]
-        for pat in vat_patterns:
-            m = re.search(pat, text, re.IGNORECASE)
-            if m:
-                value = m.group(1) if m.lastindex == 1 else m.group(2)
-                fields["vat_amount"] = float(value.replace(",", ""))
-                fields["confidence"] += 0.05
-                break
-
-        # -------------------------
-        # DISCOUNT
-        # -------------------------
-        disc_match = re.search(
-            r'(Discount|ส่วนลด)[^\d]*([0-9,]+\.\d{2})',
-            text,
-            re.IGNORECASE
-        )
-        if disc_match:
-            fields["discount_amount"] = float(disc_match.group(2).replace(",", ""))
-
-        # -------------------------
-        # ITEM LINES (basic)
-        # -------------------------
-        item_matches = re.findall(
-            r'(\d+)\s+(.+?)\s+([0-9]+\.\d{2})',
-            text
-        )
+        # vendor, date, totals, VAT, discount, items (see ocr_rules)
+        FIELD_RULES.run(text, fields)
+        if profile:
+            ocr_templates.apply_profile(text, profile, fields)
+
+        if words:
+            fields["items"] = ocr_layout.item_rows(words)
+            confidence = ocr_layout.field_confidence(words, fields, doc_type)
+            if profile:
+                confidence = max(confidence, ocr_templates.profile_confidence(fields))
+            fields["confidence"] = round(confidence, 4)
+        else:
+            fields["confidence"] = min(fields["confidence"], 0.95)
+        return fields
+
+
+# =========================
+# PROCESS POOL HELPERS
+# =========================
+def _init_ocr_worker():
+    # One Tesseract thread per process, the pool provides the parallelism
+    os.environ["OMP_THREAD_LIMIT"] = "1"
 
-        for qty, desc, unit in item_matches:
-            fields["items"].append({
-                "name": desc.strip(),
-                "qty": float(qty),
-                "price": float(unit),
-            })
 
-        if fields["items"]:
-            fields["confidence"] += 0.1
+def _ocr_page_task(args):
+    """
+    Render + OCR one PDF page. Module level so it can be pickled into
+    pool workers; only the path travels between processes, not the image.
+    """
+    idx, pdf_path, page_no, dpi, options = args
+    started = time.perf_counter()
+    timings = {}
+    image = OCRParser._render_page(pdf_path, page_no, dpi)
+    timings["rasterize"] = time.perf_counter() - started
+    words = OCRParser._run_ocr_on_image(image, options, timings) if image is not None else ocr_layout.PageWords()
+    del image
+    return idx, words, time.perf_counter() - started, timings
+
 
-        fields["confidence"] = min(fields["confidence"], 0.95)
-        return fields
\ No newline at end of file
+def _ocr_document_task(args):
+    """
+    OCR a whole upload (image or PDF, pages in sequence) in one worker.
+    Filestore paths keep the pickled task tiny.
+    """
+    idx, source, is_pdf, options, index = args
+    started = time.perf_counter()
+    timings = {}
+    layouts = {}
+    hints = {}
+    try:
+        pages = OCRParser.run_profile_ocr(source, is_pdf, index, options=options, timings=timings, hints=hints)
+        fast_path = pages is not None
+        if hints.get("lang"):
+            options = dict(options or {}, lang=hints["lang"])
+        if pages is None and is_pdf:
+            pages = OCRParser.run_pdf_source_pages(source, options=options, timings=timings, layouts=layouts)
+        elif pages is None:
+            pages = [OCRParser.run_image_ocr(source, options=options, timings=timings, layouts=layouts)]
+        return idx, pages, time.perf_counter() - started, None, timings, fast_path, layouts
+    except Exception as e:
+        return idx, None, time.perf_counter() - started, f"OCR ERROR: {str(e)}", timings, False, {}
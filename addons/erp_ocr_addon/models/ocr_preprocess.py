@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+"""
+Configurable image preprocessing run before Tesseract.
+
+Stages (each one timed into the `timings` dict):
+    grayscale -> downscale -> deskew -> crop -> threshold
+
+Options (see DEFAULTS):
+    threshold     "fixed" (LUT at threshold_value), "otsu" or "adaptive"
+    text_height   target text line height in pixels; bigger images are
+                  downscaled towards it (0 = keep the size)
+    max_pixels    hard cap on the page size, applied on top of text_height
+                  (0 = no cap)
+    crop          cut empty margins
+    deskew        fix 90/180/270 degree rotation with Tesseract OSD (run
+                  through ocr_engine), then the small skew of a crooked scan
+
+The defaults are the pipeline from before this module: grayscale and a
+fixed threshold at the original size. The other stages add 70-820 ms
+per page (benchmarks/bench_preprocess.py) and stay off until OCR numbers
+on real documents show they pay for themselves.
+
+NumPy is only needed for the text height estimate, the skew estimate and
+the adaptive threshold; without it those stages are skipped, or fall
+back to max_pixels and Otsu.
+"""
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from PIL import Image
+
+from . import ocr_engine
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULTS = {
+    "threshold": "fixed",
+    "threshold_value": 180,
+    "text_height": 0,
+    "max_pixels": 0,
+    "crop": False,
+    "deskew": False,
+}
+
+# analysis (text height, crop box, OSD, skew) runs on a copy this wide
+ANALYSIS_WIDTH = 1000
+# skew_angle tries the angles up to MAX_SKEW degrees, SKEW_STEP apart
+MAX_SKEW = 5.0
+SKEW_STEP = 0.5
+# and on a copy this wide: a line turned by SKEW_STEP still moves ~5 px
+SKEW_WIDTH = 600
+# a text line taller than 1/8 of the printed area is a mismeasure
+MAX_LINE_SHARE_DIVISOR = 8
+
+
+def with_defaults(options=None):
+    opts = dict(DEFAULTS)
+    opts.update({k: v for k, v in (options or {}).items() if v is not None})
+    return opts
+
+
+@contextmanager
+def _timed(timings, stage):
+    started = time.perf_counter()
+    yield
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+
+def preprocess(image, options=None, timings=None):
+    """
+    Run the configured stages and return a bilevel ("1") image.
+    """
+    opts = with_defaults(options)
+
+    with _timed(timings, "grayscale"):
+        gray = image.convert("L")
+
+    if opts["text_height"] or opts["max_pixels"]:
+        with _timed(timings, "downscale"):
+            gray = downscale(gray, opts["text_height"], opts["max_pixels"])
+
+    if opts["deskew"]:
+        with _timed(timings, "deskew"):
+            gray = deskew(gray, opts.get("engine"))
+
+    if opts["crop"]:
+        with _timed(timings, "crop"):
+            gray = crop_margins(gray)
+
+    with _timed(timings, "threshold"):
+        return threshold(gray, opts["threshold"], opts["threshold_value"])
+
+
+# =========================
+# THRESHOLD
+# =========================
+@lru_cache(maxsize=256)
+def _threshold_lut(value):
+    return tuple(0 if x < value else 255 for x in range(256))
+
+
+def otsu_value(gray):
+    """
+    Otsu threshold from the 256-bin histogram (PIL computes it in C).
+    """
+    hist = gray.histogram()[:256]
+    total = sum(hist)
+    if not total:
+        return 128
+    sum_all = sum(i * h for i, h in enumerate(hist))
+
+    best, best_value = 0.0, 128
+    weight_bg = 0
+    sum_bg = 0.0
+    for value in range(256):
+        weight_bg += hist[value]
+        if not weight_bg:
+            continue
+        weight_fg = total - weight_bg
+        if not weight_fg:
+            break
+        sum_bg += value * hist[value]
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if between > best:
+            best, best_value = between, value + 1
+    return best_value
+
+
+def threshold(gray, method="fixed", value=180):
+    if method == "adaptive" and np is not None:
+        return adaptive_threshold(gray)
+    if method in ("otsu", "adaptive"):
+        value = otsu_value(gray)
+    return gray.point(_threshold_lut(int(value)), "1")
+
+
+def adaptive_threshold(gray, window=31, offset=10):
+    """
+    Local mean threshold using an integral image: O(pixels) whatever the
+    window size. Copes with shadows and uneven phone lighting.
+    """
+    a = np.asarray(gray, dtype=np.float32)
+    h, w = a.shape
+    half = window // 2
+
+    integral = np.zeros((h + 1, w + 1), dtype=np.float64)
+    integral[1:, 1:] = a.cumsum(axis=0).cumsum(axis=1)
+
+    y0 = np.clip(np.arange(h) - half, 0, h)
+    y1 = np.clip(np.arange(h) + half + 1, 0, h)
+    x0 = np.clip(np.arange(w) - half, 0, w)
+    x1 = np.clip(np.arange(w) + half + 1, 0, w)
+
+    sums = (
+        integral[y1][:, x1] - integral[y0][:, x1]
+        - integral[y1][:, x0] + integral[y0][:, x0]
+    )
+    area = np.outer(y1 - y0, x1 - x0)
+    mean = sums / area
+
+    binary = np.where(a < mean - offset, 0, 255).astype(np.uint8)
+    return Image.fromarray(binary, "L").convert("1", dither=Image.NONE)
+
+
+# =========================
+# DOWNSCALE
+# =========================
+def _analysis_copy(gray):
+    # integer box reduce: much cheaper than resize, exact enough for analysis
+    w, h = gray.size
+    step = w // ANALYSIS_WIDTH
+    if step < 2:
+        return gray, 1.0
+    return gray.reduce(step), 1.0 / step
+
+
+def _paper_box(a, value):
+    """
+    (top, bottom, left, right) of the paper in a grayscale array: the rows
+    and columns that are mostly brighter than `value`. Phone photos show
+    the table around the receipt, which is as dark as ink. None when
+    nothing is mostly bright.
+    """
+    bright = a >= value
+    rows = np.flatnonzero(bright.mean(axis=1) > 0.5)
+    cols = np.flatnonzero(bright.mean(axis=0) > 0.5)
+    if not len(rows) or not len(cols):
+        return None
+    return rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+
+
+def _ink_box(ink, min_ink):
+    """
+    (top, bottom, left, right) of the rows/columns of a boolean ink array
+    with more than `min_ink` ink, None when there are none.
+    """
+    rows = np.flatnonzero(ink.mean(axis=1) > min_ink)
+    cols = np.flatnonzero(ink.mean(axis=0) > min_ink)
+    if not len(rows) or not len(cols):
+        return None
+    return rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+
+
+def estimate_text_height(gray):
+    """
+    Median height (in pixels of `gray`) of the horizontal ink bands,
+    i.e. the text line height, measured inside the paper and its printed
+    area only. Bands of mostly ink (background strips) and bands over a
+    quarter of that area do not count. None when it cannot be measured
+    or the result is not a plausible line height.
+    """
+    if np is None:
+        return None
+    small, factor = _analysis_copy(gray)
+    a = np.asarray(small)
+    box = _paper_box(a, otsu_value(small))
+    if box is None:
+        return None
+    top, bottom, left, right = box
+    paper = a[top:bottom, left:right]
+
+    # text against paper: the background no longer skews the threshold
+    ink = paper < otsu_value(Image.fromarray(paper))
+    box = _ink_box(ink, 0.002)
+    if box is None:
+        return None
+    top, bottom, left, right = box
+    ink = ink[top:bottom, left:right]
+    height = bottom - top
+
+    share = ink.mean(axis=1)
+    ink_rows = (share > 0.01) & (share < 0.5)
+    padded = np.concatenate(([False], ink_rows, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    runs = edges[1::2] - edges[::2]
+    runs = runs[(runs >= 2) & (runs <= height / 4)]
+    if not len(runs):
+        return None
+    measured = float(np.median(runs))
+    if measured > height / MAX_LINE_SHARE_DIVISOR:
+        return None
+    return measured / factor
+
+
+def downscale(gray, text_height=40, max_pixels=None):
+    """
+    Shrink big images (12+ MP phone photos) so text lines end up around
+    text_height pixels, which is plenty for Tesseract. Never upscales.
+    Without a usable text height only max_pixels applies.
+    """
+    w, h = gray.size
+    scale = 1.0
+
+    if text_height:
+        measured = estimate_text_height(gray)
+        if measured:
+            scale = min(scale, max(text_height / measured, 0.25))
+
+    if max_pixels and w * h > max_pixels:
+        scale = min(scale, (max_pixels / float(w * h)) ** 0.5)
+
+    if scale >= 0.9:
+        return gray
+    size = (max(1, int(w * scale)), max(1, int(h * scale)))
+    # antialiased bilinear: close to LANCZOS for text at a fraction of the cost
+    return gray.resize(size, Image.BILINEAR, reducing_gap=2.0)
+
+
+# =========================
+# CROP / DESKEW
+# =========================
+def crop_margins(gray, padding=0.02, min_ink=0.002):
+    """
+    Crop to the rows/columns that hold ink. Rows or columns with less
+    than `min_ink` dark pixels (specks, scanner dust) do not count.
+    """
+    small, factor = _analysis_copy(gray)
+    value = otsu_value(small)
+
+    if np is not None:
+        box = _ink_box(np.asarray(small) < value, min_ink)
+        if box is None:
+            return gray
+        top, bottom, left, right = box
+        bbox = (left, top, right, bottom)
+    else:
+        mask = small.point(tuple(255 if x < value else 0 for x in range(256)))
+        bbox = mask.getbbox()
+        if not bbox:
+            return gray
+
+    w, h = gray.size
+    pad_x, pad_y = int(w * padding), int(h * padding)
+    left, top, right, bottom = (int(v / factor) for v in bbox)
+    box = (
+        max(0, left - pad_x),
+        max(0, top - pad_y),
+        min(w, right + pad_x),
+        min(h, bottom + pad_y),
+    )
+    if box == (0, 0, w, h):
+        return gray
+    return gray.crop(box)
+
+
+def deskew(gray, engine=None, min_confidence=2.0):
+    """
+    Rotate upright: quarter turns from Tesseract's orientation detection
+    (the osd traineddata, through the `engine` named like the "engine"
+    OCR option), then the small tilt of a crooked scan (skew_angle).
+    Pages OSD cannot read only get the tilt fixed.
+    """
+    small, _ = _analysis_copy(gray)
+    try:
+        rotate, conf = ocr_engine.get_engine(engine, ocr_engine.OSD_CONFIG).detect_orientation(small)
+    except Exception:
+        # too few characters, or the osd traineddata is not installed
+        rotate, conf = 0, 0.0
+    if rotate and conf >= min_confidence:
+        # OSD gives the clockwise correction, PIL rotates counter-clockwise
+        gray = gray.rotate(-rotate, expand=True, fillcolor=255)
+
+    angle = skew_angle(gray)
+    if angle:
+        gray = gray.rotate(angle, Image.BILINEAR, expand=True, fillcolor=255)
+    return gray
+
+
+def skew_angle(gray, max_angle=MAX_SKEW, step=SKEW_STEP):
+    """
+    Counter-clockwise rotation (degrees, PIL's convention) that levels
+    the text lines, 0.0 when the page is straight or NumPy is missing.
+    Level lines give the sharpest horizontal ink profile: the angle with
+    the largest sum of squared row-to-row differences wins, searched in
+    whole degrees first and then refined by `step` around the best one.
+    """
+    if np is None:
+        return 0.0
+    w = gray.size[0]
+    small = gray.reduce(w // SKEW_WIDTH) if w >= 2 * SKEW_WIDTH else gray
+    value = otsu_value(small)
+    ink = small.point(tuple(255 if x < value else 0 for x in range(256)))
+
+    def sharpness(angle):
+        profile = np.asarray(ink.rotate(angle), dtype=np.float64).sum(axis=1)
+        return float(np.square(np.diff(profile)).sum())
+
+    coarse = max(range(-int(max_angle), int(max_angle) + 1), key=sharpness)
+    fine = [coarse + i * step for i in range(-int(1 / step) + 1, int(1 / step))]
+    return max(fine, key=lambda angle: (sharpness(angle), -abs(angle)))
+
+
+# =========================
+# LAYOUT
+# =========================
+def text_lines(binary, min_ink=0.005):
+    """
+    (top, bottom) pixel rows of the text lines of a bilevel page, top to
+    bottom, from its horizontal ink profile. Thin bands (Thai vowel and
+    tone marks, specks) and tiny gaps are merged into the neighbouring
+    line. None without NumPy.
+    """
+    if np is None:
+        return None
+    ink = np.asarray(binary.convert("L")) < 128
+    rows = ink.mean(axis=1) > min_ink
+    padded = np.concatenate(([False], rows, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    runs = list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+    if not runs:
+        return []
+
+    height = float(np.median([bottom - top for top, bottom in runs]))
+    lines = []
+    for top, bottom in runs:
+        if lines and top - lines[-1][1] < height / 4:
+            lines[-1][1] = bottom
+        else:
+            lines.append([top, bottom])
+
+    # thin bands join the closer of their two neighbours
+    idx = 0
+    while idx < len(lines) and len(lines) > 1:
+        top, bottom = lines[idx]
+        if bottom - top >= height / 2:
+            idx += 1
+            continue
+        gap_prev = top - lines[idx - 1][1] if idx > 0 else float("inf")
+        gap_next = lines[idx + 1][0] - bottom if idx + 1 < len(lines) else float("inf")
+        if gap_prev <= gap_next:
+            lines[idx - 1][1] = bottom
+        else:
+            lines[idx + 1][0] = top
+        del lines[idx]
+    return [tuple(line) for line in lines]
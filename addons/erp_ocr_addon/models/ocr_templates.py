@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""
+Vendor templates: what the documents of a known supplier look like,
+learned from confirmed documents, and how to read them faster.
+
+A profile is a plain dict, so it can be pickled to OCR pool workers:
+
+    {
+        "id": 7,
+        "name": "ACME Trading Co., Ltd.",
+        "tax_id": "0105551234567",
+        "aliases": ["ACME Trading Co., Ltd.", "ACME Tradlng Co., Ltd."],
+        "anchors": {"total_amount": "TOTAL", "vat_amount": "VAT 7%"},
+        "regions": {"total_amount": ["last", "bottom", 1, 2], ...},
+        "document_count": 12,
+        "lang": "eng",
+        "fast_path": True,
+    }
+
+anchors are the labels printed in front of each value. regions say on
+which text lines the value was found: page ("first" / "last"), the page
+end the lines are counted from ("top" for header values, "bottom" for
+totals, so a varying number of item lines does not matter) and the
+smallest / largest line index seen over every learned document.
+
+The fast path maps those line indexes onto the ink lines of the page
+image (ocr_preprocess.text_lines) and only OCRs these strips, plus the
+first HEADER_LINES lines that identify the vendor. The stored text is
+then only those lines: no items, and less for full-text search and
+duplicate keys, which is why the fast path is opt-in (the
+erp_ocr_addon.vendor_fast_path parameter).
+
+lang is the Tesseract language model the vendor's documents need (see
+text_lang); once known, the vendor's pages skip script detection.
+"""
+import difflib
+import re
+
+from .ocr_rules import AMOUNT, DATE_RULE
+
+# Thai tax IDs are 13 digits, often printed with dashes or spaces
+TAX_ID_RE = re.compile(
+    r"(?:tax\s*id|เลขประจำตัวผู้เสียภาษี(?:อากร)?|เลขผู้เสียภาษี)[^\d\n]{0,20}(\d(?:[ -]?\d){12})",
+    re.IGNORECASE,
+)
+COMPANY_WORDS_RE = re.compile(
+    r"\b(?:co|ltd|limited|company|inc|plc)\b|บริษัท|จำกัด|\(มหาชน\)|มหาชน",
+    re.IGNORECASE,
+)
+# \w does not cover the Thai vowel / tone marks
+NON_WORD_RE = re.compile(r"[^\w\u0e00-\u0e7f]+")
+THAI_LETTER_RE = re.compile(r"[\u0e01-\u0e4e]")
+LATIN_LETTER_RE = re.compile(r"[A-Za-z]")
+
+# fields the fast path must find, else the full page OCR runs
+KEY_FIELDS = ("total_amount", "vat_amount", "invoice_date_raw")
+AMOUNT_FIELDS = ("total_amount", "vat_amount", "discount_amount")
+
+# lines at the top of page 1 that identify the vendor
+HEADER_LINES = 6
+# fuzzy name match threshold (difflib ratio on normalized names)
+NAME_CUTOFF = 0.85
+# extra lines OCRed around a learned line window
+LINE_PAD = 1
+# no fast path when the windows add up to more lines than this
+MAX_REGION_LINES = 12
+MAX_ALIASES = 10
+
+
+def normalize_name(name):
+    """
+    Vendor name without company suffixes, punctuation and case, so
+    "ACME Trading Co., Ltd." and "Acme Trading Limited" compare equal.
+    """
+    name = COMPANY_WORDS_RE.sub(" ", (name or "").lower())
+    return " ".join(NON_WORD_RE.sub(" ", name).split())
+
+
+def find_tax_id(text):
+    m = TAX_ID_RE.search(text or "")
+    return re.sub(r"\D", "", m.group(1)) if m else ""
+
+
+def text_lang(text):
+    """
+    Tesseract language model for a text, from the letters it contains:
+    eng without Thai letters, tha without Latin ones, else tha+eng.
+    """
+    if not THAI_LETTER_RE.search(text or ""):
+        return "eng"
+    if not LATIN_LETTER_RE.search(text or ""):
+        return "tha"
+    return "tha+eng"
+
+
+def _head_lines(text):
+    lines = [line.strip() for line in (text or "").split("\n")]
+    return [line for line in lines if line and not line.startswith("--- PAGE")][:HEADER_LINES]
+
+
+class VendorIndex:
+    """
+    In-memory lookup of vendor profiles by tax ID, exact normalized name
+    (aliases included) and, failing both, fuzzy name.
+    """
+
+    def __init__(self, profiles=()):
+        profiles = list(profiles)
+        self.by_tax_id = {}
+        self.by_name = {}
+        # at least one vendor can take the fast path
+        self.fast_path = any(profile.get("fast_path") for profile in profiles)
+        for profile in profiles:
+            if profile.get("tax_id"):
+                self.by_tax_id[profile["tax_id"]] = profile
+            for alias in [profile["name"]] + list(profile.get("aliases") or []):
+                key = normalize_name(alias)
+                if key:
+                    self.by_name.setdefault(key, profile)
+        self.names = list(self.by_name)
+
+    def __len__(self):
+        return len(self.by_name)
+
+    def match(self, text):
+        """
+        Profile of the vendor of this OCR text, or None.
+        """
+        if not self.by_name and not self.by_tax_id:
+            return None
+        tax_id = find_tax_id(text)
+        if tax_id in self.by_tax_id:
+            return self.by_tax_id[tax_id]
+
+        keys = [normalize_name(line) for line in _head_lines(text)]
+        keys = [key for key in keys if key]
+        for key in keys:
+            if key in self.by_name:
+                return self.by_name[key]
+        for key in keys:
+            close = difflib.get_close_matches(key, self.names, n=1, cutoff=NAME_CUTOFF)
+            if close:
+                return self.by_name[close[0]]
+        return None
+
+
+# =========================
+# LEARNING
+# =========================
+def _amount_strings(value):
+    return [f"{value:,.2f}", f"{value:.2f}"] if value else []
+
+
+def _locate(pages, needles):
+    """
+    (page key, line index, line count, line) of the first line holding
+    one of the needles, on the first or last page only.
+    """
+    last = len(pages) - 1
+    for page_idx, page in enumerate(pages):
+        if page is None or page_idx not in (0, last):
+            continue
+        lines = [line for line in page.split("\n") if line.strip()]
+        for line_idx, line in enumerate(lines):
+            if any(needle in line for needle in needles):
+                key = "first" if page_idx == 0 else "last"
+                return key, line_idx, len(lines), line
+    return None
+
+
+def _label(line, value):
+    """
+    Text printed in front of the value on its line, e.g. "Grand Total:".
+    """
+    label = line.split(value, 1)[0].strip(" :.-\t")
+    # a bare number in front (a quantity, an item code) is no label
+    return "" if not label or label[-1].isdigit() else label
+
+
+def learn(profile, pages, values):
+    """
+    Update a profile dict from one confirmed document.
+    pages: OCR text per page (None = not OCRed)
+    values: confirmed {vendor_name, total_amount, vat_amount, ...}
+    """
+    profile = dict(profile)
+    profile["name"] = profile.get("name") or values["vendor_name"]
+    text = "\n".join(page for page in pages if page)
+    profile["tax_id"] = profile.get("tax_id") or find_tax_id(text)
+    # documents needing different models: fall back to both
+    lang = text_lang(text)
+    profile["lang"] = lang if profile.get("lang") in (None, "", lang) else "tha+eng"
+
+    aliases = list(profile.get("aliases") or [])
+    target = normalize_name(values["vendor_name"])
+    for line in _head_lines(text):
+        if difflib.SequenceMatcher(None, normalize_name(line), target).ratio() >= NAME_CUTOFF:
+            if line not in aliases:
+                aliases = (aliases + [line])[-MAX_ALIASES:]
+            break
+    profile["aliases"] = aliases
+
+    needles = {name: _amount_strings(values.get(name)) for name in AMOUNT_FIELDS}
+    date = DATE_RULE.pattern.search(text)
+    needles["invoice_date_raw"] = [date.group(1)] if date else []
+
+    anchors = dict(profile.get("anchors") or {})
+    regions = dict(profile.get("regions") or {})
+    for name, candidates in needles.items():
+        found = _locate(pages, candidates) if candidates else None
+        if not found:
+            continue
+        page_key, line_idx, line_count, line = found
+        value = next(c for c in candidates if c in line)
+        label = _label(line, value)
+        if label:
+            anchors[name] = label
+        if line_idx < line_count / 2:
+            end, pos = "top", line_idx
+        else:
+            end, pos = "bottom", line_count - 1 - line_idx
+        old = regions.get(name)
+        if old and old[:2] == [page_key, end]:
+            regions[name] = [page_key, end, min(pos, old[2]), max(pos, old[3])]
+        else:
+            regions[name] = [page_key, end, pos, pos]
+    profile["anchors"] = anchors
+    profile["regions"] = regions
+    return profile
+
+
+# =========================
+# FAST PATH
+# =========================
+def line_windows(profile, page_key):
+    """
+    (end, first, last) line windows of the key fields on that page,
+    widened by LINE_PAD.
+    """
+    windows = []
+    for name in KEY_FIELDS:
+        region = (profile.get("regions") or {}).get(name)
+        if region and region[0] == page_key:
+            _page, end, lo, hi = region
+            windows.append((end, max(0, lo - LINE_PAD), hi + LINE_PAD))
+    return windows
+
+
+def row_bands(lines, windows, below=0):
+    """
+    Merged (top, bottom) pixel rows of the windows on a page whose ink
+    lines are `lines` (see ocr_preprocess.text_lines). Rows above `below`
+    were already OCRed and are left out.
+    """
+    count = len(lines)
+    bands = []
+    for end, first, last in windows:
+        if end == "bottom":
+            first, last = count - 1 - last, count - 1 - first
+        first, last = max(0, first), min(count - 1, last)
+        if first > last:
+            continue
+        top, bottom = max(lines[first][0], below), lines[last][1]
+        if bottom > top:
+            bands.append((top, bottom))
+
+    merged = []
+    for top, bottom in sorted(bands):
+        if merged and top <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(bottom, merged[-1][1]))
+        else:
+            merged.append((top, bottom))
+    return merged
+
+
+def can_fast_path(profile, min_documents=3):
+    """
+    True when the profile was learned from enough documents and its line
+    windows are small enough to be worth a region OCR.
+    """
+    regions = profile.get("regions") or {}
+    windows = line_windows(profile, "first") + line_windows(profile, "last")
+    return bool(
+        profile.get("document_count", 0) >= min_documents
+        and all(name in regions for name in KEY_FIELDS)
+        and sum(last - first + 1 for _end, first, last in windows) <= MAX_REGION_LINES
+    )
+
+
+def apply_profile(text, profile, fields):
+    """
+    Refine generic extract_fields output with a vendor profile: the
+    canonical vendor name, the vendor's own labels for amounts and date,
+    and a confidence that reflects how many key fields were found.
+    """
+    fields["vendor_name"] = profile["name"]
+    if profile.get("tax_id"):
+        fields["tax_id"] = profile["tax_id"]
+
+    for name, label in (profile.get("anchors") or {}).items():
+        value = AMOUNT if name in AMOUNT_FIELDS else DATE_RULE.pattern.pattern
+        m = re.search(re.escape(label) + r"[^\d\n]*" + value, text)
+        if not m:
+            continue
+        if name in AMOUNT_FIELDS:
+            fields[name] = float(m.group(1).replace(",", ""))
+        else:
+            fields[name] = m.group(1)
+
+    fields["confidence"] = max(fields["confidence"], profile_confidence(fields))
+    return fields
+
+
+def profile_confidence(fields):
+    """
+    Lowest confidence of a document matched to a vendor profile, by the
+    number of KEY_FIELDS found with the vendor's labels.
+    """
+    found = sum(1 for name in KEY_FIELDS if fields.get(name))
+    return 0.8 + 0.05 * found
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import base64
+import io
+import logging
+
+import psycopg2
+from PIL import Image, features
+from pdf2image import convert_from_bytes, convert_from_path
+
+from odoo import models, fields, api
+
+from .ocr_parser import OCRParser
+
+_logger = logging.getLogger(__name__)
+
+# list / kanban previews, the form preview, a readable page
+LIST_WIDTH = 160
+FORM_WIDTH = 480
+WIDTHS = (LIST_WIDTH, FORM_WIDTH, 1024)
+
+
+def render_thumbnail(source, page=1, width=LIST_WIDTH):
+    """
+    (bytes, mimetype) of one page of a file source (see
+    OCRParser.read_head) scaled to `width` pixels, WebP when Pillow has
+    it, else PNG. None when the file has no such page.
+    """
+    if OCRParser.is_pdf(source):
+        # pdftoppm scales while rendering, the full page is never rasterized
+        convert = convert_from_path if isinstance(source, str) else convert_from_bytes
+        try:
+            images = convert(source, first_page=page, last_page=page, size=(width, None))
+        except Exception as e:
+            _logger.info("No thumbnail for page %s: %s", page, e)
+            return None
+        if not images:
+            return None
+        image = images[0]
+    else:
+        image = Image.open(source if isinstance(source, str) else io.BytesIO(source))
+        try:
+            # multi-page TIFF
+            image.seek(page - 1)
+        except EOFError:
+            return None
+        # JPEG: decode at a reduced scale already
+        image.draft("RGB", (width, width * 4))
+        image.thumbnail((width, width * 4))
+
+    image = image.convert("L" if image.mode in ("1", "L") else "RGB")
+    buf = io.BytesIO()
+    if features.check("webp"):
+        image.save(buf, format="WEBP", quality=80)
+        return buf.getvalue(), "image/webp"
+    image.save(buf, format="PNG", optimize=True)
+    return buf.getvalue(), "image/png"
+
+
+class OCRThumbnail(models.Model):
+    """
+    Scaled down page images for the review screens, keyed on the file
+    content (the checksum of its ir.attachment) so duplicate uploads and
+    split documents share them. Rendered on first request, the list
+    preview of page 1 right after OCR (ocr.document._warm_thumbnails);
+    served by the /erp_ocr_addon/thumbnail route.
+    """
+    _name = "ocr.thumbnail"
+    _description = "OCR Page Thumbnail"
+    _order = "id desc"
+
+    checksum = fields.Char(string="File Checksum", required=True, index=True, readonly=True)
+    page = fields.Integer(required=True, readonly=True)
+    width = fields.Integer(required=True, readonly=True)
+    mimetype = fields.Char(readonly=True)
+    image = fields.Binary(attachment=True, readonly=True)
+
+    _sql_constraints = [
+        ("page_unique", "unique(checksum, page, width)", "One thumbnail per file, page and width."),
+    ]
+
+    @api.model
+    def _get(self, attachment, page=1, width=LIST_WIDTH):
+        """
+        Thumbnail of a page of the file in `attachment`, rendered when
+        missing. The width is rounded up to one of WIDTHS. Empty
+        recordset when the file has no such page.
+        """
+        width = next((w for w in WIDTHS if w >= width), WIDTHS[-1])
+        domain = [("checksum", "=", attachment.checksum), ("page", "=", page), ("width", "=", width)]
+        thumbnail = self.search(domain, limit=1)
+        if thumbnail:
+            return thumbnail
+
+        source = attachment._full_path(attachment.store_fname) if attachment.store_fname else attachment.raw
+        rendered = render_thumbnail(source, page, width) if source else None
+        if not rendered:
+            return self.browse()
+        content, mimetype = rendered
+        try:
+            # another request may render the same page meanwhile
+            with self.env.cr.savepoint():
+                return self.create({
+                    "checksum": attachment.checksum,
+                    "page": page,
+                    "width": width,
+                    "mimetype": mimetype,
+                    "image": base64.b64encode(content),
+                })
+        except psycopg2.IntegrityError:
+            return self.search(domain, limit=1)
+
+    @api.model
+    def _cron_gc(self):
+        """
+        Drop the thumbnails of files no document uses any more.
+        """
+        self.env.cr.execute("""
+            SELECT t.id
+              FROM ocr_thumbnail t
+             WHERE NOT EXISTS (
+                    SELECT 1
+                      FROM ir_attachment a
+                     WHERE a.res_model = 'ocr.document'
+                       AND a.res_field = 'file'
+                       AND a.checksum = t.checksum)
+        """)
+        # through the ORM: their images are attachments too
+        self.browse([row[0] for row in self.env.cr.fetchall()]).unlink()
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+import json
+
+from odoo import models, fields, api, tools
+from odoo.tools import str2bool
+
+from . import ocr_templates
+from .ocr_parser import OCRParser
+
+
+class OCRVendorProfile(models.Model):
+    """
+    What the documents of one supplier look like (see ocr_templates),
+    learned from documents confirmed in the preview wizard or turned into
+    vendor bills. Used to match incoming documents and, once learned from
+    enough of them, to OCR only the lines that hold the key fields.
+    """
+    _name = "ocr.vendor.profile"
+    _description = "OCR Vendor Profile"
+    _order = "document_count desc, id"
+
+    name = fields.Char(string="Vendor", required=True, index="trigram")
+    tax_id = fields.Char(string="Tax ID", index=True)
+    active = fields.Boolean(default=True)
+    document_count = fields.Integer(string="Learned Documents", readonly=True)
+    last_document_id = fields.Many2one("ocr.document", readonly=True, ondelete="set null")
+    learned_at = fields.Datetime(readonly=True)
+    ocr_lang = fields.Selection(
+        [("eng", "English"), ("tha", "Thai"), ("tha+eng", "Thai + English")],
+        string="OCR Language",
+        help="Tesseract language model for this vendor's documents, learned from "
+             "their text. Empty: detected on every document.",
+    )
+
+    # JSON, see ocr_templates for the format
+    aliases = fields.Text(readonly=True, help="Vendor name lines as OCRed on past documents.")
+    anchors = fields.Text(readonly=True, help="Labels printed in front of each value.")
+    regions = fields.Text(readonly=True, help="Text lines the key fields were found on.")
+    # new value from VERSION_SEQUENCE on every change, see _get_index
+    index_version = fields.Integer(readonly=True, copy=False)
+
+    _sql_constraints = [
+        ("tax_id_uniq", "unique(tax_id)", "A vendor profile already exists for this tax ID."),
+    ]
+
+    # =========================
+    # IN-MEMORY INDEX
+    # =========================
+    VERSION_SEQUENCE = "ocr_vendor_profile_version_seq"
+
+    def init(self):
+        self.env.cr.execute(f"CREATE SEQUENCE IF NOT EXISTS {self.VERSION_SEQUENCE}")
+
+    def _next_versions(self, count):
+        self.env.cr.execute(
+            f"SELECT nextval('{self.VERSION_SEQUENCE}') FROM generate_series(1, %s)", (count,)
+        )
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals, version in zip(vals_list, self._next_versions(len(vals_list))):
+            vals["index_version"] = version
+        return super().create(vals_list)
+
+    def write(self, vals):
+        if self:
+            vals = dict(vals, index_version=self._next_versions(1)[0])
+        return super().write(vals)
+
+    @api.model
+    def _get_index(self):
+        """
+        VendorIndex of all active profiles, built once per worker for each
+        version of the profile table: the row count and the sum of the
+        row versions. Every create, write and unlink changes them, also
+        when an older transaction commits last (a max(write_date) would
+        miss that), and no other cache is cleared. System parameter
+        changes clear the registry cache anyway.
+        """
+        self.flush_model(["index_version"])
+        self.env.cr.execute("SELECT count(*), COALESCE(sum(index_version), 0) FROM ocr_vendor_profile")
+        return self._build_index(tuple(self.env.cr.fetchone()))
+
+    @api.model
+    @tools.ormcache("version")
+    def _build_index(self, version):
+        ICP = self.env["ir.config_parameter"].sudo()
+        fast_path = str2bool(ICP.get_param("erp_ocr_addon.vendor_fast_path", "False"))
+        min_documents = int(ICP.get_param("erp_ocr_addon.vendor_min_documents", 3))
+
+        profiles = []
+        for profile in self.sudo().search([]):
+            data = profile._to_template()
+            data["fast_path"] = fast_path and ocr_templates.can_fast_path(data, min_documents)
+            profiles.append(data)
+        return ocr_templates.VendorIndex(profiles)
+
+    def _to_template(self):
+        self.ensure_one()
+        return {
+            "id": self.id,
+            "name": self.name,
+            "tax_id": self.tax_id or "",
+            "aliases": json.loads(self.aliases or "[]"),
+            "anchors": json.loads(self.anchors or "{}"),
+            "regions": json.loads(self.regions or "{}"),
+            "document_count": self.document_count,
+            "lang": self.ocr_lang or "",
+        }
+
+    # =========================
+    # LEARNING
+    # =========================
+    @api.model
+    def _learn(self, docs):
+        """
+        Fold confirmed documents into the profile of their vendor (found
+        by tax ID, else by normalized name), creating it when needed.
+        Every document is learned once.
+        """
+        docs = docs.filtered(lambda d: d.vendor_name and d.extracted_text and not d.profile_learned)
+        if not docs:
+            return self.browse()
+
+        Profile = self.sudo().with_context(active_test=False)
+        by_tax_id = {}
+        by_name = {}
+        for profile in Profile.search([]):
+            if profile.tax_id:
+                by_tax_id[profile.tax_id] = profile
+            by_name.setdefault(ocr_templates.normalize_name(profile.name), profile)
+
+        learned = self.browse()
+        for doc in docs:
+            tax_id = ocr_templates.find_tax_id(doc.extracted_text)
+            key = ocr_templates.normalize_name(doc.vendor_name)
+            profile = by_tax_id.get(tax_id) or by_name.get(key) or Profile.browse()
+
+            data = ocr_templates.learn(
+                profile._to_template() if profile else {},
+                OCRParser.split_pages(doc.extracted_text) or [doc.extracted_text],
+                {
+                    "vendor_name": doc.vendor_name,
+                    "total_amount": doc.total_amount,
+                    "vat_amount": doc.vat_amount,
+                    "discount_amount": doc.discount_amount,
+                },
+            )
+            vals = {
+                "name": data["name"],
+                "tax_id": data["tax_id"] or False,
+                "aliases": json.dumps(data["aliases"], ensure_ascii=False),
+                "anchors": json.dumps(data["anchors"], ensure_ascii=False),
+                "regions": json.dumps(data["regions"]),
+                "ocr_lang": data["lang"],
+                "document_count": profile.document_count + 1,
+                "last_document_id": doc.id,
+                "learned_at": fields.Datetime.now(),
+            }
+            if profile:
+                # only what changed: an unchanged tax_id or name must not
+                # trigger recomputes on the vendor's documents
+                profile.write({
+                    name: value for name, value in vals.items()
+                    if profile._fields[name].convert_to_write(profile[name], profile) != value
+                })
+            else:
+                profile = Profile.create(vals)
+                by_name[key] = profile
+            if profile.tax_id:
+                by_tax_id[profile.tax_id] = profile
+
+            doc.write({"profile_learned": True, "vendor_profile_id": profile.id})
+            learned |= profile
+        return learned
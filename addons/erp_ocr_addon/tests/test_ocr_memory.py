@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import concurrent.futures
+import multiprocessing
+import os
+import resource
+import tempfile
+
+from PIL import Image, ImageDraw
+
+from odoo.tests.common import TransactionCase, tagged
+
+from ..models.ocr_parser import OCRParser
+
+PAGE_COUNT = 50
+# A4 at 300 dpi
+PAGE_SIZE = (2480, 3508)
+# Pages are rasterized and OCRed one at a time, so the growth is about one
+# page plus Tesseract (~150 MB). Holding every page of the PDF at once
+# would be 50 x 26 MB (RGB) alone.
+MAX_RSS_GROWTH_MB = 400
+
+
+def _peak_rss_mb():
+    # this process and its finished children (pytesseract runs tesseract
+    # as a subprocess)
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024.0
+
+
+def _ocr_task(pdf_path, options):
+    # runs in a fresh child: ru_maxrss starts at the forked size
+    start = _peak_rss_mb()
+    pages = OCRParser.run_pdf_source_pages(pdf_path, options=options)
+    return len(pages), _peak_rss_mb() - start
+
+
+def _make_pdf(path, page_count):
+    pages = []
+    for n in range(1, page_count + 1):
+        page = Image.new("L", PAGE_SIZE, 255)
+        draw = ImageDraw.Draw(page)
+        lines = [f"Page {n} of {page_count}", "INVOICE", f"{n} Service fee {n * 10:.2f}", "TOTAL 1,070.00"]
+        for row, line in enumerate(lines):
+            draw.text((200, 200 + row * 80), line, fill=0)
+        pages.append(page)
+    pages[0].save(path, format="PDF", save_all=True, append_images=pages[1:], resolution=300)
+
+
+@tagged("post_install", "-at_install", "ocr_memory")
+class TestOCRMemory(TransactionCase):
+    """
+    Peak memory of OCRing a long scanned PDF must not grow with its page
+    count. Needs tesseract and poppler.
+    """
+
+    def test_large_pdf_peak_rss(self):
+        options = dict(self.env["ocr.document"]._get_ocr_options("invoice"), page_policy="all")
+        with tempfile.TemporaryDirectory(prefix="ocr_test_") as tmp_dir:
+            path = os.path.join(tmp_dir, "large.pdf")
+            _make_pdf(path, PAGE_COUNT)
+            # own process: the test server's memory does not count
+            ctx = multiprocessing.get_context("fork")
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                pages, growth = pool.submit(_ocr_task, path, options).result()
+
+        self.assertEqual(pages, PAGE_COUNT)
+        self.assertLess(
+            growth, MAX_RSS_GROWTH_MB,
+            f"OCR of a {PAGE_COUNT} page PDF grew the peak RSS by {growth:.0f} MB",
+        )
@@ -1,3 +1,4 @@
 # -*- coding: utf-8 -*-
 
 from . import ocr_preview_wizard
+from . import ocr_export_wizard
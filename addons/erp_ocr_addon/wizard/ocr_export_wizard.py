@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import os
+import tempfile
+from datetime import timedelta
+
+import xlsxwriter
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# fixed export columns: (field, header)
+DOCUMENT_COLUMNS = [
+    ("id", "Document ID"),
+    ("name", "Document"),
+    ("doc_type", "Type"),
+    ("status", "Status"),
+    ("upload_date", "Uploaded"),
+    ("invoice_date", "Invoice Date"),
+    ("vendor_name", "Vendor"),
+    ("tax_id", "Tax ID"),
+    ("reference_number", "Reference"),
+    ("receipt_number", "Receipt Number"),
+    ("subtotal_amount", "Subtotal"),
+    ("discount_amount", "Discount"),
+    ("vat_amount", "VAT"),
+    ("total_amount", "Total"),
+    ("confidence_score", "Confidence"),
+]
+LINE_COLUMNS = [
+    ("item_name", "Item"),
+    ("description", "Description"),
+    ("quantity", "Quantity"),
+    ("unit_price", "Unit Price"),
+    ("line_total", "Line Total"),
+]
+
+MIMETYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# documents read per search_read; also the rows per Parquet row group
+CHUNK_SIZE = 2000
+XLSX_MAX_ROWS = 1048576 - 1  # header row
+STREAM_BLOCK = 1024 * 1024
+
+
+class _Sink(io.RawIOBase):
+    """
+    Write-only file for ParquetWriter: keeps what was written since the
+    last drain(), so every row group can be sent right away.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+class OCRExportWizard(models.TransientModel):
+    """
+    Bulk export of OCR documents, one row per document or per line item,
+    as CSV, XLSX or Parquet. The file is streamed by the
+    /erp_ocr_addon/export route (see _iter_export): documents are read in
+    chunks of CHUNK_SIZE, so memory does not grow with the export size.
+    """
+    _name = "ocr.export.wizard"
+    _description = "OCR Document Export"
+
+    export_format = fields.Selection(
+        [("csv", "CSV"), ("xlsx", "Excel (XLSX)"), ("parquet", "Parquet")],
+        string="Format",
+        required=True,
+        default="csv",
+    )
+    scope = fields.Selection(
+        [("documents", "One row per document"), ("lines", "One row per line item")],
+        required=True,
+        default="documents",
+    )
+    document_ids = fields.Many2many(
+        "ocr.document",
+        string="Documents",
+        help="Export these documents. Empty: every document matching the filters below.",
+    )
+    date_field = fields.Selection(
+        [("invoice_date", "Invoice Date"), ("upload_date", "Upload Date")],
+        string="Filter On",
+        required=True,
+        default="invoice_date",
+    )
+    date_from = fields.Date()
+    date_to = fields.Date()
+    doc_type = fields.Selection([("invoice", "Invoice"), ("receipt", "Receipt")], string="Document Type")
+    only_completed = fields.Boolean(string="Completed Only", default=True)
+
+    def _get_domain(self):
+        self.ensure_one()
+        if self.document_ids:
+            return [("id", "in", self.document_ids.ids)]
+        domain = []
+        if self.doc_type:
+            domain.append(("doc_type", "=", self.doc_type))
+        if self.only_completed:
+            domain.append(("status", "=", "completed"))
+        if self.date_from:
+            domain.append((self.date_field, ">=", self.date_from))
+        if self.date_to:
+            # upload_date is a datetime: up to the end of that day
+            domain.append((self.date_field, "<", self.date_to + timedelta(days=1)))
+        return domain
+
+    def _get_columns(self):
+        columns = list(DOCUMENT_COLUMNS)
+        if self.scope == "lines":
+            columns += LINE_COLUMNS
+        return columns
+
+    def _get_filename(self):
+        return f"ocr_{self.scope}_{fields.Date.context_today(self)}.{self.export_format}"
+
+    def action_export(self):
+        self.ensure_one()
+        if self.export_format == "parquet" and pyarrow is None:
+            raise UserError(_("Parquet export needs the pyarrow Python package."))
+        Document = self.env["ocr.document"]
+        if self.export_format == "xlsx":
+            # upper bound: documents without lines still take one row
+            rows = Document.search_count(self._get_domain())
+            if self.scope == "lines":
+                rows += self.env["ocr.document.line"].search_count(
+                    [("document_id", "any", self._get_domain())]
+                )
+            if rows > XLSX_MAX_ROWS:
+                raise UserError(_(
+                    "Up to %(rows)s rows, more than an Excel sheet holds. Export as CSV or Parquet.",
+                    rows=rows,
+                ))
+        return {
+            "type": "ir.actions.act_url",
+            "url": f"/erp_ocr_addon/export/{self.id}",
+            "target": "self",
+        }
+
+    # =========================
+    # STREAMING
+    # =========================
+    def _iter_chunks(self):
+        """
+        Rows (lists in _get_columns order) in chunks, documents by
+        ascending id, one search_read per chunk (plus one for its lines).
+        """
+        self.ensure_one()
+        Document = self.env["ocr.document"]
+        Line = self.env["ocr.document.line"]
+        domain = self._get_domain()
+        doc_names = [name for name, _header in DOCUMENT_COLUMNS]
+        line_names = [name for name, _header in LINE_COLUMNS]
+        empty_line = [None] * len(line_names)
+
+        last_id = 0
+        while True:
+            docs = Document.search_read(
+                domain + [("id", ">", last_id)], doc_names, order="id", limit=CHUNK_SIZE
+            )
+            if not docs:
+                break
+            last_id = docs[-1]["id"]
+
+            lines = {}
+            if self.scope == "lines":
+                for line in Line.search_read(
+                    [("document_id", "in", [doc["id"] for doc in docs])],
+                    line_names + ["document_id"],
+                    order="document_id, id",
+                ):
+                    lines.setdefault(line["document_id"][0], []).append(
+                        [_cell(line[name]) for name in line_names]
+                    )
+
+            rows = []
+            for doc in docs:
+                row = [_cell(doc[name]) for name in doc_names]
+                if self.scope == "lines":
+                    rows += [row + line for line in lines.get(doc["id"]) or [empty_line]]
+                else:
+                    rows.append(row)
+            yield rows
+            # drop the chunk from the ORM cache
+            self.env.invalidate_all()
+
+    def _iter_export(self):
+        """
+        The export file as a sequence of byte blocks.
+        """
+        self.ensure_one()
+        writer = {
+            "csv": self._iter_csv,
+            "xlsx": self._iter_xlsx,
+            "parquet": self._iter_parquet,
+        }[self.export_format]
+        return writer(self._get_columns(), self._iter_chunks())
+
+    def _iter_csv(self, columns, chunks):
+        buf = io.StringIO()
+        # BOM: Excel opens the file as UTF-8 (Thai vendor names)
+        buf.write("\ufeff")
+        writer = csv.writer(buf)
+        writer.writerow([header for _name, header in columns])
+        for rows in chunks:
+            writer.writerows(rows)
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+        yield buf.getvalue().encode("utf-8")
+
+    def _iter_xlsx(self, columns, chunks):
+        # XLSX is a zip with its index at the end: constant_memory writes
+        # every finished row to a temp file, the workbook is sent once done
+        with tempfile.TemporaryDirectory(prefix="ocr_export_") as tmp_dir:
+            path = os.path.join(tmp_dir, "export.xlsx")
+            workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "tmpdir": tmp_dir})
+            sheet = workbook.add_worksheet("OCR")
+            bold = workbook.add_format({"bold": True})
+            date_format = workbook.add_format({"num_format": "yyyy-mm-dd"})
+            datetime_format = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+            types = self._column_types(columns)
+            formats = [
+                date_format if ftype == "date" else datetime_format if ftype == "datetime" else None
+                for ftype in types
+            ]
+
+            sheet.write_row(0, 0, [header for _name, header in columns], bold)
+            row_idx = 1
+            for rows in chunks:
+                for row in rows:
+                    for col_idx, value in enumerate(row):
+                        if value is None:
+                            continue
+                        if formats[col_idx]:
+                            sheet.write_datetime(row_idx, col_idx, value, formats[col_idx])
+                        else:
+                            sheet.write(row_idx, col_idx, value)
+                    row_idx += 1
+            workbook.close()
+
+            with open(path, "rb") as f:
+                yield from iter(lambda: f.read(STREAM_BLOCK), b"")
+
+    def _iter_parquet(self, columns, chunks):
+        arrow_types = {
+            "integer": pyarrow.int64(),
+            "float": pyarrow.float64(),
+            "monetary": pyarrow.float64(),
+            "date": pyarrow.date32(),
+            "datetime": pyarrow.timestamp("s"),
+        }
+        schema = pyarrow.schema([
+            (header, arrow_types.get(ftype, pyarrow.string()))
+            for (_name, header), ftype in zip(columns, self._column_types(columns))
+        ])
+        sink = _Sink()
+        # one row group per chunk, sent as soon as it is written
+        writer = pyarrow.parquet.ParquetWriter(sink, schema, compression="zstd")
+        for rows in chunks:
+            arrays = list(zip(*rows))
+            writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(values, type=field.type) for values, field in zip(arrays, schema)],
+                schema=schema,
+            ))
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+    def _column_types(self, columns):
+        models_ = [self.env["ocr.document"]] * len(DOCUMENT_COLUMNS)
+        models_ += [self.env["ocr.document.line"]] * (len(columns) - len(DOCUMENT_COLUMNS))
+        return [model._fields[name].type for model, (name, _header) in zip(models_, columns)]
+
+def _cell(value):
+    # search_read gives False for empty char / date / selection values
+    return None if value is False else value
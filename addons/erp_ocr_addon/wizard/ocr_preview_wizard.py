@@ -132,7 +132,9 @@ class OCRPreviewWizard(models.TransientModel):
                 "extraction_log": wiz.extraction_log,
                 "status": "completed",
                 "progress": 100,
+                "user_confirmed": True,
             }
             doc.write(vals)
 
+        self.env["ocr.vendor.profile"]._learn(self.document_id)
         return {"type": "ir.actions.act_window_close"}